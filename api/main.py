@@ -1,11 +1,96 @@
-from fastapi import FastAPI
-from api.routes import router
+import time
 
-app = FastAPI()
+_PROCESS_START = time.perf_counter()
+
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from api.routes import router, start_ingest_listener, stop_ingest_listener, warm_up
+from telemetry.metrics import METRICS_ENABLED, SERVER_TIMING_ENABLED, registry, request_scope
+from telemetry.profiling import (PROFILE_HEADER, PROFILE_TOKEN, PROFILING_ENABLED, aggregate, profile_request,
+                                 should_profile)
+
+# Preload per-worker state before accepting requests (set to 0 to load lazily).
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        try:
+            warm_up()
+        except Exception:
+            # Still serve; everything warm_up() loads is also loaded on first use
+            logger.exception("Warm-up failed; state will load on first request")
+    startup = time.perf_counter() - _PROCESS_START
+    registry.set("startup_seconds", startup, help="Seconds from importing the app to accepting requests")
+    logger.info("Worker ready in %.2fs", startup)
+    start_ingest_listener()
+    yield
+    stop_ingest_listener()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
 
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    if not (METRICS_ENABLED or SERVER_TIMING_ENABLED) or request.url.path == "/metrics":
+        return await call_next(request)
+
+    with request_scope(request.url.path) as scope:
+        response = await call_next(request)
+        # Label by route template, not the raw path, to keep series bounded
+        route = request.scope.get("route")
+        scope.route = getattr(route, "path", scope.route)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = scope.server_timing()
+    return response
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not PROFILING_ENABLED:
+        return await call_next(request)
+    reason = should_profile(request.headers.get(PROFILE_HEADER) or request.query_params.get("profile"))
+    if reason is None:
+        return await call_next(request)
+
+    with profile_request(reason) as marked:
+        response = await call_next(request)
+    if marked.path is not None:
+        response.headers["X-Profile-Id"] = os.path.basename(marked.path)
+    return response
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def debug_profile(request: Request, sort: str = "cumulative", limit: int = 40, reset: bool = False):
+    """Aggregate of this worker's profiled requests; needs PROFILE_TOKEN like on-demand profiling."""
+    if not PROFILE_TOKEN or not hmac.compare_digest((request.headers.get(PROFILE_HEADER) or "").encode(), PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=404)
+    try:
+        report = aggregate.report(sort, limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key {sort!r}")
+    if reset:
+        aggregate.reset()
+    return PlainTextResponse(report)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # Optional root
 @app.get("/")
 def root():
-    return {"message": "NeXletter API is up!"}
\ No newline at end of file
+    return {"message": "NeXletter API is up!"}
@@ -1,10 +1,23 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class Recommendation(BaseModel):
     article_id: int
     title: str
-    score: int
+    score: float
+    scoring_config_id: Optional[int] = None
 
 class RecommendationResponse(BaseModel):
-    recommendations: List[Recommendation]
\ No newline at end of file
+    recommendations: List[Recommendation]
+    # Pass back as ?cursor= for the next page; None on the last one
+    next_cursor: Optional[str] = None
+
+class Click(BaseModel):
+    user_id: int
+    article_id: int
+    scoring_config_id: Optional[int] = None
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[int]
+    limit: int = 10
+    log_impressions: bool = False
@@ -1,15 +1,447 @@
-from fastapi import APIRouter, Depends
+import json
+import logging
+import os
+import threading
+import time
+
+from typing import Callable, Optional
+
+import numpy as np
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from db.connection import get_connection
-from recommender.recommender import recommend_articles
-from api.models import RecommendationResponse, Recommendation
+from db.ingest_events import IngestListener
+from nlp.ann_index import TitleLSHIndex
+from nlp.embeddings import ArticleEmbeddings
+from recommender.bandit import ConfigBandit
+from recommender.component_cache import ComponentCache
+from recommender.catalog import ARTICLE_MAX_AGE_DAYS, ArticleCatalog, freshness_cutoff
+from recommender.co_engagement import CO_ENGAGEMENT_PATH, CoEngagement
+from recommender.diversity import DIVERSITY_LAMBDA
+from recommender.factorization import FACTOR_MODEL_PATH, FactorModel
+from recommender.pagination import PAGINATION_DEPTH, RankedSnapshots, decode_cursor
+from recommender.seen import SeenArticles
+from recommender.singleflight import SingleFlight
+from recommender.snapshot import CATALOG_SNAPSHOT_DIR, SnapshotReader
+from recommender.trending import TrendingLists, TrendingRefresher
+from nlp.similarity import score_title_similarity
+from telemetry.metrics import register_cache, registry
+from telemetry.profiling import profiled
+from recommender.recommender import (
+    recommend_articles,
+    recommend_articles_batch,
+    log_recommendations,
+    log_click,
+)
+from api.models import RecommendationResponse, Recommendation, Click, BatchRecommendationRequest
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Seconds a worker serves the same in-memory catalog before reloading it.
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "300"))
+
+# Per-worker cache of per-user component matrices; re-weighting is cheap, scoring isn't.
+component_cache = ComponentCache()
+register_cache("components", component_cache)
+
+# Per-worker sets of articles each user was already shown or clicked, which are
+# left out of their recommendations (EXCLUDE_SEEN=0 turns this off).
+seen_articles = SeenArticles() if os.getenv("EXCLUDE_SEEN", "1") == "1" else None
+if seen_articles is not None:
+    register_cache("seen_articles", seen_articles)
+
+# With CATALOG_SNAPSHOT_DIR set, the catalog and embeddings are memory-mapped from
+# the node's published snapshot (shared by all workers) instead of loaded per worker.
+snapshots = SnapshotReader(CATALOG_SNAPSHOT_DIR) if CATALOG_SNAPSHOT_DIR else None
+
+
+def _snapshot():
+    return snapshots.get() if snapshots is not None else None
+
+
+# Concurrent requests for the same user (newsletter opens, app refreshes) share
+# one recommend_articles() run. The serving config is chosen inside that run,
+# so coalesced callers are served, and log impressions for, the same config.
+recommendation_flights = SingleFlight("recommendations")
+RECOMMENDATION_LIMIT = 10
+
+# Each first page ranks PAGINATION_DEPTH articles once; later pages are slices
+# of that ranked list, kept per worker for PAGINATION_TTL seconds.
+ranked_snapshots = RankedSnapshots()
+register_cache("ranked_snapshots", ranked_snapshots)
+
+# MMR lambda for re-ranking slates (DIVERSITY_LAMBDA=1 keeps pure score order).
+DIVERSITY = DIVERSITY_LAMBDA if DIVERSITY_LAMBDA < 1 else None
+
+# Per-worker config bandit, loaded on first use (None if no active configs).
+_bandit = None
+_bandit_loaded = False
+_bandit_lock = threading.Lock()
+
+
+def get_bandit(conn):
+    global _bandit, _bandit_loaded
+    if not _bandit_loaded:
+        with _bandit_lock:
+            if not _bandit_loaded:
+                _bandit = ConfigBandit.load(conn)
+                _bandit_loaded = True
+    return _bandit
+
+# Per-worker article embeddings, loaded on first use and again after each
+# catalog reload (None if none are stored, in which case similarity falls back
+# to per-request TF-IDF).
+_embeddings = None
+_embeddings_loaded = False
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings(conn):
+    embeddings = _loaded_embeddings(conn)
+    if not ARTICLE_MAX_AGE_DAYS or embeddings is None:
+        return embeddings
+    return _fresh_state(_loaded_catalog(conn, False), embeddings)[1]
+
+
+def _loaded_embeddings(conn):
+    global _embeddings, _embeddings_loaded
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.embeddings
+    if not _embeddings_loaded:
+        with _embeddings_lock:
+            if not _embeddings_loaded:
+                loaded = ArticleEmbeddings.load(conn, since=freshness_cutoff())
+                _embeddings = loaded if len(loaded) else None
+                _embeddings_loaded = True
+    return _embeddings
+
+
+def _live_embeddings():
+    if ARTICLE_MAX_AGE_DAYS and _fresh[3] is not None:
+        return _fresh[3]
+    snapshot = _snapshot()
+    return snapshot.embeddings if snapshot is not None else _embeddings
+
+
+register_cache("user_vectors", _live_embeddings)
+
+# Per-worker article catalog, reloaded every CATALOG_TTL seconds.
+_catalog = None
+_catalog_loaded_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _loaded_catalog(conn, refresh: bool) -> ArticleCatalog:
+    global _catalog, _catalog_loaded_at, _embeddings_loaded
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.catalog
+    if refresh or _catalog is None or time.monotonic() - _catalog_loaded_at > CATALOG_TTL:
+        with _catalog_lock:
+            if refresh or _catalog is None or time.monotonic() - _catalog_loaded_at > CATALOG_TTL:
+                _catalog = ArticleCatalog.load(conn)
+                _catalog_loaded_at = time.monotonic()
+                # Embeddings follow on their next use, so articles ingested since
+                # they were loaded get vectors and freshness eviction can't empty them
+                _embeddings_loaded = False
+    return _catalog
+
+
+def _on_articles_ingested(article_ids) -> None:
+    """
+    Fold newly ingested articles (fetcher/pipeline.py) into this worker's
+    catalog and embeddings; None (events were missed) reloads them fully.
+    """
+    global _catalog, _catalog_loaded_at, _embeddings, _embeddings_loaded
+    if snapshots is not None:
+        return  # snapshot workers switch on the published pointer instead
+    conn = get_connection()
+    try:
+        with _catalog_lock:
+            if article_ids is None or _catalog is None:
+                _catalog = ArticleCatalog.load(conn)
+                _catalog_loaded_at = time.monotonic()
+            else:
+                _catalog = _catalog.extended(conn, article_ids)
+        with _embeddings_lock:
+            if article_ids is None:
+                _embeddings_loaded = False
+            elif _embeddings is not None:
+                _embeddings = _embeddings.merged(
+                    ArticleEmbeddings.load(conn, since=freshness_cutoff(), article_ids=article_ids))
+        registry.inc("ingested_articles_total", len(article_ids or ()),
+                     help="Articles added to this worker's catalog from ingest events")
+    finally:
+        conn.close()
+
+
+# With INGEST_EVENTS=1 workers LISTEN for the pipeline's "articles ingested"
+# events and extend their catalog right away (the CATALOG_TTL reload stays as
+# a backstop).
+ingest_listener = (IngestListener(get_connection, _on_articles_ingested)
+                   if os.getenv("INGEST_EVENTS", "0") == "1" and snapshots is None else None)
+
+
+def start_ingest_listener() -> None:
+    if ingest_listener is not None:
+        ingest_listener.start()
+
+
+def stop_ingest_listener() -> None:
+    if ingest_listener is not None:
+        ingest_listener.stop(timeout=5)
+
+
+# With ARTICLE_MAX_AGE_DAYS set, articles that age out of the window between
+# loads (or while a snapshot is live) are evicted in bulk every EVICT_INTERVAL
+# seconds, together with their embeddings.
+EVICT_INTERVAL = float(os.getenv("EVICT_INTERVAL", "60"))
+_fresh = (None, None, None, None, 0.0)  # (source catalog, fresh catalog, source embeddings, fresh embeddings, at)
+_fresh_lock = threading.Lock()
+
+
+def _fresh_state(catalog, embeddings):
+    global _fresh
+    source, fresh, source_emb, fresh_emb, at = _fresh
+    if source is not catalog or source_emb is not embeddings or time.monotonic() - at > EVICT_INTERVAL:
+        with _fresh_lock:
+            source, fresh, source_emb, fresh_emb, at = _fresh
+            if source is not catalog or source_emb is not embeddings or time.monotonic() - at > EVICT_INTERVAL:
+                fresh = (fresh if source is catalog else catalog).evict_expired()
+                if embeddings is None:
+                    fresh_emb = None
+                else:
+                    fresh_emb = (fresh_emb if source_emb is embeddings else embeddings).retain(fresh.ids)
+                _fresh = (catalog, fresh, embeddings, fresh_emb, time.monotonic())
+    return fresh, fresh_emb
+
+
+def get_catalog(conn, refresh: bool = False) -> ArticleCatalog:
+    catalog = _loaded_catalog(conn, refresh)
+    if not ARTICLE_MAX_AGE_DAYS:
+        return catalog
+    return _fresh_state(catalog, _loaded_embeddings(conn))[0]
+
+
+class _ReloadedFile:
+    """
+    An object loaded from `path` by `load`, re-read when an offline job
+    replaces the file (its mtime is checked at most every `interval` seconds).
+    None until the file exists, or if no path is configured. `on_reload` is
+    called after each (re)load, to drop state derived from the old object.
+    """
+
+    def __init__(self, path, load, interval: float = CATALOG_TTL, on_reload: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.load = load
+        self.interval = interval
+        self.on_reload = on_reload
+        self._value = None
+        self._mtime = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self.path or time.monotonic() - self._checked_at < self.interval:
+            return self._value
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.interval:
+                try:
+                    mtime = os.path.getmtime(self.path)
+                    if mtime != self._mtime:
+                        self._value = self.load(self.path)
+                        self._mtime = mtime
+                        if self.on_reload is not None:
+                            self.on_reload()
+                except FileNotFoundError:
+                    pass
+                self._checked_at = time.monotonic()
+        return self._value
+
+
+# Per-worker co-engagement matrix (scripts/update_co_engagement.py) and latent
+# factors (scripts/train_factors.py). Cached component matrices include their
+# columns, so a reload drops them.
+_co_engagement = _ReloadedFile(CO_ENGAGEMENT_PATH, CoEngagement.load, on_reload=component_cache.invalidate)
+_factors = _ReloadedFile(FACTOR_MODEL_PATH, FactorModel.load, on_reload=component_cache.invalidate)
+
+
+def get_co_engagement():
+    return _co_engagement.get()
+
+
+def get_factors():
+    return _factors.get()
+
+
+# Without embeddings, TF-IDF similarity is only computed for the articles an LSH
+# index over the catalog's titles retrieves for the user's liked titles, once the
+# catalog has TITLE_INDEX_MIN_ARTICLES articles (0 turns the index off).
+TITLE_INDEX_MIN_ARTICLES = int(os.getenv("TITLE_INDEX_MIN_ARTICLES", "50000"))
+_title_index = (None, None, None)  # (catalog it was last synced with, index, indexed ids)
+_title_index_lock = threading.Lock()
+
+
+def get_title_index(catalog: ArticleCatalog) -> Optional[TitleLSHIndex]:
+    """
+    The worker's title index, with any articles `catalog` added since the
+    last call (reloads, ingest events) indexed incrementally. Rebuilt once
+    evicted articles make up most of it.
+    """
+    global _title_index
+    if not TITLE_INDEX_MIN_ARTICLES or len(catalog) < TITLE_INDEX_MIN_ARTICLES:
+        return None
+    source, index, indexed = _title_index
+    if source is catalog:
+        return index
+    with _title_index_lock:
+        source, index, indexed = _title_index
+        if source is not catalog:
+            if index is None or len(indexed) > 2 * len(catalog):
+                index, indexed = TitleLSHIndex.sized(len(catalog)), np.empty(0, dtype=np.int64)
+            new = np.flatnonzero(~np.isin(catalog.ids, indexed))
+            # Copy-on-write: requests may still be reading the published index
+            index = index.extended(catalog.ids[new].tolist(), [catalog.titles[i] for i in new.tolist()])
+            indexed = np.union1d(indexed, catalog.ids[new])
+            _title_index = (catalog, index, indexed)
+    return index
+
+
+def _build_trending() -> TrendingLists:
+    conn = get_connection()
+    try:
+        return TrendingLists.build(conn, get_catalog(conn))
+    finally:
+        conn.close()
+
+
+# Per-worker trending lists, rebuilt in the background every TRENDING_REFRESH
+# seconds; cold-start users are served from them (TRENDING_ENABLED=0 turns this off).
+trending = TrendingRefresher(_build_trending) if os.getenv("TRENDING_ENABLED", "1") == "1" else None
+
+
+def get_trending():
+    return trending.get() if trending is not None else None
+
+
+def warm_up() -> float:
+    """
+    Load this worker's catalog, bandit (and with it the config weights) and
+    embeddings, and exercise the similarity path once, so the first request
+    doesn't pay for it. Returns the seconds taken.
+    """
+    t0 = time.perf_counter()
+    conn = get_connection()
+    try:
+        catalog = get_catalog(conn, refresh=True)
+        get_bandit(conn)
+        get_co_engagement()
+        get_factors()
+        if trending is not None:
+            trending.refresh()
+        embeddings = get_embeddings(conn)
+        if embeddings is not None:
+            embeddings.backend.encode(["warm up"])
+        else:
+            score_title_similarity("warm up", ["warm up"])
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - t0
+    registry.set("startup_warmup_seconds", elapsed, help="Time spent preloading worker state at startup")
+    logger.info("Warm-up loaded %d articles in %.2fs", len(catalog), elapsed)
+    return elapsed
+
 
 @router.get("/recommendations/{user_id}", response_model=RecommendationResponse)
-def get_recommendations(user_id: int):
+def get_recommendations(user_id: int, cursor: Optional[str] = None):
+    """
+    A page of RECOMMENDATION_LIMIT recommendations. Pass the response's
+    next_cursor back as `cursor` for the next page, served from the same
+    ranking without rescoring.
+    """
+    ranked, offset = None, 0
+    if cursor:
+        try:
+            token, offset = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        ranked = ranked_snapshots.get(token, user_id)
+        if ranked is None and seen_articles is not None:
+            # Snapshot expired or ranked by another worker: re-ranking leaves out
+            # the pages already served (logged as seen), so continue from its top
+            offset = 0
+
+    conn = get_connection()
+    try:
+        with profiled("get_recommendations", user_id=user_id):
+            bandit = get_bandit(conn)
+            if ranked is None:
+                embeddings, catalog = get_embeddings(conn), get_catalog(conn)
+                ranked = recommendation_flights.do(
+                    (user_id, PAGINATION_DEPTH), recommend_articles, conn, user_id, PAGINATION_DEPTH,
+                    cache=component_cache, bandit=bandit, embeddings=embeddings, catalog=catalog,
+                    seen=seen_articles, co_engagement=get_co_engagement(), factors=get_factors(),
+                    trending=get_trending(), diversity=DIVERSITY,
+                    title_index=get_title_index(catalog) if embeddings is None else None)
+                token = ranked_snapshots.put(user_id, ranked) if len(ranked) > offset + RECOMMENDATION_LIMIT else ""
+            recommendations, next_cursor = ranked_snapshots.page(token, ranked, offset, RECOMMENDATION_LIMIT)
+            if recommendations:
+                log_recommendations(conn, user_id, recommendations, bandit=bandit, seen=seen_articles)
+            return {"recommendations": recommendations, "next_cursor": next_cursor}
+    finally:
+        conn.close()
+
+
+@router.get("/trending", response_model=RecommendationResponse)
+def get_trending_articles(country: Optional[str] = None, category: Optional[str] = None,
+                          limit: int = RECOMMENDATION_LIMIT):
+    """Most engaged-with recent articles, overall or for one country or category; not logged."""
+    lists = get_trending()
+    if lists is None:
+        return {"recommendations": []}
+    return {"recommendations": lists.top(limit, country=country, category=category)}
+
+
+@router.post("/recommendations:batch")
+def post_recommendations_batch(request: BatchRecommendationRequest):
+    """
+    Recommendations for many users as NDJSON, one line per user as soon as it
+    is scored: {"user_id": ..., "recommendations": [...]}.
+    """
+    def stream():
+        conn = get_connection()
+        try:
+            bandit = get_bandit(conn)
+            catalog = get_catalog(conn)
+            embeddings = get_embeddings(conn)
+            results = recommend_articles_batch(conn, request.user_ids, request.limit, bandit=bandit,
+                                               embeddings=embeddings, catalog=catalog,
+                                               seen=seen_articles, co_engagement=get_co_engagement(),
+                                               factors=get_factors(), trending=get_trending(),
+                                               diversity=DIVERSITY,
+                                               title_index=get_title_index(catalog) if embeddings is None else None)
+            for user_id, recs in results:
+                if request.log_impressions and recs:
+                    log_recommendations(conn, user_id, recs, bandit=bandit, seen=seen_articles)
+                line = {
+                    "user_id": user_id,
+                    "recommendations": [Recommendation(**r).model_dump() for r in recs],
+                }
+                yield json.dumps(line) + "\n"
+        finally:
+            conn.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/clicks", status_code=204)
+def post_click(click: Click):
     conn = get_connection()
     try:
-        recommendations = recommend_articles(conn, user_id)
-        return {"recommendations": recommendations}
+        log_click(conn, click.user_id, click.article_id, click.scoring_config_id, bandit=get_bandit(conn),
+                  seen=seen_articles)
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -0,0 +1,250 @@
+"""
+Reproducible performance benchmarks.
+
+    python -m benchmarks.run_benchmarks --articles 10000 --users 200 --output bench.json
+
+Each scenario runs in a fresh process (so peak RSS is per scenario) against a
+deterministic synthetic dataset and reports throughput, p50/p99 latency and
+peak RSS as JSON, tagged with the current git commit so runs can be diffed.
+
+Backends:
+  memory    the recommender runs against an InMemoryRepository holding the
+            synthetic dataset, isolating CPU cost from I/O
+  postgres  the dataset is inserted into the database from .env first;
+            point it at a scratch database
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from multiprocessing import get_context
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticDataset
+
+SCENARIOS = ("recommend", "recommend_preloaded", "recommend_diverse", "batch", "api", "ingest", "evaluate")
+
+
+# ---------- helpers ----------
+
+def summarize(latencies, items=None):
+    lat = np.asarray(latencies, dtype=np.float64)
+    total = float(lat.sum())
+    count = items if items is not None else len(lat)
+    return {
+        "iterations": len(lat),
+        "throughput_per_s": count / total if total else 0.0,
+        "p50_ms": float(np.percentile(lat, 50) * 1000) if len(lat) else 0.0,
+        "p99_ms": float(np.percentile(lat, 99) * 1000) if len(lat) else 0.0,
+        "mean_ms": float(lat.mean() * 1000) if len(lat) else 0.0,
+    }
+
+
+def measure(fn, iterations, warmup=1):
+    for _ in range(warmup):
+        fn(0)
+    out = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def build_embeddings(catalog, similarity):
+    if similarity != "embeddings":
+        return None
+    from nlp.embeddings import ArticleEmbeddings, HashingBackend
+    backend = HashingBackend(dim=256)
+    return ArticleEmbeddings(backend, catalog.ids, backend.encode(catalog.titles))
+
+
+def seed_postgres(conn, ds):
+    """
+    Insert the dataset and return ({synthetic user id: db user id},
+    {synthetic article id: db article id}).
+    """
+    from psycopg2.extras import Json, execute_values
+    from fetcher.save_articles import insert_articles
+
+    tag = f"bench{int(time.time())}"
+    # Tagged links so a rerun against the same database inserts every article again
+    results = [dict(r, link=f"{r['link']}?{tag}") for r in ds.newsdata_results()]
+    new_ids = insert_articles(conn, results)
+    if len(new_ids) != len(ds.articles):
+        raise RuntimeError(f"Inserted {len(new_ids)} of {len(ds.articles)} synthetic articles")
+    # Ids are assigned in VALUES order, so ascending ids follow the synthetic order
+    article_map = {a[0]: db_id for a, db_id in zip(ds.articles, sorted(new_ids))}
+    user_map = {}
+    with conn.cursor() as cur:
+        for uid, p in ds.profiles.items():
+            cur.execute("""
+                INSERT INTO users (username, preferred_categories, preferred_countries, liked_categories, liked_countries)
+                VALUES (%s, %s, %s, %s, %s) RETURNING id
+            """, (f"{tag}_{uid}", p["preferred_categories"], p["preferred_countries"],
+                  Json(p["liked_categories"]), Json(p["liked_countries"])))
+            user_map[uid] = cur.fetchone()[0]
+        execute_values(cur, "INSERT INTO liked_titles (user_id, title) VALUES %s",
+                       [(user_map[u], t) for u, titles in ds.liked_titles.items() for t in titles])
+        execute_values(cur, """
+            INSERT INTO interactions (user_id, article_id, interaction_type, time_spent) VALUES %s
+        """, [(user_map[u], article_map[aid], "read", t)
+              for u, spent in ds.time_spent.items() for aid, t in spent.items()])
+    conn.commit()
+    return user_map, article_map
+
+
+# ---------- scenarios ----------
+
+def run_scenario(name, args):
+    """Runs in a child process; returns the scenario's metrics."""
+    t0 = time.perf_counter()
+    ds = SyntheticDataset(args.articles, args.users, seed=args.seed)
+    rng = random.Random(args.seed)
+    setup_s = time.perf_counter() - t0
+
+    from recommender.recommender import recommend_articles, recommend_articles_batch
+    from recommender.catalog import ArticleCatalog
+
+    with ExitStack() as stack:
+        user_ids = ds.user_ids
+        if args.backend == "memory":
+            conn = ds.to_repository()
+        else:
+            from db.connection import get_connection
+            conn = get_connection()
+            stack.callback(conn.close)
+            if name != "ingest":
+                user_map, article_map = seed_postgres(conn, ds)
+                user_ids = [user_map[u] for u in ds.user_ids]
+
+        # Built from what the recommender will see, so ids match on either backend
+        embeddings = build_embeddings(ArticleCatalog.load(conn), args.similarity)
+        pick = lambda i: user_ids[rng.randrange(len(user_ids))]
+
+        if name == "recommend":
+            lat = measure(lambda i: recommend_articles(conn, pick(i), embeddings=embeddings), args.iterations)
+            result = summarize(lat)
+
+        elif name == "recommend_preloaded":
+            catalog = ArticleCatalog.load(conn)
+            lat = measure(lambda i: recommend_articles(conn, pick(i), embeddings=embeddings, catalog=catalog),
+                          args.iterations)
+            result = summarize(lat)
+
+        elif name == "recommend_diverse":
+            # recommend_preloaded plus the MMR re-ranking stage; the difference is its cost
+            from recommender.diversity import DIVERSITY_LAMBDA
+            catalog = ArticleCatalog.load(conn)
+            lat = measure(lambda i: recommend_articles(conn, pick(i), embeddings=embeddings, catalog=catalog,
+                                                       diversity=DIVERSITY_LAMBDA),
+                          args.iterations)
+            result = summarize(lat)
+
+        elif name == "batch":
+            def run(i):
+                for _ in recommend_articles_batch(conn, user_ids, embeddings=embeddings):
+                    pass
+            lat = measure(run, max(1, args.iterations // 10), warmup=0)
+            result = summarize(lat, items=len(user_ids) * len(lat))
+
+        elif name == "api":
+            import api.routes as routes
+            from fastapi.testclient import TestClient
+            from api.main import app
+            if args.backend == "memory":
+                stack.enter_context(patch.object(routes, "get_connection", return_value=conn))
+            stack.enter_context(patch.object(routes, "get_bandit", return_value=None))
+            stack.enter_context(patch.object(routes, "get_embeddings", return_value=embeddings))
+            client = TestClient(app)
+            lat = measure(lambda i: client.get(f"/recommendations/{pick(i)}").raise_for_status(), args.iterations)
+            result = summarize(lat)
+
+        elif name == "ingest":
+            if args.backend == "memory":
+                from nlp.embeddings import HashingBackend
+                from recommender.catalog import row_to_score_tuple
+                backend = HashingBackend(dim=256)
+                def run(i):
+                    ArticleCatalog([row_to_score_tuple(a) for a in ds.articles])
+                    backend.encode([a[1] for a in ds.articles])
+            else:
+                from fetcher.save_articles import insert_articles
+                results = ds.newsdata_results()
+                run = lambda i: insert_articles(conn, results)
+            lat = measure(run, max(1, args.iterations // 10), warmup=0)
+            result = summarize(lat, items=len(ds.articles) * len(lat))
+
+        elif name == "evaluate":
+            from recommender.replay import build_slate_components, replay, weight_grid
+            slates = ds.slates(rng)
+            if args.backend == "postgres":
+                slates = {user_map[u]: [(article_map[a], clicked) for a, clicked in items]
+                          for u, items in slates.items()}
+            grid = weight_grid()
+            def run(i):
+                replay(build_slate_components(conn, slates), grid, k=5)
+            lat = measure(run, max(1, args.iterations // 10), warmup=0)
+            result = summarize(lat, items=len(grid) * len(lat))
+            result["configs"] = len(grid)
+
+        else:
+            raise ValueError(f"Unknown scenario {name!r}")
+
+    result["setup_s"] = setup_s
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(__file__)).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--similarity", choices=("embeddings", "tfidf"), default="embeddings",
+                        help="tfidf uses the ingest-time title term counts")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "scenarios": {},
+    }
+    for name in args.scenarios.split(","):
+        # A fresh process per scenario so peak RSS isn't inherited from the previous one
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            report["scenarios"][name] = pool.submit(run_scenario, name, args).result()
+        print(f"{name}: {report['scenarios'][name]}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Deterministic synthetic catalog/user generator for benchmarks.
+
+Titles are drawn from a fixed vocabulary with a topic bias per category, so
+title similarity behaves roughly like real headlines (related stories share
+words) rather than like random noise.
+"""
+import random
+from typing import Dict, List, Tuple
+
+COUNTRIES = [
+    "united states of america", "united kingdom", "canada", "japan", "india",
+    "germany", "france", "australia", "brazil", "south africa",
+]
+CATEGORIES = [
+    "business", "technology", "health", "sports", "science",
+    "entertainment", "politics", "world", "environment", "top",
+]
+_COMMON = [f"w{i}" for i in range(2000)]
+
+
+class SyntheticDataset:
+    def __init__(self, n_articles: int = 1000, n_users: int = 100, likes_per_user: int = 5,
+                 interactions_per_user: int = 20, seed: int = 42):
+        rng = random.Random(seed)
+        topic_words = {c: [f"{c[:4]}{i}" for i in range(200)] for c in CATEGORIES}
+
+        # (id, title, country, category) like FETCH_ARTICLES rows; country uses the
+        # Postgres array-literal form NewsData rows end up with.
+        self.articles: List[Tuple[int, str, str, List[str]]] = []
+        for aid in range(1, n_articles + 1):
+            cats = rng.sample(CATEGORIES, k=rng.choice((1, 1, 2)))
+            words = rng.sample(topic_words[cats[0]], 4) + rng.sample(_COMMON, 4)
+            rng.shuffle(words)
+            country = '{"%s"}' % rng.choice(COUNTRIES)
+            self.articles.append((aid, " ".join(words).capitalize(), country, cats))
+
+        self.profiles: Dict[int, Dict] = {}
+        self.liked_titles: Dict[int, List[str]] = {}
+        self.time_spent: Dict[int, Dict[int, int]] = {}
+        for uid in range(1, n_users + 1):
+            pref_cats = rng.sample(CATEGORIES, 2)
+            pref_countries = rng.sample(COUNTRIES, 1)
+            engaged = rng.sample(self.articles, k=min(interactions_per_user, n_articles))
+            liked_categories: Dict[str, int] = {}
+            liked_countries: Dict[str, int] = {}
+            for _, _, country, cats in engaged[:likes_per_user]:
+                for c in cats:
+                    liked_categories[c] = liked_categories.get(c, 0) + 1
+                name = country.strip('{}"')
+                liked_countries[name] = liked_countries.get(name, 0) + 1
+            self.profiles[uid] = {
+                "preferred_categories": pref_cats,
+                "preferred_countries": pref_countries,
+                "liked_categories": liked_categories,
+                "liked_countries": liked_countries,
+            }
+            self.liked_titles[uid] = [a[1] for a in engaged[:likes_per_user]]
+            self.time_spent[uid] = {a[0]: rng.choice((30, 120, 650, 1000)) for a in engaged}
+
+        self.user_ids = list(self.profiles)
+
+    def to_repository(self):
+        """The dataset as an InMemoryRepository the recommender can run against."""
+        from db.repository import InMemoryRepository
+
+        repo = InMemoryRepository()
+        for _, title, country, category in self.articles:
+            repo.add_article(title, country, category)
+        for uid, profile in self.profiles.items():
+            repo.add_user(profile, user_id=uid)
+        for uid, titles in self.liked_titles.items():
+            repo.liked_titles[uid] = list(titles)
+        for uid, spent in self.time_spent.items():
+            repo.time_spent[uid] = dict(spent)
+        return repo
+
+    def newsdata_results(self) -> List[Dict]:
+        """Articles shaped like NewsData API results, for insert_articles()."""
+        return [{
+            "title": title,
+            "link": f"https://example.com/{aid}",
+            "pubDate": "2025-01-01 00:00:00",
+            "source_id": "synthetic",
+            "description": title,
+            "country": [country.strip('{}"')],
+            "category": cats,
+            "language": "english",
+        } for aid, title, country, cats in self.articles]
+
+    def slates(self, rng: random.Random, slate_size: int = 10, click_rate: float = 0.3):
+        """{user_id: [(article_id, clicked), ...]} shaped like replay.fetch_logged_slates()."""
+        out = {}
+        for uid in self.user_ids:
+            picks = rng.sample(self.articles, k=min(slate_size, len(self.articles)))
+            out[uid] = [(a[0], rng.random() < click_rate) for a in picks]
+        return out
@@ -1,7 +1,28 @@
-from .queries import FETCH_ARTICLES
+from .queries import FETCH_ARTICLES, FETCH_ENCODED_ARTICLES
 
 def fetch_articles(conn):
     with conn.cursor() as cur:
         cur.execute(FETCH_ARTICLES)
         return cur.fetchall()
+
+def fetch_encoded_articles(conn, since=None, article_ids=None):
+    """
+    Article rows plus their ingest-time label ids, duplicate cluster and publish
+    date: (id, title, country, category, country_id, category_ids, cluster_id,
+    pub_date). The ids are NULL for rows not yet backfilled
+    (scripts/backfill_article_labels.py, scripts/cluster_articles.py).
+    With `since`, only articles published at or after it (an index range scan);
+    with `article_ids`, only those articles.
+    """
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("pub_date >= %s")
+        params.append(since)
+    if article_ids is not None:
+        conditions.append("id = ANY(%s)")
+        params.append(list(article_ids))
+    query = FETCH_ENCODED_ARTICLES + (" WHERE " + " AND ".join(conditions) if conditions else "")
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
     
@@ -0,0 +1,24 @@
+from .queries import ADD_CONFIG_STATS, FETCH_ACTIVE_CONFIG
+
+
+def fetch_active_config(conn):
+    """
+    (config_id, w1, w2, w3) of the most recent active scoring config, or None.
+    """
+    with conn.cursor() as cur:
+        cur.execute(FETCH_ACTIVE_CONFIG)
+        row = cur.fetchone()
+    if not row:
+        return None
+    config_id, w1, w2, w3 = row
+    return int(config_id), float(w1), float(w2), float(w3)
+
+
+def add_config_stats(conn, rows):
+    """
+    Add (scoring_config_id, impressions, clicks) deltas to scoring_config_stats.
+    """
+    with conn.cursor() as cur:
+        for row in rows:
+            cur.execute(ADD_CONFIG_STATS, row)
+    conn.commit()
@@ -1,7 +1,10 @@
 import psycopg2
+import psycopg2.extensions
 import os
 from dotenv import load_dotenv
 
+from telemetry.metrics import METRICS_ENABLED, count_query
+
 load_dotenv()
 
 DB_HOST = os.getenv('DB_HOST')
@@ -10,11 +13,24 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 
+class CountingCursor(psycopg2.extensions.cursor):
+    """Cursor that reports every statement to telemetry (used when METRICS_ENABLED=1)."""
+
+    def execute(self, query, vars=None):
+        count_query()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        count_query()
+        return super().executemany(query, vars_list)
+
+
 def get_connection():
     return psycopg2.connect(
         host=DB_HOST,
         port=DB_PORT,
         database=DB_NAME,
         user=DB_USER,
-        password=DB_PASSWORD
+        password=DB_PASSWORD,
+        cursor_factory=CountingCursor if METRICS_ENABLED else None
     )
\ No newline at end of file
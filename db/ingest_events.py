@@ -0,0 +1,115 @@
+"""
+"Articles ingested" events over Postgres LISTEN/NOTIFY.
+
+The ingestion pipeline (fetcher/pipeline.py) calls notify_ingested() after
+each batch is inserted and embedded; every API worker runs an IngestListener
+and folds just those articles into its in-memory catalog and embeddings
+(ArticleCatalog.extended), instead of reloading them every CATALOG_TTL.
+
+NOTIFY is not durable: events sent while a listener is disconnected are lost,
+so after reconnecting the listener reports `None`, meaning "reload fully".
+"""
+import logging
+import select
+import threading
+from typing import Callable, Iterable, List, Optional
+
+INGEST_CHANNEL = "articles_ingested"
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD = 7900
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_payloads(article_ids: Iterable[int]) -> List[str]:
+    """Comma-separated ids, split into payloads that fit a NOTIFY."""
+    payloads, current = [], ""
+    for article_id in article_ids:
+        item = str(int(article_id))
+        if current and len(current) + 1 + len(item) > MAX_PAYLOAD:
+            payloads.append(current)
+            current = ""
+        current = f"{current},{item}" if current else item
+    if current:
+        payloads.append(current)
+    return payloads
+
+
+def parse_payload(payload: str) -> List[int]:
+    return [int(item) for item in payload.split(",") if item.strip()]
+
+
+def notify_ingested(conn, article_ids: Iterable[int]) -> int:
+    """Announce newly ingested articles; delivered when the transaction commits. Returns notifications sent."""
+    payloads = ingest_payloads(article_ids)
+    with conn.cursor() as cur:
+        for payload in payloads:
+            cur.execute("SELECT pg_notify(%s, %s)", (INGEST_CHANNEL, payload))
+    conn.commit()
+    return len(payloads)
+
+
+class IngestListener:
+    """
+    Background thread LISTENing on INGEST_CHANNEL. `on_ingested` gets the ids
+    of each poll's notifications together, or None after a reconnect.
+    """
+
+    def __init__(self, connect: Callable[[], object], on_ingested: Callable[[Optional[List[int]]], None],
+                 channel: str = INGEST_CHANNEL, poll_timeout: float = 5.0, retry_delay: float = 5.0):
+        self.connect = connect
+        self.on_ingested = on_ingested
+        self.channel = channel
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "IngestListener":
+        self._thread = threading.Thread(target=self._run, name="ingest-listener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _dispatch(self, article_ids: Optional[List[int]]) -> None:
+        try:
+            self.on_ingested(article_ids)
+        except Exception:
+            logger.exception("Handling ingested articles failed")
+
+    def _run(self) -> None:
+        import psycopg2.extensions
+
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel}")
+                if connected_before:
+                    self._dispatch(None)
+                connected_before = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    article_ids = []
+                    while conn.notifies:
+                        article_ids.extend(parse_payload(conn.notifies.pop(0).payload))
+                    if article_ids:
+                        self._dispatch(article_ids)
+            except Exception:
+                logger.exception("Ingest listener lost its connection; retrying in %.0fs", self.retry_delay)
+                self._stop.wait(self.retry_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
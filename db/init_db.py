@@ -2,12 +2,16 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from connection import get_connection
+from db.log_partitions import ensure_partitions
 
 def create_tables(conn):
     with conn.cursor() as cur:
 
         # Drop dependent tables first to avoid FK issues
+        cur.execute("DROP TABLE IF EXISTS scoring_config_stats CASCADE;")
+        cur.execute("DROP VIEW IF EXISTS recommendation_log_daily;")
         cur.execute("DROP TABLE IF EXISTS recommendation_logs CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS recommendation_log_rollups;")
         cur.execute("DROP TABLE IF EXISTS scoring_configurations CASCADE;")
 
         # Articles Table
@@ -27,6 +31,29 @@ def create_tables(conn):
             );
         """)
 
+        # Candidates are limited to a freshness window (ARTICLE_MAX_AGE_DAYS) on pub_date
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_pub_date ON articles (pub_date);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_link ON articles (link);")
+
+        # Normalized country/category names, dictionary-encoded at ingest
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS article_labels (
+                id SERIAL PRIMARY KEY,
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                UNIQUE (kind, name)
+            );
+        """)
+        cur.execute("""
+            ALTER TABLE articles
+                ADD COLUMN IF NOT EXISTS country_id INTEGER REFERENCES article_labels(id),
+                ADD COLUMN IF NOT EXISTS category_ids INTEGER[];
+        """)
+
+        # Near-duplicate cluster (see nlp/dedup.py); the representative has cluster_id = id
+        cur.execute("ALTER TABLE articles ADD COLUMN IF NOT EXISTS cluster_id INTEGER;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_cluster_id ON articles (cluster_id);")
+
         # Users Table
         cur.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -51,6 +78,10 @@ def create_tables(conn):
             );
         """)
 
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions (user_id, timestamp);")
+        # Recent interactions feed the trending lists (recommender/trending.py)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp);")
+
         # Liked Titles Table
         cur.execute("""
             CREATE TABLE IF NOT EXISTS liked_titles (
@@ -72,19 +103,85 @@ def create_tables(conn):
             );
         """)
 
-        # Recommendation Logs Table
+        # Recommendation Logs Table, range-partitioned by time (see db/log_partitions.py)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS recommendation_logs (
-                id SERIAL PRIMARY KEY,
+                id SERIAL,
                 user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
                 article_id INTEGER REFERENCES articles(id) ON DELETE CASCADE,
                 scoring_config_id INTEGER REFERENCES scoring_configurations(id) ON DELETE CASCADE,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                clicked BOOLEAN DEFAULT FALSE
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                clicked BOOLEAN DEFAULT FALSE,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recommendation_logs_user_article
+            ON recommendation_logs (user_id, article_id, timestamp);
+        """)
+
+        # Per-day, per-config aggregates of expired log partitions
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS recommendation_log_rollups (
+                day DATE NOT NULL,
+                scoring_config_id INTEGER,
+                impressions BIGINT NOT NULL,
+                clicks BIGINT NOT NULL
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recommendation_log_rollups_day
+            ON recommendation_log_rollups (day);
+        """)
+        cur.execute("""
+            CREATE OR REPLACE VIEW recommendation_log_daily AS
+            SELECT day, scoring_config_id, impressions, clicks
+            FROM recommendation_log_rollups
+            UNION ALL
+            SELECT timestamp::date, scoring_config_id, COUNT(*), COUNT(*) FILTER (WHERE clicked)
+            FROM recommendation_logs
+            GROUP BY 1, 2;
+        """)
+
+        # Title embeddings computed at ingest (see nlp/embeddings.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS article_embeddings (
+                article_id INTEGER PRIMARY KEY REFERENCES articles(id) ON DELETE CASCADE,
+                backend TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BYTEA NOT NULL
+            );
+        """)
+
+        # Title/description term counts computed at ingest (see nlp/term_features.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS terms (
+                id SERIAL PRIMARY KEY,
+                term TEXT UNIQUE NOT NULL
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS article_terms (
+                article_id INTEGER PRIMARY KEY REFERENCES articles(id) ON DELETE CASCADE,
+                title_terms INTEGER[] NOT NULL,
+                title_counts INTEGER[] NOT NULL,
+                description_terms INTEGER[] NOT NULL,
+                description_counts INTEGER[] NOT NULL
+            );
+        """)
+
+        # Bandit counters per scoring config (see recommender/bandit.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS scoring_config_stats (
+                scoring_config_id INTEGER PRIMARY KEY REFERENCES scoring_configurations(id) ON DELETE CASCADE,
+                impressions BIGINT NOT NULL DEFAULT 0,
+                clicks BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
 
         conn.commit()
+        ensure_partitions(conn)
         print("✅ All tables created and ensured.")
 
 if __name__ == "__main__":
@@ -1,9 +1,20 @@
-from .queries import FETCH_TIME_SPENT
+from .queries import FETCH_TIME_SPENT, FETCH_TIME_SPENT_MANY
 
 def fetch_time_spent(conn, user_id):
     with conn.cursor() as cur:
         cur.execute(FETCH_TIME_SPENT, (user_id,))
         return dict(cur.fetchall())
+
+def fetch_time_spent_many(conn, user_ids):
+    """
+    {user_id: {article_id: time_spent}} for many users in one query.
+    """
+    result = {uid: {} for uid in user_ids}
+    with conn.cursor() as cur:
+        cur.execute(FETCH_TIME_SPENT_MANY, (list(user_ids),))
+        for user_id, article_id, time_spent in cur.fetchall():
+            result.setdefault(user_id, {})[article_id] = time_spent
+    return result
     
 def insert_interaction(conn, user_id, article_id, interaction_type, time_spent=0):
     """
@@ -0,0 +1,44 @@
+from psycopg2.extras import execute_values
+
+from recommender.utils import normalize_categories, normalize_country
+from .queries import FETCH_LABELS
+
+COUNTRY = "country"
+CATEGORY = "category"
+
+
+def fetch_labels(conn, kind):
+    """{normalized name: label id} for one kind of article label."""
+    with conn.cursor() as cur:
+        cur.execute(FETCH_LABELS, (kind,))
+        return dict(cur.fetchall())
+
+
+def encode_labels(conn, kind, names):
+    """
+    Ids for `names`, inserting the ones not seen before. Names must already be
+    normalized; returns {name: id}.
+    """
+    names = sorted(set(names))
+    if not names:
+        return {}
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO article_labels (kind, name) VALUES %s
+            ON CONFLICT (kind, name) DO NOTHING
+        """, [(kind, n) for n in names])
+        cur.execute("SELECT name, id FROM article_labels WHERE kind = %s AND name = ANY(%s)", (kind, names))
+        return dict(cur.fetchall())
+
+
+def encode_article_labels(conn, countries, categories):
+    """
+    Normalize and dictionary-encode raw country/category values for a batch of
+    articles: ([country_id, ...], [[category_id, ...], ...]) in the same order.
+    """
+    country_names = [normalize_country(c) for c in countries]
+    category_names = [normalize_categories(c) for c in categories]
+    country_ids = encode_labels(conn, COUNTRY, country_names)
+    category_ids = encode_labels(conn, CATEGORY, [n for names in category_names for n in names])
+    return ([country_ids[n] for n in country_names],
+            [[category_ids[n] for n in names] for names in category_names])
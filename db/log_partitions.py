@@ -0,0 +1,177 @@
+"""
+Time partitions of recommendation_logs.
+
+recommendation_logs is range-partitioned on `timestamp` (monthly by default,
+or daily with LOG_PARTITION_INTERVAL=day). scripts/maintain_log_partitions.py
+runs periodically to:
+
+  * create the partitions for the next LOG_PARTITIONS_AHEAD periods, so
+    inserts never land in the default partition. If runs were missed and a
+    period's rows already went to the default partition, they are moved into
+    the new partition (Postgres refuses to create it otherwise);
+  * roll partitions older than LOG_RETENTION_DAYS up into per-day, per-config
+    rows of recommendation_log_rollups, then drop them (or only detach them,
+    leaving a standalone table to archive). Expired rows in the default
+    partition are rolled up and deleted the same way.
+
+The recommendation_log_daily view unions the rollups with the live raw rows,
+so all-time CTR queries read a few aggregate rows plus recent partitions.
+"""
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from psycopg2 import sql
+
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "month")
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "3"))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "180"))
+
+PARENT = "recommendation_logs"
+DEFAULT_PARTITION = "recommendation_logs_default"
+
+logger = logging.getLogger(__name__)
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def period_start(ts: datetime, interval: str = LOG_PARTITION_INTERVAL) -> datetime:
+    day = datetime(ts.year, ts.month, ts.day)
+    if interval == "day":
+        return day
+    if interval == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown partition interval {interval!r}; use 'month' or 'day'")
+
+
+def next_period(start: datetime, interval: str = LOG_PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT}_p{start:%Y%m%d}"
+
+
+def parse_bound(bound: str) -> Optional[Tuple[datetime, datetime]]:
+    """(from, to) of a range partition's pg_get_expr(relpartbound); None for DEFAULT."""
+    m = _BOUND.search(bound)
+    if m is None:
+        return None
+    return datetime.fromisoformat(m.group(1)), datetime.fromisoformat(m.group(2))
+
+
+def list_partitions(conn) -> List[Tuple[str, datetime, datetime]]:
+    """(name, from, to) of every range partition, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, (PARENT,))
+        rows = cur.fetchall()
+    parts = []
+    for name, bound in rows:
+        bounds = parse_bound(bound)
+        if bounds is not None:
+            parts.append((name, *bounds))
+    return sorted(parts, key=lambda p: p[1])
+
+
+def _create_partition(cur, name: str, start: datetime, end: datetime) -> None:
+    """
+    Create one range partition. Rows of its range already in the default
+    partition are moved into it: the default is detached, the partition
+    created and filled, and the default re-attached, in the caller's transaction.
+    """
+    cur.execute(sql.SQL("SELECT 1 FROM {} WHERE timestamp >= %s AND timestamp < %s LIMIT 1").format(
+        sql.Identifier(DEFAULT_PARTITION)), (start, end))
+    stranded = cur.fetchone() is not None
+    if stranded:
+        cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+            sql.Identifier(PARENT), sql.Identifier(DEFAULT_PARTITION)))
+    cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(name), sql.Identifier(PARENT)), (start, end))
+    if stranded:
+        cur.execute(sql.SQL("""
+            WITH moved AS (
+                DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+            )
+            INSERT INTO {} SELECT * FROM moved
+        """).format(sql.Identifier(DEFAULT_PARTITION), sql.Identifier(name)), (start, end))
+        logger.warning("Moved %d rows from %s into %s", cur.rowcount, DEFAULT_PARTITION, name)
+        cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} DEFAULT").format(
+            sql.Identifier(PARENT), sql.Identifier(DEFAULT_PARTITION)))
+
+
+def ensure_partitions(conn, ahead: int = LOG_PARTITIONS_AHEAD, interval: str = LOG_PARTITION_INTERVAL,
+                      now: Optional[datetime] = None) -> List[str]:
+    """Create the current period's partition and the next `ahead`; returns the new names."""
+    existing = list_partitions(conn)
+    start = period_start(now or datetime.utcnow(), interval)
+    created = []
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+            sql.Identifier(DEFAULT_PARTITION), sql.Identifier(PARENT)))
+        for _ in range(ahead + 1):
+            end = next_period(start, interval)
+            # Skip periods already covered, e.g. after switching from monthly to daily
+            if not any(lo < end and start < hi for _, lo, hi in existing):
+                name = partition_name(start)
+                _create_partition(cur, name, start, end)
+                created.append(name)
+            start = end
+    conn.commit()
+    return created
+
+
+def expire_partitions(conn, retention_days: int = LOG_RETENTION_DAYS, drop: bool = True,
+                      now: Optional[datetime] = None) -> List[str]:
+    """
+    Roll up and remove every partition entirely older than the retention
+    window, then the default partition's rows from before the window's first
+    day. Each rollup and its removal commit together, so a failed run can
+    simply be repeated. Returns the partition names removed.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    expired = []
+    for name, _, end in list_partitions(conn):
+        if end > cutoff:
+            break
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                INSERT INTO recommendation_log_rollups (day, scoring_config_id, impressions, clicks)
+                SELECT timestamp::date, scoring_config_id, COUNT(*), COUNT(*) FILTER (WHERE clicked)
+                FROM {}
+                GROUP BY 1, 2
+            """).format(sql.Identifier(name)))
+            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(PARENT), sql.Identifier(name)))
+            if drop:
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        conn.commit()
+        expired.append(name)
+
+    # Whole days only, so a day is either rolled up or still raw
+    before = period_start(cutoff, "day")
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+        if cur.fetchone()[0] is not None:
+            cur.execute(sql.SQL("""
+                WITH expired AS (
+                    DELETE FROM {} WHERE timestamp < %s RETURNING timestamp, scoring_config_id, clicked
+                )
+                INSERT INTO recommendation_log_rollups (day, scoring_config_id, impressions, clicks)
+                SELECT timestamp::date, scoring_config_id, COUNT(*), COUNT(*) FILTER (WHERE clicked)
+                FROM expired
+                GROUP BY 1, 2
+            """).format(sql.Identifier(DEFAULT_PARTITION)), (before,))
+            if cur.rowcount:
+                logger.info("Rolled up %s rows from before %s into %d rollup rows",
+                            DEFAULT_PARTITION, before.date(), cur.rowcount)
+    conn.commit()
+    return expired
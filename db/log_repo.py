@@ -0,0 +1,72 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from .queries import FETCH_ARTICLE_ACTIVITY, FETCH_SEEN_ARTICLES, INSERT_RECOMMENDATION_LOG, MARK_CLICKED
+
+# Clicks are matched to impressions logged within this many days, so the
+# update only touches the most recent log partitions.
+CLICK_WINDOW_DAYS = int(os.getenv("CLICK_WINDOW_DAYS", "7"))
+
+
+def insert_impressions(conn, user_id, rows):
+    """
+    Log shown (article_id, scoring_config_id) pairs as unclicked impressions.
+    """
+    now = datetime.utcnow()
+    with conn.cursor() as cur:
+        for article_id, config_id in rows:
+            cur.execute(INSERT_RECOMMENDATION_LOG, (user_id, article_id, config_id, False, now))
+    conn.commit()
+
+
+def mark_clicked(conn, user_id, article_id, scoring_config_id):
+    """
+    Mark a logged impression as clicked; insert it as clicked if none exists.
+    """
+    with conn.cursor() as cur:
+        since = datetime.utcnow() - timedelta(days=CLICK_WINDOW_DAYS)
+        cur.execute(MARK_CLICKED, (user_id, article_id, scoring_config_id, scoring_config_id, since))
+        if cur.rowcount == 0:
+            cur.execute(INSERT_RECOMMENDATION_LOG,
+                        (user_id, article_id, scoring_config_id, True, datetime.utcnow()))
+    conn.commit()
+
+
+def fetch_seen_articles(conn, user_id, since):
+    """Ids of articles shown to or interacted with by the user since `since`."""
+    with conn.cursor() as cur:
+        cur.execute(FETCH_SEEN_ARTICLES, (user_id, since, user_id, since))
+        return [r[0] for r in cur.fetchall()]
+
+
+def fetch_article_activity(conn, since):
+    """(article_id, hour, impressions, engagements) per article and hour since `since`."""
+    with conn.cursor() as cur:
+        cur.execute(FETCH_ARTICLE_ACTIVITY, (since, since))
+        return [(article_id, hour, int(impressions), int(engagements))
+                for article_id, hour, impressions, engagements in cur.fetchall()]
+
+
+def fetch_logged_slates(conn, since=None):
+    """
+    {user_id: [(article_id, clicked), ...]} from recommendation_logs, one entry
+    per (user, article) with clicked=True if any impression was clicked.
+    """
+    query = """
+        SELECT user_id, article_id, BOOL_OR(clicked)
+        FROM recommendation_logs
+        WHERE user_id IS NOT NULL AND article_id IS NOT NULL
+    """
+    params = ()
+    if since is not None:
+        query += " AND timestamp >= %s"
+        params = (since,)
+    query += " GROUP BY user_id, article_id ORDER BY user_id, MIN(id)"
+
+    slates = defaultdict(list)
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        for user_id, article_id, clicked in cur.fetchall():
+            slates[user_id].append((article_id, bool(clicked)))
+    return dict(slates)
@@ -5,6 +5,12 @@ FETCH_USER_PROFILE = """
     WHERE id = %s
 """
 
+FETCH_USER_PROFILES = """
+    SELECT id, preferred_categories, preferred_countries, liked_categories, liked_countries
+    FROM users
+    WHERE id = ANY(%s)
+"""
+
 FETCH_ARTICLES = """
     SELECT id, title, country, category
     FROM articles
@@ -16,6 +22,12 @@ FETCH_TIME_SPENT = """
     WHERE user_id = %s
 """
 
+FETCH_TIME_SPENT_MANY = """
+    SELECT user_id, article_id, time_spent
+    FROM interactions
+    WHERE user_id = ANY(%s)
+"""
+
 INSERT_LIKED_TITLE = """
     INSERT INTO liked_titles (user_id, title)
     VALUES (%s, %s)
@@ -24,4 +36,71 @@ INSERT_LIKED_TITLE = """
 FETCH_LIKED_TITLES = """
     SELECT title FROM liked_titles
     WHERE user_id = %s
-"""
\ No newline at end of file
+"""
+
+FETCH_ACTIVE_CONFIG = """
+    SELECT id, w1, w2, w3
+    FROM scoring_configurations
+    WHERE is_active = TRUE
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+INSERT_RECOMMENDATION_LOG = """
+    INSERT INTO recommendation_logs (user_id, article_id, scoring_config_id, clicked, timestamp)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+MARK_CLICKED = """
+    UPDATE recommendation_logs
+    SET clicked = TRUE
+    WHERE user_id = %s AND article_id = %s
+      AND (scoring_config_id = %s OR (scoring_config_id IS NULL AND %s IS NULL))
+      AND timestamp >= %s
+    RETURNING id
+"""
+
+FETCH_ARTICLE_ACTIVITY = """
+    SELECT article_id, hour, SUM(impressions), SUM(engagements)
+    FROM (
+        SELECT article_id, date_trunc('hour', timestamp) AS hour,
+               COUNT(*) AS impressions, COUNT(*) FILTER (WHERE clicked) AS engagements
+        FROM recommendation_logs
+        WHERE timestamp >= %s AND article_id IS NOT NULL
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT article_id, date_trunc('hour', timestamp), 0, COUNT(*)
+        FROM interactions
+        WHERE timestamp >= %s
+        GROUP BY 1, 2
+    ) activity
+    GROUP BY article_id, hour
+"""
+
+FETCH_SEEN_ARTICLES = """
+    SELECT article_id FROM recommendation_logs
+    WHERE user_id = %s AND timestamp >= %s AND article_id IS NOT NULL
+    UNION
+    SELECT article_id FROM interactions
+    WHERE user_id = %s AND timestamp >= %s
+"""
+
+ADD_CONFIG_STATS = """
+    INSERT INTO scoring_config_stats (scoring_config_id, impressions, clicks, updated_at)
+    VALUES (%s, %s, %s, NOW())
+    ON CONFLICT (scoring_config_id) DO UPDATE
+    SET impressions = scoring_config_stats.impressions + EXCLUDED.impressions,
+        clicks = scoring_config_stats.clicks + EXCLUDED.clicks,
+        updated_at = EXCLUDED.updated_at
+"""
+
+FETCH_ENCODED_ARTICLES = """
+    SELECT id, title, country, category, country_id, category_ids, cluster_id, pub_date
+    FROM articles
+"""
+
+FETCH_LABELS = """
+    SELECT name, id
+    FROM article_labels
+    WHERE kind = %s
+"""
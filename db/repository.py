@@ -0,0 +1,379 @@
+"""
+Data access behind one interface, so the recommender doesn't care where rows live.
+
+PostgresRepository wraps a psycopg2 connection and delegates to the *_repo
+modules. InMemoryRepository keeps everything in dicts and lists: tests and
+benchmarks can then run the real recommender without a database (and without
+faking cursors), which isolates CPU cost from I/O.
+
+Functions that used to take a raw `conn` accept either; as_repository() wraps
+a connection and passes a repository through unchanged.
+"""
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from db import article_repo, config_repo, interaction_repo, label_repo, log_repo, user_repo
+from nlp import liked_title_repo, term_features
+from nlp.dedup import NearDuplicateIndex
+from recommender.utils import normalize_categories, normalize_country
+
+Profile = Dict[str, Any]
+ArticleRow = Tuple[int, str, Optional[str], Optional[List[str]]]
+# ArticleRow + (country_id, category_ids, cluster_id, pub_date); None until encoded/clustered
+EncodedArticleRow = Tuple[int, str, Optional[str], Optional[List[str]], Optional[int], Optional[List[int]],
+                          Optional[int], Optional[datetime]]
+
+
+class Repository(ABC):
+    """Every read and write the recommender makes."""
+
+    # ---------- users ----------
+
+    @abstractmethod
+    def fetch_user_profile(self, user_id: int) -> Optional[Profile]:
+        ...
+
+    @abstractmethod
+    def fetch_user_profiles(self, user_ids: Sequence[int]) -> Dict[int, Profile]:
+        ...
+
+    # ---------- articles ----------
+
+    @abstractmethod
+    def fetch_articles(self) -> List[ArticleRow]:
+        ...
+
+    @abstractmethod
+    def fetch_encoded_articles(self, since: Optional[datetime] = None,
+                               article_ids: Optional[Sequence[int]] = None) -> List[EncodedArticleRow]:
+        """Articles published at or after `since` (all of them if None), optionally only `article_ids`."""
+
+    @abstractmethod
+    def fetch_labels(self, kind: str) -> Dict[str, int]:
+        """{normalized name: id} for label_repo.COUNTRY or label_repo.CATEGORY."""
+
+    @abstractmethod
+    def fetch_title_terms(self, since: Optional[datetime] = None,
+                          article_ids: Optional[Sequence[int]] = None) -> Dict[int, Tuple[List[int], List[int]]]:
+        """{article_id: (term_ids, counts)} for articles preprocessed at ingest."""
+
+    @abstractmethod
+    def fetch_term_vocabulary(self, term_ids: Optional[Sequence[int]] = None) -> Dict[str, int]:
+        """{term: id}, for every term or only `term_ids`."""
+
+    # ---------- interactions ----------
+
+    @abstractmethod
+    def fetch_time_spent(self, user_id: int) -> Dict[int, int]:
+        ...
+
+    @abstractmethod
+    def fetch_time_spent_many(self, user_ids: Sequence[int]) -> Dict[int, Dict[int, int]]:
+        ...
+
+    @abstractmethod
+    def insert_interaction(self, user_id: int, article_id: int, interaction_type: str,
+                           time_spent: int = 0) -> None:
+        ...
+
+    # ---------- liked titles ----------
+
+    @abstractmethod
+    def fetch_liked_titles(self, user_id: int) -> List[str]:
+        ...
+
+    @abstractmethod
+    def fetch_liked_titles_many(self, user_ids: Sequence[int]) -> Dict[int, List[str]]:
+        ...
+
+    @abstractmethod
+    def save_liked_title(self, user_id: int, title: str) -> None:
+        ...
+
+    # ---------- scoring configs ----------
+
+    @abstractmethod
+    def fetch_active_config(self) -> Optional[Tuple[int, float, float, float]]:
+        ...
+
+    @abstractmethod
+    def add_config_stats(self, rows: Iterable[Tuple[int, int, int]]) -> None:
+        ...
+
+    # ---------- recommendation logs ----------
+
+    @abstractmethod
+    def insert_impressions(self, user_id: int, rows: Iterable[Tuple[int, Optional[int]]]) -> None:
+        ...
+
+    @abstractmethod
+    def mark_clicked(self, user_id: int, article_id: int, scoring_config_id: Optional[int]) -> None:
+        ...
+
+    @abstractmethod
+    def fetch_logged_slates(self, since: Optional[datetime] = None) -> Dict[int, List[Tuple[int, bool]]]:
+        ...
+
+    @abstractmethod
+    def fetch_seen_articles(self, user_id: int, since: datetime) -> List[int]:
+        """Articles shown to (logged impressions) or interacted with by the user since `since`."""
+
+    @abstractmethod
+    def fetch_article_activity(self, since: datetime) -> List[Tuple[int, datetime, int, int]]:
+        """
+        (article_id, hour, impressions, engagements) per article and hour since
+        `since`; engagements are clicked impressions plus interactions rows.
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class PostgresRepository(Repository):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def fetch_user_profile(self, user_id):
+        return user_repo.fetch_user_profile(self.conn, user_id)
+
+    def fetch_user_profiles(self, user_ids):
+        return user_repo.fetch_user_profiles(self.conn, user_ids)
+
+    def fetch_articles(self):
+        return article_repo.fetch_articles(self.conn)
+
+    def fetch_encoded_articles(self, since=None, article_ids=None):
+        return article_repo.fetch_encoded_articles(self.conn, since, article_ids)
+
+    def fetch_labels(self, kind):
+        return label_repo.fetch_labels(self.conn, kind)
+
+    def fetch_title_terms(self, since=None, article_ids=None):
+        return term_features.fetch_title_terms(self.conn, since, article_ids)
+
+    def fetch_term_vocabulary(self, term_ids=None):
+        return term_features.fetch_term_vocabulary(self.conn, term_ids)
+
+    def fetch_time_spent(self, user_id):
+        return interaction_repo.fetch_time_spent(self.conn, user_id)
+
+    def fetch_time_spent_many(self, user_ids):
+        return interaction_repo.fetch_time_spent_many(self.conn, user_ids)
+
+    def insert_interaction(self, user_id, article_id, interaction_type, time_spent=0):
+        interaction_repo.insert_interaction(self.conn, user_id, article_id, interaction_type, time_spent)
+
+    def fetch_liked_titles(self, user_id):
+        return liked_title_repo.fetch_liked_titles(self.conn, user_id)
+
+    def fetch_liked_titles_many(self, user_ids):
+        return liked_title_repo.fetch_liked_titles_many(self.conn, user_ids)
+
+    def save_liked_title(self, user_id, title):
+        liked_title_repo.save_liked_title(self.conn, user_id, title)
+
+    def fetch_active_config(self):
+        return config_repo.fetch_active_config(self.conn)
+
+    def add_config_stats(self, rows):
+        config_repo.add_config_stats(self.conn, rows)
+
+    def insert_impressions(self, user_id, rows):
+        log_repo.insert_impressions(self.conn, user_id, rows)
+
+    def mark_clicked(self, user_id, article_id, scoring_config_id):
+        log_repo.mark_clicked(self.conn, user_id, article_id, scoring_config_id)
+
+    def fetch_logged_slates(self, since=None):
+        return log_repo.fetch_logged_slates(self.conn, since)
+
+    def fetch_seen_articles(self, user_id, since):
+        return log_repo.fetch_seen_articles(self.conn, user_id, since)
+
+    def fetch_article_activity(self, since):
+        return log_repo.fetch_article_activity(self.conn, since)
+
+    def close(self):
+        self.conn.close()
+
+
+class InMemoryRepository(Repository):
+    """
+    The same data as the Postgres schema, held in plain Python containers.
+    Ids are assigned sequentially from 1 by the add_* helpers.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[int, Profile] = {}
+        self.articles: List[ArticleRow] = []
+        # Encoded at add_article(), like insert_articles() does at ingest
+        self.labels: Dict[str, Dict[str, int]] = {label_repo.COUNTRY: {}, label_repo.CATEGORY: {}}
+        self.article_labels: Dict[int, Tuple[int, List[int]]] = {}
+        self.term_vocab: Dict[str, int] = {}
+        self.title_terms: Dict[int, Tuple[List[int], List[int]]] = {}
+        self.dedup = NearDuplicateIndex()
+        self.clusters: Dict[int, int] = {}
+        self.pub_dates: Dict[int, Optional[datetime]] = {}
+        self.time_spent: Dict[int, Dict[int, int]] = defaultdict(dict)
+        self.liked_titles: Dict[int, List[str]] = defaultdict(list)
+        self.configs: Dict[int, Tuple[float, float, float]] = {}
+        self.active_config_id: Optional[int] = None
+        self.config_stats: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+        # (user_id, article_id, scoring_config_id, clicked, timestamp), like recommendation_logs
+        self.logs: List[List[Any]] = []
+
+    # ---------- population ----------
+
+    def add_user(self, profile: Profile, user_id: Optional[int] = None) -> int:
+        user_id = user_id if user_id is not None else len(self.profiles) + 1
+        self.profiles[user_id] = {
+            'preferred_categories': profile.get('preferred_categories') or [],
+            'preferred_countries': profile.get('preferred_countries') or [],
+            'liked_categories': profile.get('liked_categories') or {},
+            'liked_countries': profile.get('liked_countries') or {},
+        }
+        return user_id
+
+    def add_article(self, title: str, country: Optional[str] = None,
+                    category: Optional[List[str]] = None, pub_date: Optional[datetime] = None) -> int:
+        article_id = len(self.articles) + 1
+        self.articles.append((article_id, title, country, category))
+        self.pub_dates[article_id] = pub_date
+        self.article_labels[article_id] = (
+            self._label(label_repo.COUNTRY, normalize_country(country)),
+            [self._label(label_repo.CATEGORY, c) for c in normalize_categories(category)])
+        counts = term_features.analyze(title)
+        self.title_terms[article_id] = (
+            [self.term_vocab.setdefault(t, len(self.term_vocab) + 1) for t in counts], list(counts.values()))
+        self.clusters[article_id] = self.dedup.add(article_id, title)
+        return article_id
+
+    def _label(self, kind: str, name: str) -> int:
+        ids = self.labels[kind]
+        return ids.setdefault(name, sum(len(v) for v in self.labels.values()) + 1)
+
+    def add_config(self, w1: float, w2: float, w3: float, is_active: bool = True) -> int:
+        config_id = len(self.configs) + 1
+        self.configs[config_id] = (float(w1), float(w2), float(w3))
+        if is_active:
+            self.active_config_id = config_id
+        return config_id
+
+    # ---------- Repository ----------
+
+    def fetch_user_profile(self, user_id):
+        return self.profiles.get(user_id)
+
+    def fetch_user_profiles(self, user_ids):
+        return {uid: self.profiles[uid] for uid in user_ids if uid in self.profiles}
+
+    def fetch_articles(self):
+        return list(self.articles)
+
+    def _published_since(self, article_id: int, since: Optional[datetime],
+                         article_ids: Optional[Sequence[int]] = None) -> bool:
+        if article_ids is not None and article_id not in article_ids:
+            return False
+        pub_date = self.pub_dates.get(article_id)
+        return since is None or (pub_date is not None and pub_date >= since)
+
+    def fetch_encoded_articles(self, since=None, article_ids=None):
+        wanted = set(article_ids) if article_ids is not None else None
+        return [(*row, *self.article_labels.get(row[0], (None, None)), self.clusters.get(row[0]),
+                 self.pub_dates.get(row[0]))
+                for row in self.articles if self._published_since(row[0], since, wanted)]
+
+    def fetch_labels(self, kind):
+        return dict(self.labels[kind])
+
+    def fetch_title_terms(self, since=None, article_ids=None):
+        wanted = set(article_ids) if article_ids is not None else None
+        return {aid: terms for aid, terms in self.title_terms.items() if self._published_since(aid, since, wanted)}
+
+    def fetch_term_vocabulary(self, term_ids=None):
+        if term_ids is None:
+            return dict(self.term_vocab)
+        wanted = set(term_ids)
+        return {term: tid for term, tid in self.term_vocab.items() if tid in wanted}
+
+    def fetch_time_spent(self, user_id):
+        return dict(self.time_spent.get(user_id, {}))
+
+    def fetch_time_spent_many(self, user_ids):
+        return {uid: dict(self.time_spent.get(uid, {})) for uid in user_ids}
+
+    def insert_interaction(self, user_id, article_id, interaction_type, time_spent=0):
+        # interactions keeps every row; the SQL fetch keeps the last one per article
+        self.time_spent[user_id][article_id] = time_spent
+
+    def fetch_liked_titles(self, user_id):
+        return list(self.liked_titles.get(user_id, []))
+
+    def fetch_liked_titles_many(self, user_ids):
+        return {uid: list(self.liked_titles.get(uid, [])) for uid in user_ids}
+
+    def save_liked_title(self, user_id, title):
+        self.liked_titles[user_id].append(title)
+
+    def fetch_active_config(self):
+        if self.active_config_id is None:
+            return None
+        return (self.active_config_id, *self.configs[self.active_config_id])
+
+    def add_config_stats(self, rows):
+        for config_id, impressions, clicks in rows:
+            stats = self.config_stats[config_id]
+            stats[0] += impressions
+            stats[1] += clicks
+
+    def insert_impressions(self, user_id, rows):
+        now = datetime.utcnow()
+        self.logs.extend([user_id, article_id, config_id, False, now] for article_id, config_id in rows)
+
+    def mark_clicked(self, user_id, article_id, scoring_config_id):
+        # Like log_repo.MARK_CLICKED: only impressions inside the click window
+        since = datetime.utcnow() - timedelta(days=log_repo.CLICK_WINDOW_DAYS)
+        matched = False
+        for row in self.logs:
+            if row[0] == user_id and row[1] == article_id and row[2] == scoring_config_id and row[4] >= since:
+                row[3] = matched = True
+        if not matched:
+            self.logs.append([user_id, article_id, scoring_config_id, True, datetime.utcnow()])
+
+    def fetch_logged_slates(self, since=None):
+        slates: Dict[int, Dict[int, bool]] = defaultdict(dict)
+        for user_id, article_id, _, clicked, timestamp in self.logs:
+            if since is not None and timestamp < since:
+                continue
+            items = slates[user_id]
+            items[article_id] = items.get(article_id, False) or clicked
+        return {uid: list(slates[uid].items()) for uid in sorted(slates)}
+
+    def fetch_seen_articles(self, user_id, since):
+        # interactions aren't timestamped here, so all of them count
+        seen = {row[1] for row in self.logs if row[0] == user_id and row[4] >= since}
+        return sorted(seen | set(self.time_spent.get(user_id, {})))
+
+    def fetch_article_activity(self, since):
+        counts: Dict[Tuple[int, datetime], List[int]] = defaultdict(lambda: [0, 0])
+        for _, article_id, _, clicked, timestamp in self.logs:
+            if timestamp >= since:
+                bucket = counts[article_id, timestamp.replace(minute=0, second=0, microsecond=0)]
+                bucket[0] += 1
+                bucket[1] += int(clicked)
+        # interactions aren't timestamped here, so they count in the current hour
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        for articles in self.time_spent.values():
+            for article_id in articles:
+                counts[article_id, hour][1] += 1
+        return [(article_id, hour, impressions, engagements)
+                for (article_id, hour), (impressions, engagements) in counts.items()]
+
+
+def as_repository(conn_or_repo) -> Repository:
+    """Pass a Repository through; wrap anything else as a Postgres connection."""
+    if isinstance(conn_or_repo, Repository):
+        return conn_or_repo
+    return PostgresRepository(conn_or_repo)
@@ -1,14 +1,26 @@
-from .queries import FETCH_USER_PROFILE
+from .queries import FETCH_USER_PROFILE, FETCH_USER_PROFILES
+
+
+def _row_to_profile(row):
+    return {
+        'preferred_categories': row[0] or [],
+        'preferred_countries': row[1] or [],
+        'liked_categories': row[2] or {},
+        'liked_countries': row[3] or {}
+    }
 
 def fetch_user_profile(conn, user_id):
     with conn.cursor() as cur:
         cur.execute(FETCH_USER_PROFILE, (user_id,))
         row = cur.fetchone()
         if row:
-            return {
-                'preferred_categories': row[0] or [],
-                'preferred_countries': row[1] or [],
-                'liked_categories': row[2] or {},
-                'liked_countries': row[3] or {}
-            }
-        return None
\ No newline at end of file
+            return _row_to_profile(row)
+        return None
+
+def fetch_user_profiles(conn, user_ids):
+    """
+    Profiles for many users in one query: {user_id: profile}. Unknown ids are absent.
+    """
+    with conn.cursor() as cur:
+        cur.execute(FETCH_USER_PROFILES, (list(user_ids),))
+        return {row[0]: _row_to_profile(row[1:]) for row in cur.fetchall()}
\ No newline at end of file
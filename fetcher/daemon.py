@@ -0,0 +1,88 @@
+# fetcher/daemon.py
+# Long-running fetcher: submits each configured news API query to the ingestion
+# pipeline (fetcher/pipeline.py) on its own interval, replacing cron runs of
+# main_fetch.py. Run with `python -m fetcher.daemon`; SIGTERM/SIGINT finish the
+# batches in flight and exit.
+
+import heapq
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fetcher.pipeline import IngestPipeline
+from nlp.embeddings import get_backend
+
+# ===== CONFIG =====
+# (query for fetch_articles_from_api, seconds between runs); FETCH_JOBS overrides
+# with a JSON list of [query, seconds] pairs.
+JOBS: List[Tuple[Dict[str, Any], float]] = [
+    ({"language": "en"}, 900),
+    ({"language": "en", "category": "technology"}, 1800),
+    ({"language": "en", "category": "business"}, 1800),
+    ({"language": "en", "category": "science"}, 3600),
+]
+EMBED_ON_INGEST = os.getenv("EMBED_ON_INGEST", "1") == "1"   # embed new titles in the pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Fixed-interval jobs, each due `interval` seconds after its last run."""
+
+    def __init__(self, jobs: List[Tuple[Dict[str, Any], float]], now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.jobs = jobs
+        # (next run, job index); every job runs once at start-up
+        self._heap = [(now, i) for i in range(len(jobs))]
+        heapq.heapify(self._heap)
+
+    def due(self, now: float) -> List[Dict[str, Any]]:
+        """Queries due at `now`, each rescheduled one interval later."""
+        out = []
+        while self._heap and self._heap[0][0] <= now:
+            at, i = heapq.heappop(self._heap)
+            query, interval = self.jobs[i]
+            out.append(query)
+            # Skip missed runs rather than firing them back to back
+            heapq.heappush(self._heap, (at + interval if at + interval > now else now + interval, i))
+        return out
+
+    def next_in(self, now: float) -> float:
+        return max(0.0, self._heap[0][0] - now) if self._heap else float("inf")
+
+
+def load_jobs() -> List[Tuple[Dict[str, Any], float]]:
+    raw = os.getenv("FETCH_JOBS")
+    if not raw:
+        return JOBS
+    return [(dict(query), float(interval)) for query, interval in json.loads(raw)]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    backend = get_backend() if EMBED_ON_INGEST else None
+    pipeline = IngestPipeline(embedding_backend=backend).start()
+    jobs = load_jobs()
+    scheduler = Scheduler(jobs)
+    logger.info("Fetch daemon started with %d jobs", len(jobs))
+
+    while not stopping.is_set():
+        for query in scheduler.due(time.monotonic()):
+            pipeline.submit(query)
+        stopping.wait(scheduler.next_in(time.monotonic()))
+
+    logger.info("Stopping; finishing batches in flight")
+    pipeline.close()
+    logger.info("Stopped: %s", dict(pipeline.stats))
+
+
+if __name__ == "__main__":
+    main()
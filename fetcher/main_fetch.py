@@ -1,6 +1,9 @@
 from newsdata_client import fetch_articles_from_api
 from save_articles import insert_articles
 from db.connection import get_connection
+from db.ingest_events import notify_ingested
+from nlp.dedup import NearDuplicateIndex
+from recommender.snapshot import CATALOG_SNAPSHOT_DIR, publish_from_db
 
 def main():
     articles = fetch_articles_from_api()
@@ -9,9 +12,14 @@ def main():
         return
 
     conn = get_connection()
-    insert_articles(conn, articles)
-    conn.close()
+    new_ids = insert_articles(conn, articles, dedup_index=NearDuplicateIndex.load(conn))
     print("Articles saved to DB.")
+    # API workers with INGEST_EVENTS=1 add these to their catalog right away
+    notify_ingested(conn, new_ids)
+    if CATALOG_SNAPSHOT_DIR:
+        # API workers switch to the new catalog on their next pointer check
+        print(f"Published catalog snapshot {publish_from_db(conn)}.")
+    conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
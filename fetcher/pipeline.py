@@ -0,0 +1,217 @@
+"""
+Staged article ingestion:
+
+    fetch -> normalize -> dedup -> insert -> vectorize -> publish
+
+Every stage runs in its own thread(s) and hands batches to the next through a
+bounded queue. Fetching the next page therefore overlaps inserting and
+embedding the previous one, and a slow stage (the news API, the DB, the
+embedding model) blocks its producers instead of buffering without limit.
+Each DB stage holds its own connection.
+
+  fetch      one news API call per submitted job (FETCH_WORKERS in parallel)
+  normalize  strip fields, drop articles without a title or link, and repeats within the batch
+  dedup      drop links already ingested (recently seen, or in the articles table)
+  insert     bulk insert, labels/terms/near-duplicate clusters (insert_articles)
+  vectorize  embed the new titles, if an embedding backend is given
+  publish    NOTIFY API workers (db/ingest_events.py), and publish a catalog
+             snapshot when CATALOG_SNAPSHOT_DIR is set
+
+A batch that fails in a stage is logged and dropped; the pipeline keeps going.
+"""
+import logging
+import os
+import queue
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from db.connection import get_connection
+from db.ingest_events import notify_ingested
+from fetcher.newsdata_client import fetch_articles_from_api
+from fetcher.save_articles import insert_articles
+from nlp.dedup import NearDuplicateIndex
+from nlp.embeddings import EmbeddingBackend, embed_articles
+from recommender.snapshot import CATALOG_SNAPSHOT_DIR, publish_from_db
+
+logger = logging.getLogger(__name__)
+
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+# Batches buffered between two stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+# Inserted links remembered by the dedup stage without asking the DB
+RECENT_LINKS = 50_000
+
+_STOP = object()
+
+
+class Stage:
+    """
+    `workers` threads applying `work` to batches from `inbox` and putting
+    non-empty results on `outbox`. The stop marker is passed on once every
+    worker has seen it, so stages shut down in order behind their input.
+    """
+
+    def __init__(self, name: str, work: Callable[[Any], Any], inbox: "queue.Queue",
+                 outbox: Optional["queue.Queue"], workers: int = 1, stats: Optional[Counter] = None):
+        self.name = name
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = stats if stats is not None else Counter()
+        self._alive = workers
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, name=f"ingest-{name}-{i}", daemon=True)
+                        for i in range(workers)]
+
+    def start(self) -> "Stage":
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                with self._lock:
+                    self._alive -= 1
+                    last = self._alive == 0
+                if not last:
+                    self.inbox.put(_STOP)  # for this stage's other workers
+                elif self.outbox is not None:
+                    self.outbox.put(_STOP)
+                return
+            try:
+                result = self.work(item)
+            except Exception:
+                self.stats[f"{self.name}_errors"] += 1
+                logger.exception("Ingest stage %s failed on a batch; dropping it", self.name)
+                continue
+            if result and self.outbox is not None:
+                self.outbox.put(result)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+def normalize_articles(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Whitespace-stripped articles with a title and link, first occurrence of each link."""
+    out, links = [], set()
+    for article in articles:
+        article = {k: v.strip() if isinstance(v, str) else v for k, v in article.items()}
+        link, title = article.get("link"), article.get("title")
+        if not link or not title or link in links:
+            continue
+        links.add(link)
+        out.append(article)
+    return out
+
+
+class IngestPipeline:
+    def __init__(self, connect: Callable[[], Any] = get_connection,
+                 fetch: Callable[..., List[Dict[str, Any]]] = fetch_articles_from_api,
+                 embedding_backend: Optional[EmbeddingBackend] = None,
+                 fetch_workers: int = FETCH_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 snapshot_dir: Optional[str] = CATALOG_SNAPSHOT_DIR):
+        self.connect = connect
+        self.fetch = fetch
+        self.embedding_backend = embedding_backend
+        self.snapshot_dir = snapshot_dir
+        self.stats: Counter = Counter()
+        # Links known to be stored: written by the insert stage, read by dedup
+        self._recent_links: "OrderedDict[str, None]" = OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._conns: Dict[str, Any] = {}
+
+        self.jobs: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        queues = [self.jobs] + [queue.Queue(maxsize=queue_size) for _ in range(5)]
+        steps = [("fetch", self._fetch, fetch_workers), ("normalize", self._normalize, 1),
+                 ("dedup", self._dedup, 1), ("insert", self._insert, 1),
+                 ("vectorize", self._vectorize, 1), ("publish", self._publish, 1)]
+        self.stages = [Stage(name, work, queues[i], queues[i + 1] if i + 1 < len(queues) else None,
+                             workers, self.stats)
+                       for i, (name, work, workers) in enumerate(steps)]
+        self._dedup_index: Optional[NearDuplicateIndex] = None
+
+    def _conn(self, stage: str):
+        """The stage's own connection (each DB stage runs on one thread)."""
+        conn = self._conns.get(stage)
+        if conn is None or getattr(conn, "closed", 0):
+            conn = self._conns[stage] = self.connect()
+        return conn
+
+    # ---------- stages ----------
+
+    def _fetch(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self.fetch(**job)
+
+    def _normalize(self, articles):
+        self.stats["fetched"] += len(articles)  # counted here, on a single thread
+        articles = normalize_articles(articles)
+        self.stats["normalized"] += len(articles)
+        return articles
+
+    def _dedup(self, articles):
+        with self._recent_lock:
+            fresh = [a for a in articles if a["link"] not in self._recent_links]
+        if fresh:
+            with self._conn("dedup").cursor() as cur:
+                cur.execute("SELECT link FROM articles WHERE link = ANY(%s)", ([a["link"] for a in fresh],))
+                stored = {row[0] for row in cur.fetchall()}
+            self._conn("dedup").commit()
+            fresh = [a for a in fresh if a["link"] not in stored]
+        self.stats["duplicates"] += len(articles) - len(fresh)
+        return fresh
+
+    def _insert(self, articles):
+        conn = self._conn("insert")
+        if self._dedup_index is None:
+            self._dedup_index = NearDuplicateIndex.load(conn)
+        new_ids = insert_articles(conn, articles, dedup_index=self._dedup_index)
+        self.stats["inserted"] += len(new_ids)
+        # Only links that made it into the table; a failed batch is retried on the next fetch
+        with self._recent_lock:
+            for article in articles:
+                self._recent_links[article["link"]] = None
+            while len(self._recent_links) > RECENT_LINKS:
+                self._recent_links.popitem(last=False)
+        return new_ids
+
+    def _vectorize(self, article_ids):
+        if self.embedding_backend is not None:
+            conn = self._conn("vectorize")
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, title FROM articles WHERE id = ANY(%s)", (list(article_ids),))
+                rows = cur.fetchall()
+            self.stats["embedded"] += embed_articles(conn, self.embedding_backend,
+                                                     [r[0] for r in rows], [r[1] for r in rows])
+        return article_ids
+
+    def _publish(self, article_ids):
+        conn = self._conn("publish")
+        notify_ingested(conn, article_ids)
+        if self.snapshot_dir:
+            publish_from_db(conn, self.snapshot_dir)
+        self.stats["batches"] += 1
+        logger.info("Ingested %d articles", len(article_ids))
+
+    # ---------- control ----------
+
+    def start(self) -> "IngestPipeline":
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def submit(self, job: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        """Queue one fetch (keyword arguments for `fetch`); blocks while the fetch queue is full."""
+        self.jobs.put(job, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish every submitted job, then stop the stages and close their connections."""
+        self.jobs.put(_STOP)
+        for stage in self.stages:
+            stage.join(timeout)
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
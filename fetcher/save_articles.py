@@ -1,24 +1,59 @@
 import psycopg2
+from psycopg2.extras import execute_values
 from db.connection import get_connection
+from db.label_repo import encode_article_labels
+from nlp.dedup import store_clusters
+from nlp.embeddings import embed_articles
+from nlp.term_features import store_term_features
 
-def insert_articles(conn, articles):
+def insert_articles(conn, articles, title_index=None, embedding_backend=None, dedup_index=None):
+    """
+    Insert fetched articles. If a TitleLSHIndex is given, newly inserted rows
+    are added to it so ANN retrieval sees them without a rebuild; if an
+    embedding backend is given, their titles are embedded in one batch.
+    Country and category are also stored normalized and dictionary-encoded
+    (country_id, category_ids) so the catalog loads them without string work,
+    and titles/descriptions are preprocessed into article_terms. If a
+    NearDuplicateIndex is given, each new article is assigned a cluster_id so
+    near-duplicate stories collapse to one in the catalog.
+    """
     query = """
-    INSERT INTO articles (title, content, link, pub_date, source, description, country, category, language, image_url)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT DO NOTHING;
+    INSERT INTO articles (title, content, link, pub_date, source, description, country, category, language, image_url,
+                          country_id, category_ids)
+    VALUES %s
+    ON CONFLICT DO NOTHING
+    RETURNING id, title, description;
     """
+    country_ids, category_ids = encode_article_labels(
+        conn, [a.get('country') for a in articles], [a.get('category') for a in articles])
+    rows = [(
+        article.get('title'),
+        article.get('content'),
+        article.get('link'),
+        article.get('pubDate'),
+        article.get('source_id'),
+        article.get('description'),
+        article.get('country'),
+        article.get('category'),
+        article.get('language'),
+        article.get('image_url'),
+        country_id,
+        article_category_ids
+    ) for article, country_id, article_category_ids in zip(articles, country_ids, category_ids)]
+    # One multi-row INSERT per page; RETURNING carries the title so skipped rows can't misalign ids
     with conn.cursor() as cur:
-        for article in articles:
-            cur.execute(query, (
-                article.get('title'),
-                article.get('content'),
-                article.get('link'),
-                article.get('pubDate'),
-                article.get('source_id'),
-                article.get('description'),
-                article.get('country'),
-                article.get('category'),
-                article.get('language'),
-                article.get('image_url')
-            ))
-        conn.commit()
\ No newline at end of file
+        inserted = execute_values(cur, query, rows, page_size=1000, fetch=True) if rows else []
+    conn.commit()
+    new_ids = [row[0] for row in inserted]
+    new_titles = [row[1] for row in inserted]
+    new_descriptions = [row[2] for row in inserted]
+
+    store_term_features(conn, new_ids, new_titles, new_descriptions)
+    if dedup_index is not None:
+        store_clusters(conn, new_ids, dedup_index.add_many(new_ids, new_titles))
+
+    if title_index is not None:
+        title_index.add(new_ids, new_titles)
+    if embedding_backend is not None:
+        embed_articles(conn, embedding_backend, new_ids, new_titles)
+    return new_ids
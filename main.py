@@ -1,8 +1,13 @@
 import json
+import sys
 from db.connection import get_connection
 from recommender.recommender import recommend_articles
+from telemetry.profiling import aggregate, profile_request, profiled
 
 def main():
+    # python main.py [user_id] [--profile]: with --profile, print where the time went
+    args = [a for a in sys.argv[1:] if a != "--profile"]
+    profile = "--profile" in sys.argv[1:]
     try:
         conn = get_connection()
         print("Connected to PostgreSQL.")
@@ -10,11 +15,18 @@ def main():
         print("Database connection failed:", e)
         return
 
-    user_id = 1
-    recommendations = recommend_articles(conn, user_id)
+    user_id = int(args[0]) if args else 1
+    if profile:
+        with profile_request("requested") as marked, profiled("recommend_articles", user_id=user_id):
+            recommendations = recommend_articles(conn, user_id)
+    else:
+        recommendations = recommend_articles(conn, user_id)
 
     print(json.dumps(recommendations, indent=4))
+    if profile:
+        print(aggregate.report(limit=25))
+        print(f"Profile written to {marked.path}")
     conn.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,350 @@
+"""
+Dense title embeddings for the similarity (w3) term.
+
+A backend turns text into L2-normalised float32 vectors in batches. Articles are
+embedded once at ingest (embed_articles) and kept in article_embeddings; at
+request time the user vector is the mean of their liked-title embeddings
+(cached per user) and the whole similarity column is one matrix-vector product.
+
+Backends:
+  hashing   stateless hashed term counts; no fitting, no extra dependencies
+  tfidf     TF-IDF + truncated SVD (LSA); must be fit on the catalog and saved
+  sentence  a local sentence-transformers model on CPU (optional dependency)
+Select one with EMBEDDING_BACKEND (default: hashing).
+"""
+import os
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+TFIDF_MODEL_PATH = os.getenv("TFIDF_MODEL_PATH", "tfidf_svd.pkl")
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+class EmbeddingBackend(ABC):
+    name = "base"
+    dim = 0
+
+    @abstractmethod
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Unnormalised (len(texts), dim) vectors for one batch."""
+
+    def encode(self, texts: Sequence[str], batch_size: int = 512) -> np.ndarray:
+        """(len(texts), dim) float32, rows L2-normalised (all-zero for empty text)."""
+        texts = [t or "" for t in texts]
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        out = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        return _normalize(np.vstack(out))
+
+
+class HashingBackend(EmbeddingBackend):
+    name = "hashing"
+
+    def __init__(self, dim: int = 2048):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.dim = dim
+        self._vectorizer = HashingVectorizer(n_features=dim, stop_words='english',
+                                             alternate_sign=False, norm=None)
+
+    def _encode_batch(self, texts):
+        return self._vectorizer.transform(texts).toarray()
+
+
+class TfidfBackend(EmbeddingBackend):
+    name = "tfidf"
+
+    def __init__(self, dim: int = 256, path: str = TFIDF_MODEL_PATH):
+        self.dim = dim
+        self.path = path
+        self._pipeline = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self._pipeline = pickle.load(f)
+            self.dim = self._pipeline[-1].n_components
+
+    def fit(self, corpus: Sequence[str]) -> "TfidfBackend":
+        """Fit on the catalog's titles and save; existing embeddings must be rebuilt."""
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.pipeline import make_pipeline
+
+        corpus = [t or "" for t in corpus]
+        tfidf = TfidfVectorizer(stop_words='english')
+        n_terms = len(tfidf.fit(corpus).vocabulary_)
+        self.dim = max(1, min(self.dim, n_terms - 1, len(corpus) - 1))
+        self._pipeline = make_pipeline(tfidf, TruncatedSVD(n_components=self.dim, random_state=0))
+        self._pipeline.fit(corpus)
+        with open(self.path, "wb") as f:
+            pickle.dump(self._pipeline, f)
+        return self
+
+    def _encode_batch(self, texts):
+        if self._pipeline is None:
+            raise RuntimeError(f"TF-IDF backend is not fitted; run fit() or provide {self.path}")
+        return self._pipeline.transform(texts)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = "sentence"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=sentence needs `pip install sentence-transformers`") from e
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def _encode_batch(self, texts):
+        return self._model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+BACKENDS: Dict[str, Callable[[], EmbeddingBackend]] = {
+    "hashing": HashingBackend,
+    "tfidf": TfidfBackend,
+    "sentence": SentenceTransformerBackend,
+}
+
+
+def get_backend(name: Optional[str] = None, **kwargs) -> EmbeddingBackend:
+    name = name or EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
+
+
+# ---------- storage ----------
+
+def embed_articles(conn, backend: EmbeddingBackend, article_ids: Sequence[int],
+                   titles: Sequence[str], batch_size: int = 512) -> int:
+    """Embed titles in batches and upsert them into article_embeddings."""
+    from psycopg2.extras import execute_values
+
+    if not len(article_ids):
+        return 0
+    vectors = backend.encode(titles, batch_size=batch_size)
+    rows = [(int(aid), backend.name, backend.dim, vec.tobytes()) for aid, vec in zip(article_ids, vectors)]
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO article_embeddings (article_id, backend, dim, vector)
+            VALUES %s
+            ON CONFLICT (article_id) DO UPDATE
+            SET backend = EXCLUDED.backend, dim = EXCLUDED.dim, vector = EXCLUDED.vector
+        """, rows, page_size=1000)
+    conn.commit()
+    return len(rows)
+
+
+class ArticleEmbeddings:
+    """
+    In-memory article vectors for one backend, plus a per-user cache of mean
+    liked-title vectors. With quantize=True rows are int8 with a per-row scale
+    (4x smaller); similarities are then approximate to ~1e-2.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, article_ids: Sequence[int], vectors: np.ndarray,
+                 quantize: bool = False, max_users: int = 4096, ttl: float = 300.0):
+        self.backend = backend
+        order = np.argsort(np.asarray(article_ids, dtype=np.int64), kind="stable")
+        self.ids = np.asarray(article_ids, dtype=np.int64)[order]
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), backend.dim)[order]
+        self.quantized = quantize
+        if quantize:
+            scale = np.abs(vectors).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            self.vectors = np.round(vectors / scale[:, None]).astype(np.int8)
+            self.scale = scale.astype(np.float32)
+        else:
+            self.vectors = vectors
+            self.scale = None
+        self._init_user_cache(max_users, ttl)
+
+    def _init_user_cache(self, max_users: int, ttl: float) -> None:
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, backend: EmbeddingBackend, sorted_ids: np.ndarray, vectors: np.ndarray,
+                    scale: Optional[np.ndarray] = None, max_users: int = 4096,
+                    ttl: float = 300.0) -> "ArticleEmbeddings":
+        """
+        Wrap arrays already in this class's layout (ids ascending, int8 rows when
+        `scale` is given) without copying, e.g. memory-mapped from a snapshot.
+        """
+        emb = cls.__new__(cls)
+        emb.backend = backend
+        emb.ids = sorted_ids
+        emb.vectors = vectors
+        emb.scale = scale
+        emb.quantized = scale is not None
+        emb._init_user_cache(max_users, ttl)
+        return emb
+
+    @classmethod
+    def load(cls, conn, backend: Optional[EmbeddingBackend] = None, since=None,
+             article_ids: Optional[Sequence[int]] = None, **kwargs) -> "ArticleEmbeddings":
+        """
+        Stored vectors for `backend`; with `since`, only articles published at
+        or after it, and with `article_ids` only those articles.
+        """
+        backend = backend or get_backend()
+        with conn.cursor() as cur:
+            if article_ids is not None:
+                cur.execute("""
+                    SELECT e.article_id, e.vector
+                    FROM article_embeddings e JOIN articles a ON a.id = e.article_id
+                    WHERE e.backend = %s AND e.dim = %s AND e.article_id = ANY(%s)
+                      AND (%s::timestamp IS NULL OR a.pub_date >= %s)
+                """, (backend.name, backend.dim, list(article_ids), since, since))
+            elif since is None:
+                cur.execute("""
+                    SELECT article_id, vector
+                    FROM article_embeddings
+                    WHERE backend = %s AND dim = %s
+                """, (backend.name, backend.dim))
+            else:
+                cur.execute("""
+                    SELECT e.article_id, e.vector
+                    FROM article_embeddings e JOIN articles a ON a.id = e.article_id
+                    WHERE e.backend = %s AND e.dim = %s AND a.pub_date >= %s
+                """, (backend.name, backend.dim, since))
+            rows = cur.fetchall()
+        ids = [r[0] for r in rows]
+        vectors = np.frombuffer(b"".join(bytes(r[1]) for r in rows), dtype=np.float32)
+        return cls(backend, ids, vectors.reshape(len(ids), backend.dim), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def retain(self, article_ids: Sequence[int]) -> "ArticleEmbeddings":
+        """
+        The vectors of `article_ids` only (self if nothing else is held), e.g.
+        after catalog eviction. The user-vector cache is shared, not rebuilt.
+        """
+        keep = np.isin(self.ids, np.asarray(article_ids, dtype=np.int64))
+        if keep.all():
+            return self
+        emb = ArticleEmbeddings.from_arrays(self.backend, np.asarray(self.ids[keep]), np.asarray(self.vectors[keep]),
+                                            np.asarray(self.scale[keep]) if self.scale is not None else None,
+                                            self.max_users, self.ttl)
+        emb._users, emb._lock = self._users, self._lock
+        emb.hits, emb.misses = self.hits, self.misses
+        return emb
+
+    def _align(self, article_ids: Sequence[int]):
+        """Row of each requested article in self.vectors, and whether it exists."""
+        article_ids = np.asarray(article_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, article_ids), max(len(self.ids) - 1, 0))
+        found = self.ids[pos] == article_ids if len(self.ids) else np.zeros(len(article_ids), dtype=bool)
+        return pos, found
+
+    def merged(self, other: "ArticleEmbeddings") -> "ArticleEmbeddings":
+        """
+        These vectors plus `other`'s (same backend; `other` wins for ids in
+        both), e.g. newly ingested articles. The user-vector cache is shared.
+        """
+        if not len(other):
+            return self
+        if self.quantized != other.quantized:
+            raise ValueError("Cannot merge quantized and full-precision embeddings")
+        keep = ~np.isin(self.ids, other.ids)
+        ids = np.concatenate([self.ids[keep], other.ids])
+        order = np.argsort(ids, kind="stable")
+        vectors = np.concatenate([np.asarray(self.vectors[keep]), np.asarray(other.vectors)])[order]
+        scale = None
+        if self.quantized:
+            scale = np.concatenate([np.asarray(self.scale[keep]), np.asarray(other.scale)])[order]
+        emb = ArticleEmbeddings.from_arrays(self.backend, ids[order], vectors, scale, self.max_users, self.ttl)
+        emb._users, emb._lock = self._users, self._lock
+        emb.hits, emb.misses = self.hits, self.misses
+        return emb
+
+    def article_vectors(self, article_ids: Sequence[int]) -> np.ndarray:
+        """(n, dim) float32 vectors of the given articles, dequantized; zero rows if not embedded."""
+        out = np.zeros((len(article_ids), self.vectors.shape[1]), dtype=np.float32)
+        if not len(self.ids):
+            return out
+        pos, found = self._align(article_ids)
+        out[found] = self.vectors[pos[found]]
+        if self.quantized:
+            out[found] *= self.scale[pos[found], None]
+        return out
+
+    def similarities(self, user_vec: Optional[np.ndarray], article_ids: Sequence[int]) -> np.ndarray:
+        """Cosine of each article (in the given order) with user_vec; 0 if not embedded."""
+        if user_vec is None:
+            return np.zeros(len(article_ids), dtype=np.float32)
+        return self.similarity_matrix([user_vec], article_ids)[0]
+
+    def similarity_matrix(self, user_vecs: Sequence[Optional[np.ndarray]],
+                          article_ids: Sequence[int]) -> np.ndarray:
+        """
+        (n_users, n_articles) cosines in one matrix product; rows for users
+        without a vector, and columns for articles without an embedding, are 0.
+        """
+        out = np.zeros((len(user_vecs), len(article_ids)), dtype=np.float32)
+        if not len(self.ids) or not len(user_vecs):
+            return out
+        U = np.vstack([v if v is not None else np.zeros(self.vectors.shape[1], dtype=np.float32)
+                       for v in user_vecs])
+        pos, found = self._align(article_ids)
+        block = self.vectors[pos[found]]
+        if self.quantized:
+            sims = (U @ block.T.astype(np.float32)) * self.scale[pos[found]]
+        else:
+            sims = U @ block.T
+        out[:, found] = sims
+        return out
+
+    def user_vector(self, user_id: int, liked_titles: Callable[[], List[str]]) -> Optional[np.ndarray]:
+        """
+        Mean of the user's liked-title embeddings, normalised; None if they have none.
+        `liked_titles` is only called on a cache miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        titles = liked_titles()
+        vec = None
+        if titles:
+            mean = self.backend.encode(titles).mean(axis=0, keepdims=True)
+            if np.any(mean):
+                vec = _normalize(mean)[0]
+
+        with self._lock:
+            self._users[user_id] = (now, vec)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return vec
+
+    def invalidate_user(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
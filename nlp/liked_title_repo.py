@@ -13,4 +13,16 @@ def fetch_liked_titles(conn, user_id):
             SELECT title FROM liked_titles
             WHERE user_id = %s
         """, (user_id,))
-        return [row[0] for row in cur.fetchall()]
\ No newline at end of file
+        return [row[0] for row in cur.fetchall()]
+
+
+def fetch_liked_titles_many(conn, user_ids):
+    result = {uid: [] for uid in user_ids}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT user_id, title FROM liked_titles
+            WHERE user_id = ANY(%s)
+        """, (list(user_ids),))
+        for user_id, title in cur.fetchall():
+            result.setdefault(user_id, []).append(title)
+    return result
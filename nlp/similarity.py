@@ -1,10 +1,13 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+# scikit-learn is imported on first use: it takes about a second to import and
+# most callers (API workers using embeddings, scripts) never reach this path.
 
 def compute_max_similarity(new_title, liked_titles):
     if not liked_titles:
         return 0.0
 
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     titles = liked_titles + [new_title]
     tfidf = TfidfVectorizer(stop_words='english').fit_transform(titles)
     similarity_matrix = cosine_similarity(tfidf[-1], tfidf[:-1])
@@ -12,4 +15,4 @@ def compute_max_similarity(new_title, liked_titles):
 
 
 def score_title_similarity(new_title, liked_titles):
-    return compute_max_similarity(new_title, liked_titles)
\ No newline at end of file
+    return compute_max_similarity(new_title, liked_titles)
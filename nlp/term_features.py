@@ -0,0 +1,190 @@
+"""
+Ingest-time title/description preprocessing for the TF-IDF similarity term.
+
+Lowercasing, tokenization and stop-word removal (the exact analyzer
+TfidfVectorizer(stop_words='english') uses) run once per article at ingest,
+fanned out over a process pool. The resulting term counts are stored in
+article_terms against a shared `terms` vocabulary.
+
+Online, max_tfidf_similarity() reproduces score_title_similarity() for every
+article at once from those counts. TfidfVectorizer fits a fresh IDF on each
+(liked titles + article) corpus, and the IDF of a term only depends on whether
+the article contains it, so the whole column is a few sparse products over
+the liked-title terms and never re-reads article text.
+"""
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+PREPROCESS_PROCESSES = int(os.getenv("PREPROCESS_PROCESSES", str(os.cpu_count() or 1)))
+# Below this many texts per process, pool start-up costs more than it saves
+MIN_TEXTS_PER_PROCESS = 2000
+
+_analyzer = None
+
+
+def analyze(text: Optional[str]) -> Dict[str, int]:
+    """Term counts of `text` under TfidfVectorizer(stop_words='english')'s analyzer."""
+    global _analyzer
+    if _analyzer is None:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        _analyzer = TfidfVectorizer(stop_words='english').build_analyzer()
+    return dict(Counter(_analyzer(text or "")))
+
+
+def _analyze_chunk(texts: List[Optional[str]]) -> List[Dict[str, int]]:
+    return [analyze(t) for t in texts]
+
+
+def analyze_many(texts: Sequence[Optional[str]], processes: int = PREPROCESS_PROCESSES) -> List[Dict[str, int]]:
+    """analyze() over many texts, in a process pool when the batch is big enough."""
+    texts = list(texts)
+    processes = max(1, min(processes, len(texts) // MIN_TEXTS_PER_PROCESS))
+    if processes == 1:
+        return _analyze_chunk(texts)
+    size = -(-len(texts) // processes)
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [counts for chunk in pool.map(_analyze_chunk, chunks) for counts in chunk]
+
+
+# ---------- storage ----------
+
+def encode_terms(conn, terms) -> Dict[str, int]:
+    """Ids for `terms` in the shared vocabulary, inserting unseen ones."""
+    from psycopg2.extras import execute_values
+
+    terms = sorted(set(terms))
+    if not terms:
+        return {}
+    with conn.cursor() as cur:
+        execute_values(cur, "INSERT INTO terms (term) VALUES %s ON CONFLICT (term) DO NOTHING",
+                       [(t,) for t in terms], page_size=1000)
+        cur.execute("SELECT term, id FROM terms WHERE term = ANY(%s)", (terms,))
+        return dict(cur.fetchall())
+
+
+def store_term_features(conn, article_ids: Sequence[int], titles: Sequence[Optional[str]],
+                        descriptions: Sequence[Optional[str]],
+                        processes: int = PREPROCESS_PROCESSES) -> int:
+    """Analyze titles and descriptions and upsert their term counts into article_terms."""
+    from psycopg2.extras import execute_values
+
+    if not len(article_ids):
+        return 0
+    counts = analyze_many(list(titles) + list(descriptions), processes)
+    title_counts, description_counts = counts[:len(article_ids)], counts[len(article_ids):]
+    ids = encode_terms(conn, {t for c in counts for t in c})
+
+    def encode(c):
+        return [ids[t] for t in c], list(c.values())
+
+    rows = [(int(aid), *encode(tc), *encode(dc))
+            for aid, tc, dc in zip(article_ids, title_counts, description_counts)]
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO article_terms (article_id, title_terms, title_counts, description_terms, description_counts)
+            VALUES %s
+            ON CONFLICT (article_id) DO UPDATE
+            SET title_terms = EXCLUDED.title_terms, title_counts = EXCLUDED.title_counts,
+                description_terms = EXCLUDED.description_terms, description_counts = EXCLUDED.description_counts
+        """, rows, template="(%s, %s::integer[], %s::integer[], %s::integer[], %s::integer[])", page_size=1000)
+    conn.commit()
+    return len(rows)
+
+
+def fetch_title_terms(conn, since=None, article_ids=None) -> Dict[int, Tuple[List[int], List[int]]]:
+    """
+    {article_id: (term_ids, counts)} for every preprocessed article (published
+    since `since`, and only `article_ids` if given).
+    """
+    with conn.cursor() as cur:
+        if since is None and article_ids is None:
+            cur.execute("SELECT article_id, title_terms, title_counts FROM article_terms")
+        elif since is None:
+            cur.execute("SELECT article_id, title_terms, title_counts FROM article_terms WHERE article_id = ANY(%s)",
+                        (list(article_ids),))
+        else:
+            query = """
+                SELECT t.article_id, t.title_terms, t.title_counts
+                FROM article_terms t JOIN articles a ON a.id = t.article_id
+                WHERE a.pub_date >= %s
+            """
+            params = [since]
+            if article_ids is not None:
+                query += " AND t.article_id = ANY(%s)"
+                params.append(list(article_ids))
+            cur.execute(query, params)
+        return {aid: (terms, counts) for aid, terms, counts in cur.fetchall()}
+
+
+def fetch_term_vocabulary(conn, term_ids=None) -> Dict[str, int]:
+    with conn.cursor() as cur:
+        if term_ids is None:
+            cur.execute("SELECT term, id FROM terms")
+        else:
+            cur.execute("SELECT term, id FROM terms WHERE id = ANY(%s)", (list(term_ids),))
+        return dict(cur.fetchall())
+
+
+# ---------- online similarity ----------
+
+def title_term_matrix(terms: Sequence[Tuple[Sequence[int], Sequence[int]]], n_terms: int) -> sp.csr_matrix:
+    """(n_articles, n_terms) count matrix from per-article (term_ids, counts)."""
+    indptr, indices, data = [0], [], []
+    for term_ids, counts in terms:
+        indices.extend(term_ids)
+        data.extend(counts)
+        indptr.append(len(indices))
+    return sp.csr_matrix((np.asarray(data, dtype=np.float64), indices, indptr),
+                         shape=(len(terms), max(n_terms, 1)))
+
+
+def max_tfidf_similarity(title_terms: sp.csr_matrix, term_vocab: Dict[str, int],
+                         liked_titles: Sequence[str]) -> np.ndarray:
+    """
+    For each article row of `title_terms`, the max cosine to any liked title
+    under a TfidfVectorizer(stop_words='english') fit on (liked_titles + that
+    title) -- i.e. score_title_similarity() for every article at once.
+    """
+    n_articles = title_terms.shape[0]
+    liked = [analyze(t) for t in liked_titles]
+    local = {t: i for i, t in enumerate(sorted({t for c in liked for t in c}))}
+    if not liked or not local:
+        return np.zeros(n_articles)
+
+    # Liked-title counts over the liked vocabulary, and each term's doc frequency among them
+    L = sp.csr_matrix((np.asarray([v for c in liked for v in c.values()], dtype=np.float64),
+                       [local[t] for c in liked for t in c],
+                       np.cumsum([0] + [len(c) for c in liked])),
+                      shape=(len(liked), len(local)))
+    df = np.asarray((L > 0).sum(axis=0)).ravel()
+    n_docs = len(liked) + 1
+    # smooth_idf: ln((1 + n) / (1 + df)) + 1, where df counts the article too if it has the term
+    idf_out = np.log((1 + n_docs) / (1 + df)) + 1
+    idf_in = np.log((1 + n_docs) / (2 + df)) + 1
+    idf_only_article = np.log((1 + n_docs) / 2) + 1
+
+    # Article columns for the liked terms that exist in the catalog vocabulary
+    known = [(local[t], term_vocab[t]) for t in local if t in term_vocab]
+    cols = np.asarray([c for c, _ in known], dtype=np.int64)
+    A = title_terms[:, [g for _, g in known]] if known else sp.csr_matrix((n_articles, 0))
+    present = (A > 0).astype(np.float64)
+    L2 = L.multiply(L).tocsc()
+
+    # |article|^2: every article term at the "only in the article" IDF, corrected for shared ones
+    sq = np.asarray(title_terms.multiply(title_terms).sum(axis=1)).ravel()
+    a_norm2 = idf_only_article ** 2 * sq + A.multiply(A) @ (idf_in[cols] ** 2 - idf_only_article ** 2)
+    # |liked|^2 per (article, liked title): the IDF of shared terms changes with the article
+    base = np.asarray(L2 @ (idf_out ** 2)).ravel()
+    l_norm2 = base[None, :] + np.asarray(present @ (L2[:, cols].multiply(idf_in[cols] ** 2 - idf_out[cols] ** 2)).T.toarray())
+    dots = np.asarray((A.multiply(idf_in[cols] ** 2) @ L[:, cols].T).toarray()) if known else \
+        np.zeros((n_articles, len(liked)))
+
+    denom = np.sqrt(np.maximum(a_norm2, 0))[:, None] * np.sqrt(np.maximum(l_norm2, 0))
+    cos = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+    return cos.max(axis=1)
@@ -0,0 +1,141 @@
+"""
+Multi-armed bandit over scoring_configurations.
+
+Each active config is an arm; an impression is a trial and a click a success.
+Counters live in memory so select()/record_*() are O(1) per call (O(arms) for
+select), and are flushed to scoring_config_stats as deltas every
+`persist_interval` seconds, so several workers can share the totals.
+"""
+import math
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from db.repository import as_repository
+
+STRATEGIES = ("thompson", "ucb")
+
+
+class ConfigBandit:
+    def __init__(self, configs: Dict[int, Tuple[float, float, float]],
+                 strategy: str = "thompson", persist_interval: float = 60.0,
+                 seed: Optional[int] = None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown bandit strategy {strategy!r}; expected one of {STRATEGIES}")
+        if not configs:
+            raise ValueError("ConfigBandit needs at least one scoring config")
+        self.configs = dict(configs)
+        self.strategy = strategy
+        self.persist_interval = persist_interval
+        self.trials: Dict[int, int] = {cid: 0 for cid in self.configs}
+        self.successes: Dict[int, int] = {cid: 0 for cid in self.configs}
+        # Not yet written to scoring_config_stats
+        self._pending_trials: Dict[int, int] = {}
+        self._pending_successes: Dict[int, int] = {}
+        self._last_persist = time.monotonic()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # ---------- selection ----------
+
+    def select(self) -> int:
+        """Pick the config id to serve this request."""
+        with self._lock:
+            if self.strategy == "thompson":
+                return max(self.configs, key=self._sample)
+            log_total = math.log(max(sum(self.trials.values()), 1))
+            return max(self.configs, key=lambda cid: self._ucb(cid, log_total))
+
+    def _sample(self, cid: int) -> float:
+        s = self.successes[cid]
+        f = max(self.trials[cid] - s, 0)
+        return self._rng.betavariate(1 + s, 1 + f)
+
+    def _ucb(self, cid: int, log_total: float) -> float:
+        """UCB1 bound; log_total is log(total trials over all arms), computed once per select()."""
+        n = self.trials[cid]
+        if n == 0:
+            return math.inf
+        return self.successes[cid] / n + math.sqrt(2 * log_total / n)
+
+    def weights(self, config_id: int) -> Tuple[float, float, float]:
+        return self.configs[config_id]
+
+    # ---------- updates ----------
+
+    def record_impressions(self, config_id: Optional[int], n: int = 1) -> None:
+        if config_id not in self.configs:
+            return
+        with self._lock:
+            self.trials[config_id] += n
+            self._pending_trials[config_id] = self._pending_trials.get(config_id, 0) + n
+
+    def record_click(self, config_id: Optional[int]) -> None:
+        if config_id not in self.configs:
+            return
+        with self._lock:
+            self.successes[config_id] += 1
+            self._pending_successes[config_id] = self._pending_successes.get(config_id, 0) + 1
+
+    def ctr(self, config_id: int) -> float:
+        n = self.trials[config_id]
+        return self.successes[config_id] / n if n else 0.0
+
+    # ---------- persistence ----------
+
+    @classmethod
+    def load(cls, conn, **kwargs) -> Optional["ConfigBandit"]:
+        """
+        Build a bandit over the active configs with counters from scoring_config_stats.
+        The stats table is seeded from recommendation_logs the first time.
+        Returns None if there are no active configs.
+        """
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, w1, w2, w3
+                FROM scoring_configurations
+                WHERE is_active = TRUE;
+            """)
+            configs = {int(cid): (float(w1), float(w2), float(w3)) for cid, w1, w2, w3 in cur.fetchall()}
+            if not configs:
+                return None
+
+            cur.execute("SELECT 1 FROM scoring_config_stats LIMIT 1;")
+            if cur.fetchone() is None:
+                cur.execute("""
+                    INSERT INTO scoring_config_stats (scoring_config_id, impressions, clicks, updated_at)
+                    SELECT scoring_config_id, SUM(impressions), SUM(clicks), NOW()
+                    FROM recommendation_log_daily
+                    WHERE scoring_config_id IS NOT NULL
+                    GROUP BY scoring_config_id
+                    ON CONFLICT (scoring_config_id) DO NOTHING;
+                """)
+                conn.commit()
+
+            cur.execute("SELECT scoring_config_id, impressions, clicks FROM scoring_config_stats;")
+            stats = cur.fetchall()
+
+        bandit = cls(configs, **kwargs)
+        for cid, impressions, clicks in stats:
+            if cid in bandit.configs:
+                bandit.trials[cid] = int(impressions)
+                bandit.successes[cid] = int(clicks)
+        return bandit
+
+    def persist(self, conn) -> None:
+        """Add counts recorded since the last persist to scoring_config_stats."""
+        with self._lock:
+            trials, self._pending_trials = self._pending_trials, {}
+            successes, self._pending_successes = self._pending_successes, {}
+            self._last_persist = time.monotonic()
+
+        rows = [(cid, trials.get(cid, 0), successes.get(cid, 0))
+                for cid in set(trials) | set(successes)]
+        if not rows:
+            return
+        as_repository(conn).add_config_stats(rows)
+
+    def maybe_persist(self, conn) -> None:
+        if time.monotonic() - self._last_persist >= self.persist_interval:
+            self.persist(conn)
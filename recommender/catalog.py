@@ -0,0 +1,489 @@
+"""
+In-memory article catalog shared across requests.
+
+Country and category strings are normalized and encoded once: each article
+gets a country index and a row in a sparse article x category count matrix.
+Scoring a user is then a handful of vector lookups and one sparse matvec
+instead of a Python loop over articles (see components()).
+
+Articles inserted by insert_articles() already carry dictionary-encoded ids
+(country_id, category_ids; see db/label_repo.py), which load() maps to dense
+per-kind indices without string work; only rows not yet backfilled are
+normalized here.
+
+Near-duplicates (same story from several sources; see nlp/dedup.py) are
+collapsed at load: only each cluster's representative is scored and can be
+recommended, and the other members' ids resolve to it in positions().
+
+With ARTICLE_MAX_AGE_DAYS set, only articles published within that window are
+loaded, and evict_expired() drops the ones that have aged out since, in one
+pass over the arrays, so per-request work follows the live window rather than
+the archive. Articles without a pub_date are outside any window.
+
+extended() adds newly ingested articles without reloading the rest (see
+db/ingest_events.py).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from db.label_repo import CATEGORY, COUNTRY
+from db.repository import as_repository
+from nlp.term_features import analyze, max_tfidf_similarity, title_term_matrix
+from recommender.scorer import COMPONENTS, SIMILARITY_THRESHOLD
+from recommender.utils import normalize_country_string
+
+_EXPLICIT = COMPONENTS.index("explicit")
+_BEHAVIOR = COMPONENTS.index("behavior")
+_TIME = COMPONENTS.index("time_spent")
+_SIMILARITY = COMPONENTS.index("similarity")
+_CO_ENGAGEMENT = COMPONENTS.index("co_engagement")
+_LATENT = COMPONENTS.index("latent")
+
+COLLAPSE_DUPLICATES = os.getenv("COLLAPSE_DUPLICATES", "1") == "1"
+# Max candidate age in days; 0 keeps every article
+ARTICLE_MAX_AGE_DAYS = float(os.getenv("ARTICLE_MAX_AGE_DAYS", "0"))
+
+
+def freshness_cutoff(max_age_days: float = ARTICLE_MAX_AGE_DAYS,
+                     now: Optional[datetime] = None) -> Optional[datetime]:
+    """Oldest pub_date inside the window, or None if there is no window."""
+    if not max_age_days or max_age_days <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=max_age_days)
+
+
+class _Subset(Sequence):
+    """Read-only view of `base` at `positions`, so eviction doesn't decode snapshot rows."""
+
+    def __init__(self, base: Sequence, positions: np.ndarray):
+        self._base = base
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._base[int(self._positions[i])]
+
+
+def row_to_score_tuple(row: Any) -> Tuple[int, str, Optional[str], Optional[List[str]]]:
+    """
+    Normalize an article row (dict or tuple) to (id, title, country, category_list)
+    in the exact order your scorer expects.
+    """
+    if isinstance(row, dict):
+        art_id = row.get("id")
+        title = row.get("title")
+        country = row.get("country")
+        category = row.get("category")
+    else:
+        # Assume tuple order commonly used in repos: (id, title, country, category, ...)
+        # Safely slice first 4 fields
+        art_id = row[0]
+        title = row[1]
+        country = row[2] if len(row) > 2 else None
+        category = row[3] if len(row) > 3 else None
+
+    # Ensure category is a list[str] (handles TEXT[] or single TEXT)
+    if category is None:
+        cat_list: Optional[List[str]] = None
+    elif isinstance(category, (list, tuple)):
+        cat_list = [str(c) for c in category]
+    else:
+        cat_list = [str(category)]
+
+    return int(art_id), str(title), (str(country) if country else None), cat_list
+
+
+def _encoder(vocab: Dict[str, int]):
+    """Look a name up in `vocab`, adding unseen names after the largest id."""
+    next_id = [max(vocab.values(), default=-1) + 1]
+
+    def encode(name: str) -> int:
+        idx = vocab.get(name)
+        if idx is None:
+            idx = vocab[name] = next_id[0]
+            next_id[0] += 1
+        return idx
+    return encode
+
+
+def _label_encoder(vocab: Dict[str, int], labels: Dict[str, int]):
+    """
+    Dense index of a label in `vocab` ({name: index}, 0..len-1, extended in
+    place with unseen names), looked up by name, or by label id through
+    `labels` ({name: article_labels id}). Label ids come from one sequence
+    shared by every kind, so they are too sparse to index vectors by.
+    """
+    names = {label_id: name for name, label_id in labels.items()}
+
+    def encode(name: str) -> int:
+        idx = vocab.get(name)
+        if idx is None:
+            idx = vocab[name] = len(vocab)
+        return idx
+
+    def encode_id(label_id: int) -> Optional[int]:
+        name = names.get(label_id)
+        return encode(name) if name is not None else None
+    return encode, encode_id
+
+
+def _collapse_clusters(rows: Sequence[Tuple]) -> Tuple[List[Tuple], List[Tuple[int, int]]]:
+    """
+    Keep one row per duplicate cluster (the one with id == cluster_id, else the
+    lowest id) in the original order; return (kept rows, [(member id, kept id)]).
+    """
+    cluster_of = [row[6] if len(row) > 6 and row[6] is not None else row[0] for row in rows]
+    reps: Dict[int, Tuple] = {}
+    for row, cid in zip(rows, cluster_of):
+        rep = reps.get(cid)
+        if rep is None or row[0] == cid or (rep[0] != cid and row[0] < rep[0]):
+            reps[cid] = row
+    kept, aliases = [], []
+    for row, cid in zip(rows, cluster_of):
+        if reps[cid] is row:
+            kept.append(row)
+        else:
+            aliases.append((row[0], reps[cid][0]))
+    return kept, aliases
+
+
+class ArticleCatalog:
+    def __init__(self, rows: Sequence[Tuple[int, str, Optional[str], Optional[List[str]]]],
+                 codes: Optional[Sequence[Tuple[Optional[int], Optional[List[int]]]]] = None,
+                 country_labels: Optional[Dict[str, int]] = None,
+                 category_labels: Optional[Dict[str, int]] = None,
+                 pub_dates: Optional[Sequence[Optional[datetime]]] = None,
+                 country_vocab: Optional[Dict[str, int]] = None,
+                 category_vocab: Optional[Dict[str, int]] = None):
+        """
+        `rows` are normalized (id, title, country, category_list) tuples.
+        `codes` optionally gives each row's (country_id, category_ids) from
+        ingest, label ids resolved through `country_labels` / `category_labels`
+        (label_repo.fetch_labels()); a None entry, or an id missing from them,
+        means that field is encoded from the row's strings instead.
+        Labels get dense per-kind indices, continuing `country_vocab` /
+        `category_vocab` if given (when appending to another catalog).
+        Without `pub_dates` the catalog has no ages and is never evicted.
+        """
+        rows = list(rows)
+        codes = codes if codes is not None else [(None, None)] * len(rows)
+        country_vocab = dict(country_vocab or {})
+        category_vocab = dict(category_vocab or {})
+        encode_country, country_id_index = _label_encoder(country_vocab, country_labels or {})
+        encode_category, category_id_index = _label_encoder(category_vocab, category_labels or {})
+
+        country_idx = []
+        for r, (country_id, _) in zip(rows, codes):
+            idx = country_id_index(country_id) if country_id is not None else None
+            country_idx.append(idx if idx is not None else encode_country(normalize_country_string(r[2])))
+
+        indptr, indices = [0], []
+        for r, (_, category_ids) in zip(rows, codes):
+            encoded = [category_id_index(c) for c in category_ids] if category_ids is not None else [None]
+            if None in encoded:
+                encoded = [encode_category(c.lower()) for c in r[3] or []]
+            indices.extend(encoded)
+            indptr.append(len(indices))
+        categories = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), indices, indptr),
+            shape=(len(rows), max(len(category_vocab), 1)))
+
+        self._set_arrays(rows, [r[1] for r in rows], np.asarray([r[0] for r in rows], dtype=np.int64),
+                         country_vocab, np.asarray(country_idx, dtype=np.int32), category_vocab, categories,
+                         pub_dates=None if pub_dates is None else np.array(
+                             [np.datetime64(d, "s") if d is not None else np.datetime64("NaT")
+                              for d in pub_dates], dtype="datetime64[s]"))
+
+    def _set_arrays(self, rows, titles, ids, country_vocab, country_idx, category_vocab, categories,
+                    sorted_idx=None, sorted_ids=None, pub_dates=None):
+        """
+        Install the encoded catalog. `rows` and `titles` only need indexing and
+        len(), so a snapshot can hand in lazily decoded sequences.
+        """
+        self.rows = rows
+        self.titles = titles
+        self.ids = ids
+        self.country_vocab = country_vocab
+        self.country_idx = country_idx
+        self.category_vocab = category_vocab
+        self.categories = categories
+        # datetime64[s] per position (NaT if unknown), or None if ages aren't known
+        self.pub_dates = pub_dates
+        self._n_countries = max(country_vocab.values(), default=0) + 1
+        self.title_terms: Optional[sp.csr_matrix] = None
+        self.term_vocab: Optional[Dict[str, int]] = None
+        # Article id -> position by binary search, instead of a per-process dict
+        self._sorted_idx = np.argsort(ids, kind="stable") if sorted_idx is None else sorted_idx
+        self._sorted_ids = ids[self._sorted_idx] if sorted_ids is None else sorted_ids
+
+    @classmethod
+    def from_arrays(cls, rows, titles, ids, country_vocab, country_idx, category_vocab, categories,
+                    sorted_idx=None, sorted_ids=None, pub_dates=None) -> "ArticleCatalog":
+        """Wrap already-encoded arrays (e.g. memory-mapped from a snapshot) without copying."""
+        catalog = cls.__new__(cls)
+        catalog._set_arrays(rows, titles, ids, country_vocab, country_idx, category_vocab, categories,
+                            sorted_idx, sorted_ids, pub_dates)
+        return catalog
+
+    @classmethod
+    def load(cls, conn, collapse_duplicates: bool = COLLAPSE_DUPLICATES,
+             max_age_days: float = ARTICLE_MAX_AGE_DAYS) -> "ArticleCatalog":
+        repo = as_repository(conn)
+        since = freshness_cutoff(max_age_days)
+        rows = repo.fetch_encoded_articles(since)
+        aliases: List[Tuple[int, int]] = []
+        if collapse_duplicates:
+            rows, aliases = _collapse_clusters(rows)
+        catalog = cls([row_to_score_tuple(row) for row in rows],
+                      codes=[(row[4], row[5]) for row in rows],
+                      country_labels=repo.fetch_labels(COUNTRY),
+                      category_labels=repo.fetch_labels(CATEGORY),
+                      pub_dates=[row[7] for row in rows])
+        catalog.attach_title_terms(repo.fetch_title_terms(since), repo.fetch_term_vocabulary())
+        catalog.add_aliases([m for m, _ in aliases], [r for _, r in aliases])
+        return catalog
+
+    def evict_expired(self, max_age_days: float = ARTICLE_MAX_AGE_DAYS,
+                      now: Optional[datetime] = None) -> "ArticleCatalog":
+        """
+        A catalog without the articles published before the window (self if
+        none are). Arrays are sliced in bulk; aliases to evicted articles go too.
+        """
+        cutoff = freshness_cutoff(max_age_days, now)
+        if cutoff is None or self.pub_dates is None:
+            return self
+        keep = self.pub_dates >= np.datetime64(cutoff, "s")
+        if keep.all():
+            return self
+        kept = np.flatnonzero(keep)
+        remap = np.full(len(self.ids), -1, dtype=np.int64)
+        remap[kept] = np.arange(len(kept))
+        moved = remap[self._sorted_idx]
+        live = moved >= 0
+
+        catalog = ArticleCatalog.from_arrays(
+            _Subset(self.rows, kept), _Subset(self.titles, kept), np.asarray(self.ids[kept]),
+            self.country_vocab, np.asarray(self.country_idx[kept]), self.category_vocab,
+            self.categories.tocsr()[kept], sorted_idx=moved[live],
+            sorted_ids=np.asarray(self._sorted_ids[live]), pub_dates=np.asarray(self.pub_dates[kept]))
+        if self.title_terms is not None:
+            catalog.title_terms = self.title_terms.tocsr()[kept]
+            catalog.term_vocab = self.term_vocab
+        return catalog
+
+    def extended(self, conn, article_ids: Sequence[int], collapse_duplicates: bool = COLLAPSE_DUPLICATES,
+                 max_age_days: float = ARTICLE_MAX_AGE_DAYS) -> "ArticleCatalog":
+        """
+        A catalog with newly ingested `article_ids` added (self if none of them
+        is new and inside the window). Only their rows, labels and title terms
+        are read and the arrays are appended to, instead of reloading the
+        catalog. New members of a cluster already here become its aliases.
+        """
+        repo = as_repository(conn)
+        rows = repo.fetch_encoded_articles(freshness_cutoff(max_age_days), article_ids=list(article_ids))
+        _, known = self.positions([row[0] for row in rows])
+        rows = [row for row, k in zip(rows, known) if not k]
+        aliases: List[Tuple[int, int]] = []
+        if collapse_duplicates and rows:
+            cluster_ids = [row[6] if row[6] is not None else row[0] for row in rows]
+            _, clustered = self.positions(cluster_ids)
+            aliases = [(row[0], cid) for row, cid, c in zip(rows, cluster_ids, clustered) if c]
+            rows, more = _collapse_clusters([row for row, c in zip(rows, clustered) if not c])
+            aliases += more
+        if not rows and not aliases:
+            return self
+
+        # New labels get dense indices after this catalog's
+        added = ArticleCatalog([row_to_score_tuple(row) for row in rows],
+                               codes=[(row[4], row[5]) for row in rows],
+                               country_labels=repo.fetch_labels(COUNTRY),
+                               category_labels=repo.fetch_labels(CATEGORY),
+                               pub_dates=[row[7] for row in rows],
+                               country_vocab=self.country_vocab, category_vocab=self.category_vocab)
+
+        def widen(matrix, n_cols):
+            matrix = matrix.tocsr()
+            return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_cols))
+
+        n = len(self.ids)
+        n_categories = max(self.categories.shape[1], added.categories.shape[1])
+        sorted_ids = np.concatenate([self._sorted_ids, added._sorted_ids])
+        sorted_idx = np.concatenate([self._sorted_idx, added._sorted_idx + n])
+        order = np.argsort(sorted_ids, kind="stable")
+        catalog = ArticleCatalog.from_arrays(
+            list(self.rows) + added.rows, list(self.titles) + added.titles, np.concatenate([self.ids, added.ids]),
+            added.country_vocab, np.concatenate([self.country_idx, added.country_idx]), added.category_vocab,
+            sp.vstack([widen(self.categories, n_categories), widen(added.categories, n_categories)]).tocsr(),
+            sorted_idx=sorted_idx[order], sorted_ids=sorted_ids[order],
+            pub_dates=None if self.pub_dates is None else np.concatenate([self.pub_dates, added.pub_dates]))
+
+        if self.title_terms is not None:
+            features = repo.fetch_title_terms(article_ids=added.ids.tolist())
+            term_vocab = dict(self.term_vocab)
+            new_terms = {t for term_ids, _ in features.values() for t in term_ids}
+            term_vocab.update({term: tid for term, tid in repo.fetch_term_vocabulary(sorted(new_terms)).items()
+                               if term not in term_vocab})
+            added.attach_title_terms(features, term_vocab)
+            n_terms = max(self.title_terms.shape[1], added.title_terms.shape[1])
+            catalog.title_terms = sp.vstack([widen(self.title_terms, n_terms),
+                                             widen(added.title_terms, n_terms)]).tocsr()
+            catalog.term_vocab = added.term_vocab
+        catalog.add_aliases([m for m, _ in aliases], [t for _, t in aliases])
+        return catalog
+
+    def add_aliases(self, article_ids: Sequence[int], target_ids: Sequence[int]) -> None:
+        """Make positions() resolve each of `article_ids` to its target's position."""
+        pos, found = self.positions(target_ids)
+        if not found.any():
+            return
+        ids = np.concatenate([self._sorted_ids, np.asarray(article_ids, dtype=np.int64)[found]])
+        idx = np.concatenate([self._sorted_idx, pos[found]])
+        order = np.argsort(ids, kind="stable")
+        self._sorted_ids, self._sorted_idx = ids[order], idx[order]
+
+    def attach_title_terms(self, features: Dict[int, Tuple[Sequence[int], Sequence[int]]],
+                           term_vocab: Dict[str, int]) -> None:
+        """
+        Align ingest-time title term counts ({article_id: (term_ids, counts)})
+        with the catalog, so title_similarities() never re-reads titles.
+        Articles not preprocessed yet are analyzed here.
+        """
+        term_vocab = dict(term_vocab)
+        encode = _encoder(term_vocab)
+        rows = []
+        for i, aid in enumerate(self.ids):
+            entry = features.get(int(aid))
+            if entry is None:
+                counts = analyze(self.titles[i])
+                entry = ([encode(t) for t in counts], list(counts.values()))
+            rows.append(entry)
+        self.term_vocab = term_vocab
+        self.title_terms = title_term_matrix(rows, max(term_vocab.values(), default=0) + 1)
+
+    def title_similarities(self, liked_titles: Sequence[str],
+                           positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        score_title_similarity() of every article against `liked_titles`; with
+        `positions`, only those articles are scored and the rest are 0.
+        """
+        if self.title_terms is None:
+            raise ValueError("No title terms attached; see attach_title_terms()")
+        if positions is None:
+            return max_tfidf_similarity(self.title_terms, self.term_vocab, liked_titles)
+        out = np.zeros(len(self.ids))
+        if len(positions):
+            out[positions] = max_tfidf_similarity(self.title_terms.tocsr()[positions], self.term_vocab, liked_titles)
+        return out
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, article_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Catalog position of each article id, and whether it is in the catalog."""
+        article_ids = np.asarray(article_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(len(article_ids), dtype=np.int64), np.zeros(len(article_ids), dtype=bool)
+        at = np.minimum(np.searchsorted(self._sorted_ids, article_ids), len(self._sorted_ids) - 1)
+        return self._sorted_idx[at], self._sorted_ids[at] == article_ids
+
+    def _country_vector(self, values: Dict[str, float]) -> np.ndarray:
+        vec = np.zeros(self._n_countries)
+        for name, value in values.items():
+            idx = self.country_vocab.get(name)
+            if idx is not None:
+                vec[idx] += value
+        return vec
+
+    def _category_vector(self, values: Dict[str, float]) -> np.ndarray:
+        vec = np.zeros(self.categories.shape[1])
+        for name, value in values.items():
+            idx = self.category_vocab.get(name)
+            if idx is not None:
+                vec[idx] += value
+        return vec
+
+    def components(self, user_profile: Dict[str, Any], time_spent_map: Dict[int, int],
+                   similarities: Optional[np.ndarray] = None,
+                   co_engagement: Optional[np.ndarray] = None,
+                   latent: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        (n_articles, len(COMPONENTS)) matrix, identical to
+        scorer.component_matrix() but vectorized over the catalog.
+        `similarities` is the raw cosine per article (0 if None);
+        `co_engagement` the per-article CoEngagement.scores() and `latent`
+        the FactorModel.scores() (0 if None).
+        """
+        n = len(self.ids)
+        out = np.zeros((n, len(COMPONENTS)), dtype=np.float64)
+        if n == 0:
+            return out
+
+        pref_countries = {c.lower(): 1.0 for c in user_profile['preferred_countries']}
+        pref_categories = {c.lower(): 1.0 for c in user_profile['preferred_categories']}
+        country_match = self._country_vector(pref_countries)[self.country_idx] > 0
+        category_match = (self.categories @ self._category_vector(pref_categories)) > 0
+        out[:, _EXPLICIT] = 5.0 * country_match + 5.0 * category_match
+
+        # liked_* keys are matched as stored, same as score_components()
+        liked_countries = self._country_vector(user_profile['liked_countries'])
+        liked_categories = self._category_vector(user_profile['liked_categories'])
+        out[:, _BEHAVIOR] = liked_countries[self.country_idx] + self.categories @ liked_categories
+
+        if time_spent_map:
+            seconds = np.fromiter(time_spent_map.values(), dtype=np.float64, count=len(time_spent_map))
+            pos, found = self.positions(np.fromiter(time_spent_map.keys(), dtype=np.int64,
+                                                    count=len(time_spent_map)))
+            bonus = np.where(seconds > 900, 5.0, np.where(seconds > 600, 2.0, 0.0))
+            # Several ids can resolve to one position (collapsed duplicates): keep the best
+            np.maximum.at(out[:, _TIME], pos[found], bonus[found])
+
+        if similarities is not None:
+            sims = np.asarray(similarities, dtype=np.float64)
+            out[:, _SIMILARITY] = np.where(sims > SIMILARITY_THRESHOLD, sims * 10, 0.0)
+        if co_engagement is not None:
+            out[:, _CO_ENGAGEMENT] = co_engagement
+        if latent is not None:
+            out[:, _LATENT] = latent
+        return out
+
+    def top_k(self, scores: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Positions of the k best scores, best first; ties keep catalog order.
+        Positions set in the boolean mask `exclude` are never returned.
+        """
+        if exclude is not None:
+            scores = np.where(exclude, -np.inf, scores)
+            k = min(k, len(scores) - int(np.count_nonzero(exclude)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            # Partition first so the stable sort only sees the k-th score's neighbourhood
+            kth = np.partition(-scores, k - 1)[k - 1]
+            candidates = np.flatnonzero(-scores <= kth)
+            order = np.argsort(-scores[candidates], kind="stable")[:k]
+            return candidates[order]
+        return np.argsort(-scores, kind="stable")[:k]
+
+    def to_dicts(self, positions: Sequence[int], scores: np.ndarray,
+                 scoring_config_id: Optional[int]) -> List[Dict[str, Any]]:
+        out = []
+        for i in positions:
+            art_id, title, country, category = self.rows[i]
+            out.append({
+                "article_id": art_id,
+                "title": title,
+                "score": float(scores[i]),
+                # Pass through country/category so scripts can show them
+                "country": country,
+                "category": category or [],
+                "scoring_config_id": scoring_config_id,
+            })
+        return out
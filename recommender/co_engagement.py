@@ -0,0 +1,185 @@
+"""
+Item-item co-engagement ("users who read X also read Y").
+
+C[i, j] counts users who engaged with both article i and article j, where an
+engagement is an interactions row or a clicked recommendation_logs row. C is
+kept as a symmetric CSR matrix indexed by article id and grown in
+micro-batches: each new (user, article) engagement pairs the article with the
+user's last `max_history` engagements, the pairs are buffered, and flush()
+adds them as one sparse delta -- nothing is recomputed from the full tables.
+
+For a user who engaged with items E, the co_engagement component of article j
+is sum over i in E of C[i, j] / sqrt(n_i * n_j) (n = engagement counts, so
+popular articles don't dominate): one sparse row-sum over E per user.
+
+scripts/update_co_engagement.py runs the micro-batches and saves the state to
+CO_ENGAGEMENT_PATH; API workers reload it when the file changes.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+CO_ENGAGEMENT_PATH = os.getenv("CO_ENGAGEMENT_PATH")
+# Clicked impressions are re-read this far back, since clicks flip old rows;
+# the clicks already folded in from that window are remembered, not re-counted
+CLICK_LOOKBACK_DAYS = 7
+
+
+class CoEngagement:
+    def __init__(self, max_history: int = 50):
+        self.max_history = max_history
+        self.matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+        self.item_counts = np.zeros(0, dtype=np.float32)
+        self.history: Dict[int, List[int]] = {}
+        # Last interactions.id and last clicked-log scan time folded in
+        self.last_interaction_id = 0
+        self.clicks_scanned_at: Optional[datetime] = None
+        # (user, article) -> impression time of clicks folded in, for the lookback window
+        self.clicked: Dict[Tuple[int, int], datetime] = {}
+        self._rows: List[int] = []
+        self._cols: List[int] = []
+        self._items: List[int] = []
+
+    def __len__(self) -> int:
+        """Number of nonzero article pairs (both orders)."""
+        return self.matrix.nnz
+
+    # ---------- building ----------
+
+    def add(self, user_id: int, article_id: int) -> bool:
+        """Buffer one engagement; False if the user's recent history already has it."""
+        history = self.history.setdefault(int(user_id), [])
+        article_id = int(article_id)
+        if article_id in history:
+            return False
+        self._rows.extend(history)
+        self._cols.extend([article_id] * len(history))
+        self._items.append(article_id)
+        history.append(article_id)
+        if len(history) > self.max_history:
+            del history[0]
+        return True
+
+    def add_many(self, engagements: Iterable[Sequence[int]]) -> int:
+        return sum(self.add(user_id, article_id) for user_id, article_id in engagements)
+
+    def flush(self) -> int:
+        """Fold buffered engagements into the matrix; returns the number folded in."""
+        if not self._items:
+            return 0
+        n = max(self.matrix.shape[0], max(self._items) + 1)
+        rows = np.asarray(self._rows + self._cols, dtype=np.int64)
+        cols = np.asarray(self._cols + self._rows, dtype=np.int64)
+        delta = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n))
+        if self.matrix.shape[0] < n:
+            self.matrix = sp.csr_matrix((self.matrix.data, self.matrix.indices,
+                                         np.pad(self.matrix.indptr, (0, n - self.matrix.shape[0]), mode="edge")),
+                                        shape=(n, n))
+            self.item_counts = np.pad(self.item_counts, (0, n - len(self.item_counts)))
+        self.matrix = (self.matrix + delta).tocsr()
+        self.matrix.sort_indices()
+        np.add.at(self.item_counts, np.asarray(self._items, dtype=np.int64), 1)
+        folded = len(self._items)
+        self._rows, self._cols, self._items = [], [], []
+        return folded
+
+    def update_from_db(self, conn, batch_size: int = 10000, now: Optional[datetime] = None) -> int:
+        """
+        Fold in interactions added since the last update, in id-ordered
+        micro-batches, then recently clicked impressions. Returns engagements added.
+        """
+        added = 0
+        with conn.cursor() as cur:
+            while True:
+                cur.execute("""
+                    SELECT id, user_id, article_id FROM interactions
+                    WHERE id > %s ORDER BY id LIMIT %s
+                """, (self.last_interaction_id, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                added += self.add_many((user_id, article_id) for _, user_id, article_id in rows)
+                self.flush()
+                self.last_interaction_id = rows[-1][0]
+
+            now = now or datetime.utcnow()
+            since = now - timedelta(days=CLICK_LOOKBACK_DAYS)
+            cur.execute("""
+                SELECT user_id, article_id, timestamp FROM recommendation_logs
+                WHERE clicked AND timestamp >= %s AND user_id IS NOT NULL AND article_id IS NOT NULL
+                ORDER BY timestamp, id
+            """, (since,))
+            clicks = []
+            for user_id, article_id, ts in cur.fetchall():
+                key = (int(user_id), int(article_id))
+                if key not in self.clicked:
+                    self.clicked[key] = ts
+                    clicks.append(key)
+            added += self.add_many(clicks)
+            self.flush()
+            # Older impressions are never re-read, so their clicks needn't be remembered
+            self.clicked = {key: ts for key, ts in self.clicked.items() if ts >= since}
+            self.clicks_scanned_at = now
+        return added
+
+    # ---------- scoring ----------
+
+    def user_history(self, user_id: int) -> List[int]:
+        return list(self.history.get(int(user_id), ()))
+
+    def scores(self, engaged_ids: Iterable[int], article_ids: Sequence[int]) -> np.ndarray:
+        """co_engagement component of each of `article_ids` for a user who engaged with `engaged_ids`."""
+        article_ids = np.asarray(article_ids, dtype=np.int64)
+        out = np.zeros(len(article_ids), dtype=np.float64)
+        n = self.matrix.shape[0]
+        engaged = np.unique(np.fromiter(engaged_ids, dtype=np.int64))
+        engaged = engaged[(engaged >= 0) & (engaged < n)]
+        if not len(engaged) or not len(article_ids):
+            return out
+
+        inv_sqrt = 1.0 / np.sqrt(np.maximum(self.item_counts, 1.0))
+        row = sp.csr_matrix(inv_sqrt[engaged][None, :]) @ self.matrix[engaged]
+        row.sort_indices()
+        if not row.nnz:
+            return out
+        at = np.minimum(np.searchsorted(row.indices, article_ids), row.nnz - 1)
+        hit = row.indices[at] == article_ids
+        out[hit] = row.data[at[hit]] * inv_sqrt[article_ids[hit]]
+        return out
+
+    # ---------- persistence ----------
+
+    def save(self, path: str) -> None:
+        """Write the state to `path` (.npz) atomically."""
+        users = np.asarray(sorted(self.history), dtype=np.int64)
+        lengths = [len(self.history[u]) for u in users.tolist()]
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+                 item_counts=self.item_counts, users=users,
+                 history_ptr=np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+                 history_items=np.asarray([a for u in users.tolist() for a in self.history[u]], dtype=np.int64),
+                 clicked=np.asarray([[u, a, int(ts.timestamp())] for (u, a), ts in self.clicked.items()],
+                                    dtype=np.int64).reshape(-1, 3),
+                 state=np.asarray([self.max_history, self.last_interaction_id,
+                                   int(self.clicks_scanned_at.timestamp()) if self.clicks_scanned_at else -1],
+                                  dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CoEngagement":
+        with np.load(path) as f:
+            max_history, last_interaction_id, clicks_scanned_at = f["state"].tolist()
+            co = cls(max_history=max_history)
+            n = len(f["indptr"]) - 1
+            co.matrix = sp.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=(n, n))
+            co.item_counts = f["item_counts"]
+            ptr, items = f["history_ptr"], f["history_items"].tolist()
+            co.history = {u: items[ptr[i]:ptr[i + 1]] for i, u in enumerate(f["users"].tolist())}
+            if "clicked" in f:
+                co.clicked = {(u, a): datetime.fromtimestamp(ts) for u, a, ts in f["clicked"].tolist()}
+        co.last_interaction_id = last_interaction_id
+        co.clicks_scanned_at = datetime.fromtimestamp(clicks_scanned_at) if clicks_scanned_at >= 0 else None
+        return co
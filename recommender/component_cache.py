@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class ComponentCache:
+    """
+    Per-user LRU cache of component matrices (see scorer.component_matrix).
+
+    Entries are tied to the article id order they were built for, so a changed
+    catalog is a miss rather than a misaligned matrix. Anything that changes a
+    user's profile, time spent or liked titles should call invalidate(user_id);
+    `ttl` bounds staleness for writes that don't.
+    """
+
+    def __init__(self, max_users: int = 1024, ttl: float = 300.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, article_ids: Sequence[int]) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                created, ids, matrix = entry
+                if time.monotonic() - created <= self.ttl and np.array_equal(ids, article_ids):
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return matrix
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: int, article_ids: Sequence[int], matrix: np.ndarray) -> None:
+        ids = np.asarray(article_ids, dtype=np.int64)
+        matrix.setflags(write=False)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), ids, matrix)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Drop one user's entry, or everything if user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
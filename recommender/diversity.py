@@ -0,0 +1,112 @@
+"""
+Diversity re-ranking with Maximal Marginal Relevance (Carbonell & Goldstein).
+
+A pure score sort often fills the slate with several takes on one story. After
+scoring, the top DIVERSITY_CANDIDATES articles are re-ranked greedily, each
+pick maximising
+
+    lambda * relevance - (1 - lambda) * max similarity to the articles picked so far
+
+where relevance is the score min-max scaled over the pool, and similarity mixes
+the cosine of title vectors (embeddings, else title term counts) with the
+cosine of category vectors, DIVERSITY_CATEGORY_WEIGHT going to categories.
+
+Each candidate's max similarity to the picked set is kept and updated with
+the new pick's similarity row at every step, so a slate of k from m
+candidates costs O(k*m) instead of rescanning the picked set, O(k^2*m). The
+work is bounded by the pool size alone: the similarity gram is at most
+DIVERSITY_CANDIDATES squared, MMR picks at most DIVERSITY_CANDIDATES articles,
+and a longer slate continues past the pool in score order. It doesn't depend
+on timing, so a request ranks the same way under any load.
+"""
+import os
+from typing import Callable, Optional, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+from nlp.embeddings import ArticleEmbeddings
+
+# 1 keeps pure score order (off); lower values trade score for variety
+DIVERSITY_LAMBDA = float(os.getenv("DIVERSITY_LAMBDA", "0.7"))
+DIVERSITY_CANDIDATES = int(os.getenv("DIVERSITY_CANDIDATES", "200"))
+DIVERSITY_CATEGORY_WEIGHT = float(os.getenv("DIVERSITY_CATEGORY_WEIGHT", "0.3"))
+
+
+def _unit_rows(X: Union[np.ndarray, sp.spmatrix]) -> Union[np.ndarray, sp.csr_matrix]:
+    if sp.issparse(X):
+        X = sp.csr_matrix(X, dtype=np.float64)
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms) @ X)
+    X = np.asarray(X, dtype=np.float64)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def mmr(relevance: np.ndarray, similarity_to: Callable[[int], np.ndarray], k: int,
+        lam: float = DIVERSITY_LAMBDA) -> np.ndarray:
+    """
+    Indices of k candidates in MMR order. Candidates are given best score
+    first; similarity_to(j) is candidate j's similarity to every candidate.
+    """
+    m = len(relevance)
+    k = min(k, m)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    relevance = np.asarray(relevance, dtype=np.float64)
+    spread = relevance.max() - relevance.min()
+    rel = (relevance - relevance.min()) / spread if spread > 0 else np.zeros(m)
+
+    max_sim = np.zeros(m)
+    picked = np.zeros(m, dtype=bool)
+    order = []
+    while True:
+        # argmax takes the first of ties, i.e. the higher-scored candidate
+        j = int(np.argmax(np.where(picked, -np.inf, lam * rel - (1.0 - lam) * max_sim)))
+        order.append(j)
+        picked[j] = True
+        if len(order) == k:
+            break
+        np.maximum(max_sim, similarity_to(j), out=max_sim)
+    return np.asarray(order, dtype=np.int64)
+
+
+def pool_similarity(titles: Optional[Union[np.ndarray, sp.spmatrix]], categories: sp.spmatrix,
+                    category_weight: float = DIVERSITY_CATEGORY_WEIGHT) -> Callable[[int], np.ndarray]:
+    """
+    similarity_to(j) for mmr(): the title and category cosines of candidate j,
+    mixed by `category_weight`. Sparse rows (a few terms or categories per
+    article) are cheapest as one pool x pool product up front; dense title
+    vectors are multiplied per pick instead.
+    """
+    categories = _unit_rows(categories)
+    gram = category_weight * (categories @ categories.T).toarray()
+    if titles is None:
+        return lambda j: gram[j]
+    titles = _unit_rows(titles)
+    if sp.issparse(titles):
+        gram += (1.0 - category_weight) * (titles @ titles.T).toarray()
+        return lambda j: gram[j]
+    return lambda j: gram[j] + (1.0 - category_weight) * (titles @ titles[j])
+
+
+def diversify(catalog, scores: np.ndarray, k: int, exclude: Optional[np.ndarray] = None,
+              embeddings: Optional[ArticleEmbeddings] = None, lam: float = DIVERSITY_LAMBDA,
+              candidates: int = DIVERSITY_CANDIDATES,
+              category_weight: float = DIVERSITY_CATEGORY_WEIGHT) -> np.ndarray:
+    """
+    catalog.top_k(scores, k, exclude) with its first `candidates` articles
+    chosen by MMR from the top `candidates`; the rest stay in score order.
+    """
+    ranked = catalog.top_k(scores, max(k, candidates), exclude)
+    pool, rest = ranked[:candidates], ranked[candidates:k]
+    if lam >= 1.0 or len(pool) <= 1:
+        return ranked[:k]
+    if embeddings is not None:
+        titles = embeddings.article_vectors(catalog.ids[pool])
+    else:
+        titles = catalog.title_terms[pool] if catalog.title_terms is not None else None
+    similarity_to = pool_similarity(titles, catalog.categories[pool], category_weight)
+    return np.concatenate([pool[mmr(scores[pool], similarity_to, k, lam)], rest])
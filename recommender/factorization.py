@@ -0,0 +1,317 @@
+"""
+Latent user/article factors by implicit-feedback ALS.
+
+The engagement matrix R (users x articles) counts interactions plus clicked
+impressions per pair. Following Hu, Koren & Volinsky's implicit ALS, every
+cell is a preference p = [r > 0] with confidence c = 1 + alpha * r, and the
+user and article factors are solved for alternately; each half-sweep is an
+independent regularized least-squares problem per row:
+
+    x_u = (Y'Y + Y'(C_u - I)Y + reg I)^-1 Y' C_u p_u
+
+Y'Y is shared, so a row only touches its own nonzeros. By default each solve
+is a few conjugate-gradient steps started from the row's current factors
+(Takacs et al.), O(nnz * k) per step for all rows at once as sparse products;
+cg_steps=0 solves the k x k systems exactly instead, O(nnz * k^2). Rows go in
+blocks of bounded nonzero count spread over a process pool, started once per
+training run with R; the factors are shared with it through shared memory and
+solved in place. Memory is O(nnz + (users + articles) * k), so millions of
+interactions fit on one box.
+
+Training (scripts/train_factors.py) checkpoints after every iteration and
+warm-starts from the previous model: ids present in both keep their factors.
+Online, the latent component of an article is the dot product of the user's
+and the article's factors (0 for users or articles the model hasn't seen).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+FACTOR_MODEL_PATH = os.getenv("FACTOR_MODEL_PATH")
+TRAIN_PROCESSES = int(os.getenv("TRAIN_PROCESSES", str(os.cpu_count() or 1)))
+# Nonzeros per solve block (divided by k for exact solves): bounds the
+# per-block (nnz, k) buffers, about 32MB at k=32
+BLOCK_NNZ = 131072
+
+
+class FactorModel:
+    """User and article factor arrays, rows aligned with ascending ids."""
+
+    def __init__(self, user_ids: np.ndarray, user_factors: np.ndarray,
+                 item_ids: np.ndarray, item_factors: np.ndarray, iteration: int = 0):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+        self.iteration = iteration
+        self._aligned: Tuple[Optional[np.ndarray], Optional[np.ndarray]] = (None, None)
+
+    @property
+    def factors(self) -> int:
+        return self.item_factors.shape[1]
+
+    def _rows(self, ids: np.ndarray, query: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(query, dtype=np.int64)
+        if not len(ids):
+            return np.zeros(len(query), dtype=np.int64), np.zeros(len(query), dtype=bool)
+        at = np.minimum(np.searchsorted(ids, query), len(ids) - 1)
+        return at, ids[at] == query
+
+    def _item_matrix(self, article_ids: Sequence[int]) -> np.ndarray:
+        """(n_articles, k) factors in the order of `article_ids`; reused while the same array is passed."""
+        ref, matrix = self._aligned
+        if ref is not article_ids:
+            at, found = self._rows(self.item_ids, article_ids)
+            matrix = np.where(found[:, None], self.item_factors[at], 0.0).astype(np.float32)
+            self._aligned = (article_ids, matrix)
+        return matrix
+
+    def scores_many(self, user_ids: Sequence[int], article_ids: Sequence[int]) -> np.ndarray:
+        """(n_users, n_articles) predicted preference; one GEMM for the whole block."""
+        at, found = self._rows(self.user_ids, user_ids)
+        users = np.where(found[:, None], self.user_factors[at], 0.0).astype(np.float32)
+        return (users @ self._item_matrix(article_ids).T).astype(np.float64)
+
+    def scores(self, user_id: int, article_ids: Sequence[int]) -> np.ndarray:
+        return self.scores_many([user_id], article_ids)[0]
+
+    def save(self, path: str) -> None:
+        """Write to `path` (.npz) atomically."""
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, user_ids=self.user_ids, user_factors=self.user_factors,
+                 item_ids=self.item_ids, item_factors=self.item_factors,
+                 iteration=np.asarray(self.iteration))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FactorModel":
+        with np.load(path) as f:
+            return cls(f["user_ids"], f["user_factors"], f["item_ids"], f["item_factors"], int(f["iteration"]))
+
+
+# ---------- engagement matrix ----------
+
+def fetch_engagements(conn, fetch_size: int = 100_000) -> Tuple[np.ndarray, np.ndarray, sp.csr_matrix]:
+    """
+    (user_ids, article_ids, R) with R[u, a] = interactions + clicked impressions
+    of user_ids[u] on article_ids[a], aggregated in SQL and streamed.
+    """
+    users, items, counts = [], [], []
+    with conn.cursor(name="engagements") as cur:
+        cur.itersize = fetch_size
+        cur.execute("""
+            SELECT user_id, article_id, COUNT(*)
+            FROM (
+                SELECT user_id, article_id FROM interactions
+                UNION ALL
+                SELECT user_id, article_id FROM recommendation_logs
+                WHERE clicked AND user_id IS NOT NULL AND article_id IS NOT NULL
+            ) e
+            GROUP BY user_id, article_id
+        """)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            u, a, c = zip(*rows)
+            users.append(np.asarray(u, dtype=np.int64))
+            items.append(np.asarray(a, dtype=np.int64))
+            counts.append(np.asarray(c, dtype=np.float32))
+    return engagement_matrix(np.concatenate(users) if users else np.zeros(0, dtype=np.int64),
+                             np.concatenate(items) if items else np.zeros(0, dtype=np.int64),
+                             np.concatenate(counts) if counts else np.zeros(0, dtype=np.float32))
+
+
+def engagement_matrix(users: np.ndarray, items: np.ndarray, counts: np.ndarray
+                      ) -> Tuple[np.ndarray, np.ndarray, sp.csr_matrix]:
+    """Index (user, article, count) triples into (user_ids, article_ids, CSR)."""
+    user_ids, rows = np.unique(users, return_inverse=True)
+    item_ids, cols = np.unique(items, return_inverse=True)
+    R = sp.csr_matrix((np.asarray(counts, dtype=np.float32), (rows, cols)),
+                      shape=(len(user_ids), len(item_ids)))
+    R.sum_duplicates()
+    return user_ids, item_ids, R
+
+
+# ---------- ALS ----------
+
+_OTHER_SIDE = {"users": "items", "items": "users"}
+_worker = {}
+
+
+class _SharedArrays:
+    """Copies of `arrays` in shared memory, which pool workers attach to by name."""
+
+    def __init__(self, **arrays: np.ndarray):
+        self._segments: List[shared_memory.SharedMemory] = []
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.specs: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+        for name, array in arrays.items():
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._segments.append(segment)
+            self.arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+            self.arrays[name][...] = array
+            self.specs[name] = (segment.name, array.shape, array.dtype.str)
+
+    def __enter__(self) -> "_SharedArrays":
+        return self
+
+    def __exit__(self, *exc):
+        self.arrays.clear()  # no views may outlive the buffers
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        return False
+
+
+def _init_worker(matrices, arrays, reg, alpha, cg_steps):
+    """
+    Training state, set once per train_als(): R in both orientations
+    ({side: (indptr, indices, data)}), and the "users", "items" and "gram"
+    arrays, given directly in-process or as shared-memory specs to pool workers.
+    """
+    segments = []
+    for name, spec in list(arrays.items()):
+        if not isinstance(spec, np.ndarray):
+            segment_name, shape, dtype = spec
+            segments.append(shared_memory.SharedMemory(name=segment_name))
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=segments[-1].buf)
+    _worker.update(matrices=matrices, arrays=arrays, segments=segments, reg=reg, alpha=alpha,
+                   cg_steps=cg_steps)
+
+
+def _solve_block(task: Tuple[str, int, int]) -> None:
+    """Re-solve rows [start, stop) of `side`'s factors in place against the other side's."""
+    side, start, stop = task
+    w = _worker
+    all_indptr, all_indices, all_data = w["matrices"][side]
+    X, Y = w["arrays"][side], w["arrays"][_OTHER_SIDE[side]]
+    k = Y.shape[1]
+    lo, hi = all_indptr[start], all_indptr[stop]
+    indptr = all_indptr[start:stop + 1] - lo
+    indices = all_indices[lo:hi]
+    extra = w["alpha"] * all_data[lo:hi].astype(np.float64)  # c - 1
+    n_rows = stop - start
+    rows = np.repeat(np.arange(n_rows), np.diff(indptr))
+    Yi = Y[indices].astype(np.float64)
+    base = w["arrays"]["gram"] + w["reg"] * np.eye(k)
+
+    def segment_sum(values: np.ndarray) -> np.ndarray:
+        """Per-row sum of values[j] * Y[indices[j]]."""
+        return np.asarray(sp.csr_matrix((values, indices, indptr), shape=(n_rows, len(Y))) @ Y, dtype=np.float64)
+
+    b = segment_sum(1.0 + extra)
+    if not w["cg_steps"]:
+        A = np.zeros((n_rows, k, k))
+        np.add.at(A, rows, extra[:, None, None] * Yi[:, :, None] * Yi[:, None, :])
+        X[start:stop] = np.linalg.solve(A + base, b[..., None])[..., 0]
+        return
+
+    def apply_A(P: np.ndarray) -> np.ndarray:
+        return P @ base + segment_sum(extra * np.einsum("nk,nk->n", Yi, P[rows]))
+
+    x = X[start:stop].astype(np.float64)
+    r = b - apply_A(x)
+    p = r.copy()
+    rs = np.einsum("ij,ij->i", r, r)
+    for _ in range(w["cg_steps"]):
+        Ap = apply_A(p)
+        pAp = np.einsum("ij,ij->i", p, Ap)
+        step = np.divide(rs, pAp, out=np.zeros_like(rs), where=pAp > 0)
+        x += step[:, None] * p
+        r -= step[:, None] * Ap
+        rs_new = np.einsum("ij,ij->i", r, r)
+        p = r + np.divide(rs_new, rs, out=np.zeros_like(rs), where=rs > 0)[:, None] * p
+        rs = rs_new
+    X[start:stop] = x
+
+
+def _blocks(indptr: np.ndarray, block_nnz: int) -> List[Tuple[int, int]]:
+    """Row ranges with about `block_nnz` nonzeros each (a single heavier row gets its own block)."""
+    n = len(indptr) - 1
+    blocks, start = [], 0
+    while start < n:
+        stop = int(np.searchsorted(indptr, indptr[start] + block_nnz, side="right")) - 1
+        stop = min(max(stop, start + 1), n)
+        blocks.append((start, stop))
+        start = stop
+    return blocks
+
+
+def _half_sweep(side: str, blocks: List[Tuple[int, int]], arrays: Dict[str, np.ndarray],
+                pool: Optional[ProcessPoolExecutor]) -> None:
+    """Re-solve every row of `side`'s factors in place with the other side fixed."""
+    Y = arrays[_OTHER_SIDE[side]].astype(np.float64)
+    arrays["gram"][...] = Y.T @ Y
+    tasks = [(side, start, stop) for start, stop in blocks]
+    if pool is None:
+        for task in tasks:
+            _solve_block(task)
+    else:
+        for _ in pool.map(_solve_block, tasks):
+            pass
+
+
+def _warm_start(ids: np.ndarray, previous_ids: Optional[np.ndarray], previous: Optional[np.ndarray],
+                factors: int, rng: np.random.Generator) -> np.ndarray:
+    out = (rng.standard_normal((len(ids), factors)) * 0.01).astype(np.float32)
+    if previous is not None and len(previous_ids) and previous.shape[1] == factors:
+        at = np.minimum(np.searchsorted(previous_ids, ids), len(previous_ids) - 1)
+        found = previous_ids[at] == ids
+        out[found] = previous[at[found]]
+    return out
+
+
+def train_als(user_ids: np.ndarray, item_ids: np.ndarray, R: sp.csr_matrix, factors: int = 32,
+              reg: float = 0.1, alpha: float = 20.0, iterations: int = 10,
+              previous: Optional[FactorModel] = None, start_iteration: int = 0,
+              cg_steps: int = 3, processes: int = TRAIN_PROCESSES,
+              checkpoint: Optional[Callable[[FactorModel], None]] = None, seed: int = 0) -> FactorModel:
+    """
+    Alternate user and article solves from sweep `start_iteration` up to
+    `iterations`. With `previous` (the last model, or a checkpoint being
+    resumed) ids it knows start from its factors; `checkpoint` is called with
+    the model after every sweep.
+    """
+    rng = np.random.default_rng(seed)
+    X = _warm_start(user_ids, previous.user_ids if previous else None,
+                    previous.user_factors if previous else None, factors, rng)
+    Y = _warm_start(item_ids, previous.item_ids if previous else None,
+                    previous.item_factors if previous else None, factors, rng)
+    model = FactorModel(user_ids, X, item_ids, Y, start_iteration)
+    if start_iteration >= iterations:
+        return model
+
+    RT = R.T.tocsr()
+    matrices = {"users": (R.indptr, R.indices, R.data), "items": (RT.indptr, RT.indices, RT.data)}
+    block_nnz = BLOCK_NNZ if cg_steps else max(1, BLOCK_NNZ // factors)
+    blocks = {side: _blocks(indptr, block_nnz) for side, (indptr, _, _) in matrices.items()}
+    processes = max(1, min(processes, max(len(b) for b in blocks.values())))
+    gram = np.zeros((factors, factors))
+    with ExitStack() as stack:
+        # One pool for the whole run: R goes to each worker once, through the
+        # initializer, and both factor arrays live in shared memory, so a
+        # half-sweep only sends row ranges.
+        if processes == 1:
+            arrays, pool = {"users": X, "items": Y, "gram": gram}, None
+            _init_worker(matrices, arrays, reg, alpha, cg_steps)
+        else:
+            shared = stack.enter_context(_SharedArrays(users=X, items=Y, gram=gram))
+            arrays = shared.arrays
+            pool = stack.enter_context(ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker,
+                initargs=(matrices, shared.specs, reg, alpha, cg_steps)))
+        for iteration in range(start_iteration, iterations):
+            _half_sweep("users", blocks["users"], arrays, pool)
+            _half_sweep("items", blocks["items"], arrays, pool)
+            model = FactorModel(user_ids, arrays["users"].copy(), item_ids, arrays["items"].copy(),
+                                iteration + 1)
+            if checkpoint is not None:
+                checkpoint(model)
+    _worker.clear()
+    return model
@@ -0,0 +1,85 @@
+"""
+Short-lived ranked snapshots behind paginated recommendations.
+
+The first page of a request ranks PAGINATION_DEPTH articles once and keeps
+that ranked list here under a random token; the response carries an opaque
+cursor (token + offset) for the next page, which is then a slice of the same
+list -- no rescoring, and pages never overlap or reshuffle. Snapshots are
+per worker, expire after `ttl` seconds and are evicted least recently used
+beyond `max_entries`; a cursor whose snapshot is gone is still decodable, so
+the caller can re-rank and carry on.
+"""
+import base64
+import binascii
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Articles ranked per snapshot, i.e. how far a client can page
+PAGINATION_DEPTH = int(os.getenv("PAGINATION_DEPTH", "100"))
+PAGINATION_TTL = float(os.getenv("PAGINATION_TTL", "600"))
+
+
+def encode_cursor(token: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{token}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(token, offset); ValueError if `cursor` wasn't made by encode_cursor()."""
+    try:
+        token, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+    if offset < 0:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return token, offset
+
+
+class RankedSnapshots:
+    def __init__(self, max_entries: int = 10_000, ttl: float = PAGINATION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, user_id: int, ranked: List[Dict[str, Any]]) -> str:
+        """Keep `ranked` for the user; returns its token."""
+        token = secrets.token_urlsafe(12)
+        with self._lock:
+            self._entries[token] = (time.monotonic(), user_id, ranked)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: str, user_id: int) -> Optional[List[Dict[str, Any]]]:
+        """The user's ranked list under `token`, or None if it expired, was evicted or isn't theirs."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[token]
+                entry = None
+            if entry is None or entry[1] != user_id:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[2]
+
+    def page(self, token: str, ranked: List[Dict[str, Any]], offset: int,
+             limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """ranked[offset:offset + limit] and the cursor of the page after it (None at the end)."""
+        end = offset + limit
+        return ranked[offset:end], encode_cursor(token, end) if end < len(ranked) else None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,13 +1,24 @@
 import os
-from datetime import datetime
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterator, List, Tuple, Optional
 
-from db.user_repo import fetch_user_profile
-from db.article_repo import fetch_articles
-from db.interaction_repo import fetch_time_spent
+import numpy as np
+
+from db.repository import as_repository
+from nlp.ann_index import TitleLSHIndex
+from nlp.embeddings import ArticleEmbeddings
+from nlp.similarity import score_title_similarity
 
 # ✅ use your scorer
-from recommender.scorer import calculate_score
+from recommender.bandit import ConfigBandit
+from recommender.catalog import ArticleCatalog
+from recommender.co_engagement import CoEngagement
+from recommender.factorization import FactorModel
+from recommender.component_cache import ComponentCache
+from recommender.diversity import diversify
+from recommender.scorer import apply_weights
+from recommender.seen import SeenArticles
+from recommender.trending import TRENDING_MIN_RESULTS, TrendingLists, is_cold_start
+from telemetry.metrics import timed
 
 
 def get_best_scoring_config(conn) -> Optional[int]:
@@ -19,11 +30,11 @@ def get_best_scoring_config(conn) -> Optional[int]:
         # Try best-by-CTR first
         cur.execute("""
             SELECT scoring_config_id
-            FROM recommendation_logs
+            FROM recommendation_log_daily
             WHERE scoring_config_id IS NOT NULL
             GROUP BY scoring_config_id
-            ORDER BY (COUNT(*) FILTER (WHERE clicked)=0) = TRUE,  -- avoid div by zero edge
-                     (COUNT(*) FILTER (WHERE clicked))::float / NULLIF(COUNT(*), 0) DESC
+            ORDER BY SUM(clicks) = 0,  -- avoid div by zero edge
+                     SUM(clicks)::float / NULLIF(SUM(impressions), 0) DESC
             LIMIT 1;
         """)
         row = cur.fetchone()
@@ -47,124 +58,299 @@ def get_active_weights(conn) -> Tuple[float, float, float, Optional[int]]:
     Fetch (w1, w2, w3, config_id) from the most recent active config.
     Fallback to (1.0, 1.0, 1.0, None) if table is empty.
     """
-    with conn.cursor() as cur:
-        try:
-            cur.execute("""
-                SELECT id, w1, w2, w3
-                FROM scoring_configurations
-                WHERE is_active = TRUE
-                ORDER BY created_at DESC
-                LIMIT 1;
-            """)
-            row = cur.fetchone()
-            if row:
-                config_id, w1, w2, w3 = row
-                return float(w1), float(w2), float(w3), int(config_id)
-        except Exception:
-            pass
+    try:
+        row = as_repository(conn).fetch_active_config()
+        if row:
+            config_id, w1, w2, w3 = row
+            return w1, w2, w3, config_id
+    except Exception:
+        pass
     return 1.0, 1.0, 1.0, None
 
 
-def _row_to_score_tuple(row: Any) -> Tuple[int, str, Optional[str], Optional[List[str]]]:
+def user_similarities(conn, user_id: int, catalog: ArticleCatalog,
+                      embeddings: Optional[ArticleEmbeddings] = None,
+                      liked_titles: Optional[List[str]] = None,
+                      title_index: Optional[TitleLSHIndex] = None) -> Optional[np.ndarray]:
     """
-    Normalize an article row (dict or tuple) to (id, title, country, category_list)
-    in the exact order your scorer expects.
+    Raw title similarity of every catalog article to the user's liked titles:
+    one matvec against the mean liked-title vector with `embeddings`, else
+    TF-IDF (from the catalog's ingest-time title terms when it has them).
+    With `title_index`, TF-IDF is only computed for the articles sharing an
+    LSH bucket with a liked title; the rest are left at 0.
+    None if the user has no liked titles.
     """
-    if isinstance(row, dict):
-        art_id = row.get("id")
-        title = row.get("title")
-        country = row.get("country")
-        category = row.get("category")
-    else:
-        # Assume tuple order commonly used in repos: (id, title, country, category, ...)
-        # Safely slice first 4 fields
-        art_id = row[0]
-        title = row[1]
-        country = row[2] if len(row) > 2 else None
-        category = row[3] if len(row) > 3 else None
+    def load_liked():
+        return liked_titles if liked_titles is not None else as_repository(conn).fetch_liked_titles(user_id)
+
+    if embeddings is not None:
+        with timed("user_vector"):
+            user_vec = embeddings.user_vector(user_id, load_liked)
+        if user_vec is None:
+            return None
+        with timed("similarity_embeddings"):
+            return embeddings.similarities(user_vec, catalog.ids)
 
-    # Ensure category is a list[str] (handles TEXT[] or single TEXT)
-    if category is None:
-        cat_list: Optional[List[str]] = None
-    elif isinstance(category, (list, tuple)):
-        cat_list = [str(c) for c in category]
-    else:
-        cat_list = [str(category)]
+    with timed("fetch_liked_titles"):
+        liked = load_liked()
+    if not liked:
+        return None
+    positions = None
+    if title_index is not None:
+        with timed("title_index"):
+            positions, found = catalog.positions(title_index.candidate_ids(liked))
+            positions = np.unique(positions[found])
+    with timed("similarity_tfidf"):
+        if catalog.title_terms is not None:
+            return catalog.title_similarities(liked, positions)
+        if positions is None:
+            return np.asarray([score_title_similarity(title, liked) for title in catalog.titles])
+        sims = np.zeros(len(catalog))
+        sims[positions] = [score_title_similarity(catalog.titles[p], liked) for p in positions]
+        return sims
 
-    return int(art_id), str(title), (str(country) if country else None), cat_list
 
+def user_co_engagement(co_engagement: Optional[CoEngagement], user_id: int, time_spent_map: Dict[int, int],
+                       catalog: ArticleCatalog) -> Optional[np.ndarray]:
+    """Co-engagement score of every catalog article from the user's interactions and recent clicks."""
+    if co_engagement is None:
+        return None
+    with timed("co_engagement"):
+        engaged = set(time_spent_map) | set(co_engagement.user_history(user_id))
+        return co_engagement.scores(engaged, catalog.ids)
 
-def recommend_articles(conn, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+
+def user_components(conn, user_id: int, user_profile: Dict[str, Any], catalog: ArticleCatalog,
+                    cache: Optional[ComponentCache] = None,
+                    embeddings: Optional[ArticleEmbeddings] = None,
+                    co_engagement: Optional[CoEngagement] = None,
+                    factors: Optional[FactorModel] = None,
+                    title_index: Optional[TitleLSHIndex] = None) -> np.ndarray:
+    """
+    Unweighted component matrix for every catalog article and this user,
+    served from `cache` when the catalog hasn't changed since it was built.
+    """
+    if cache is not None:
+        cached = cache.get(user_id, catalog.ids)
+        if cached is not None:
+            return cached
+
+    with timed("fetch_time_spent"):
+        time_spent_map = as_repository(conn).fetch_time_spent(user_id)
+    similarities = user_similarities(conn, user_id, catalog, embeddings, title_index=title_index)
+    co_scores = user_co_engagement(co_engagement, user_id, time_spent_map, catalog)
+    latent = None
+    if factors is not None:
+        with timed("latent"):
+            latent = factors.scores(user_id, catalog.ids)
+    with timed("components"):
+        components = catalog.components(user_profile, time_spent_map, similarities, co_scores, latent)
+
+    if cache is not None:
+        cache.put(user_id, catalog.ids, components)
+    return components
+
+
+def cold_start_recommendations(conn, user_id: int, user_profile: Dict[str, Any], limit: int,
+                               trending: Optional[TrendingLists], seen: Optional[SeenArticles] = None,
+                               time_spent_map: Optional[Dict[int, int]] = None,
+                               liked_titles: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    The trending list (minus `seen`) for a cold-start user, or None if the
+    user has history or the list can't fill min(limit, TRENDING_MIN_RESULTS),
+    so the caller scores them.
+    """
+    # Profile first, so users with preferences don't pay for the history queries
+    if trending is None or not is_cold_start(user_profile, {}, ()):
+        return None
+    repo = as_repository(conn)
+    with timed("cold_start_check"):
+        if time_spent_map is None:
+            time_spent_map = repo.fetch_time_spent(user_id)
+        if liked_titles is None:
+            liked_titles = repo.fetch_liked_titles(user_id)
+    if not is_cold_start(user_profile, time_spent_map, liked_titles):
+        return None
+    with timed("trending"):
+        exclude = seen.get(repo, user_id) if seen is not None else None
+        recs = trending.top(limit, exclude_ids=exclude)
+    return recs if len(recs) >= min(limit, TRENDING_MIN_RESULTS) else None
+
+
+def _serving_config(conn, bandit: Optional[ConfigBandit]) -> Tuple[float, float, float, Optional[int]]:
+    if bandit is not None:
+        config_id = bandit.select()
+        return (*bandit.weights(config_id), config_id)
+    return get_active_weights(conn)
+
+
+def recommend_articles(conn, user_id: int, limit: int = 10,
+                       cache: Optional[ComponentCache] = None,
+                       bandit: Optional[ConfigBandit] = None,
+                       embeddings: Optional[ArticleEmbeddings] = None,
+                       catalog: Optional[ArticleCatalog] = None,
+                       seen: Optional[SeenArticles] = None,
+                       co_engagement: Optional[CoEngagement] = None,
+                       factors: Optional[FactorModel] = None,
+                       trending: Optional[TrendingLists] = None,
+                       diversity: Optional[float] = None,
+                       title_index: Optional[TitleLSHIndex] = None) -> List[Dict[str, Any]]:
     """
     End-to-end recommender:
-      1) fetch user profile, articles, time spent
-      2) get weights
-      3) score with your calculate_score()
-      4) return top-N, each with score injected:
-         { article_id, title, country, category, score }
+      1) fetch user profile, articles (unless a preloaded `catalog` is given), time spent
+      2) get weights: the arm chosen by `bandit`, else the most recent active config
+      3) build the per-article component matrix (cached per user if `cache` is given,
+         similarity from `embeddings`, else TF-IDF over `title_index`
+         candidates, co-engagement from `co_engagement` and
+         latent scores from `factors` if given) and weight it, equivalent to
+         calculate_score() per article
+      4) return top-N, leaving out articles in `seen` if given and re-ranked by
+         MMR with lambda `diversity` if given, each with score and serving
+         config injected:
+         { article_id, title, country, category, score, scoring_config_id }
+    Cold-start users (no preferences, likes or time spent) are served the
+    `trending` list instead, if given, with scoring_config_id None.
     """
-    user_profile = fetch_user_profile(conn, user_id)
+    repo = as_repository(conn)
+    with timed("fetch_user_profile"):
+        user_profile = repo.fetch_user_profile(user_id)
     if not user_profile:
         return []
+    cold = cold_start_recommendations(repo, user_id, user_profile, limit, trending, seen)
+    if cold is not None:
+        return cold
+
+    if catalog is None:
+        with timed("fetch_articles"):
+            catalog = ArticleCatalog.load(repo)
+    with timed("get_active_weights"):
+        w1, w2, w3, config_id = _serving_config(repo, bandit)
 
-    articles = fetch_articles(conn)
-    time_spent_map = fetch_time_spent(conn, user_id)
-    w1, w2, w3, _ = get_active_weights(conn)
-
-    scored: List[Dict[str, Any]] = []
-    for row in articles:
-        art_id, title, country, category = _row_to_score_tuple(row)
-        # Your scorer expects a 4-tuple
-        scored_item = calculate_score(
-            (art_id, title, country, category),
-            user_profile,
-            time_spent_map,
-            conn,
-            user_id,
-            w1, w2, w3
-        )
-        # Ensure we also include basic article fields to print/log later
-        scored_item.setdefault("article_id", art_id)
-        scored_item.setdefault("title", title)
-        # Try to pass through country/category so scripts can show them
-        scored_item.setdefault("country", country)
-        scored_item.setdefault("category", category or [])
-        scored.append(scored_item)
-
-    scored.sort(key=lambda x: x.get("score", 0), reverse=True)
-    return scored[:limit]
-
-
-def log_recommendations(conn, user_id: int, articles: List[Dict[str, Any]], scoring_config_id: Optional[int]) -> None:
+    components = user_components(repo, user_id, user_profile, catalog, cache, embeddings, co_engagement,
+                                 factors, title_index)
+    exclude = None
+    if seen is not None:
+        with timed("seen_mask"):
+            exclude = seen.mask(repo, user_id, catalog)
+    with timed("rank"):
+        scores = apply_weights(components, (w1, w2, w3))
+        if diversity is None:
+            return catalog.to_dicts(catalog.top_k(scores, limit, exclude), scores, config_id)
+    with timed("diversity"):
+        positions = diversify(catalog, scores, limit, exclude, embeddings, diversity)
+    return catalog.to_dicts(positions, scores, config_id)
+
+
+# Upper bound on users x articles similarity cells held at once by the batch path.
+BATCH_MAX_CELLS = 2 ** 24
+
+
+def recommend_articles_batch(conn, user_ids: List[int], limit: int = 10,
+                             bandit: Optional[ConfigBandit] = None,
+                             embeddings: Optional[ArticleEmbeddings] = None,
+                             catalog: Optional[ArticleCatalog] = None,
+                             chunk_size: int = 256,
+                             seen: Optional[SeenArticles] = None,
+                             co_engagement: Optional[CoEngagement] = None,
+                             factors: Optional[FactorModel] = None,
+                             trending: Optional[TrendingLists] = None,
+                             diversity: Optional[float] = None,
+                             title_index: Optional[TitleLSHIndex] = None
+                             ) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    recommend_articles() for many users, yielding (user_id, recommendations) as
+    each finishes. Articles and weights are loaded once; profiles, time spent and
+    liked titles once per chunk of users; with `embeddings` the chunk's similarity
+    block is a single (users x dim) @ (dim x articles) product. Memory is bounded
+    by the chunk, not by len(user_ids). Unknown users yield [].
+    """
+    repo = as_repository(conn)
+    if catalog is None:
+        with timed("fetch_articles"):
+            catalog = ArticleCatalog.load(repo)
+    default_weights = None if bandit is not None else get_active_weights(repo)
+    n_articles = max(len(catalog), 1)
+    chunk_size = max(1, min(chunk_size, BATCH_MAX_CELLS // n_articles))
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        with timed("batch_fetch_users"):
+            profiles = repo.fetch_user_profiles(chunk)
+            time_spent = repo.fetch_time_spent_many(chunk)
+            liked = repo.fetch_liked_titles_many(chunk)
+
+        sim_block = None
+        if embeddings is not None and len(catalog):
+            with timed("batch_similarity_embeddings"):
+                user_vecs = [embeddings.user_vector(uid, lambda uid=uid: liked.get(uid, [])) for uid in chunk]
+                sim_block = embeddings.similarity_matrix(user_vecs, catalog.ids)
+        latent_block = None
+        if factors is not None and len(catalog):
+            with timed("batch_latent"):
+                latent_block = factors.scores_many(chunk, catalog.ids)
+
+        for row, user_id in enumerate(chunk):
+            profile = profiles.get(user_id)
+            if not profile:
+                yield user_id, []
+                continue
+            user_time_spent = time_spent.get(user_id, {})
+            cold = cold_start_recommendations(repo, user_id, profile, limit, trending, seen,
+                                              user_time_spent, liked.get(user_id, []))
+            if cold is not None:
+                yield user_id, cold
+                continue
+
+            if sim_block is not None:
+                similarities = sim_block[row] if user_vecs[row] is not None else None
+            else:
+                similarities = user_similarities(repo, user_id, catalog, liked_titles=liked.get(user_id, []),
+                                                 title_index=title_index)
+            co_scores = user_co_engagement(co_engagement, user_id, user_time_spent, catalog)
+            latent = latent_block[row] if latent_block is not None else None
+            components = catalog.components(profile, user_time_spent, similarities, co_scores, latent)
+
+            w1, w2, w3, config_id = default_weights or _serving_config(repo, bandit)
+            scores = apply_weights(components, (w1, w2, w3))
+            exclude = seen.mask(repo, user_id, catalog) if seen is not None else None
+            if diversity is None:
+                positions = catalog.top_k(scores, limit, exclude)
+            else:
+                with timed("diversity"):
+                    positions = diversify(catalog, scores, limit, exclude, embeddings, diversity)
+            yield user_id, catalog.to_dicts(positions, scores, config_id)
+
+
+def log_recommendations(conn, user_id: int, articles: List[Dict[str, Any]],
+                        scoring_config_id: Optional[int] = None,
+                        bandit: Optional[ConfigBandit] = None,
+                        seen: Optional[SeenArticles] = None) -> None:
     """
     Insert shown impressions into recommendation_logs (clicked defaults to FALSE).
+    If scoring_config_id is None, each article's own "scoring_config_id" (set by
+    recommend_articles) is logged, so the serving arm is recorded.
     """
-    with conn.cursor() as cur:
-        for a in articles:
-            cur.execute("""
-                INSERT INTO recommendation_logs (user_id, article_id, scoring_config_id, clicked, timestamp)
-                VALUES (%s, %s, %s, FALSE, %s)
-            """, (user_id, a["article_id"], scoring_config_id, datetime.utcnow()))
-    conn.commit()
+    repo = as_repository(conn)
+    rows = [(a["article_id"], scoring_config_id if scoring_config_id is not None else a.get("scoring_config_id"))
+            for a in articles]
+    repo.insert_impressions(user_id, rows)
+    if seen is not None:
+        seen.add(user_id, (article_id for article_id, _ in rows))
+    if bandit is not None:
+        for _, config_id in rows:
+            bandit.record_impressions(config_id)
+        bandit.maybe_persist(conn)
 
 
-def log_click(conn, user_id: int, article_id: int, scoring_config_id: Optional[int]) -> None:
+def log_click(conn, user_id: int, article_id: int, scoring_config_id: Optional[int],
+              bandit: Optional[ConfigBandit] = None,
+              seen: Optional[SeenArticles] = None) -> None:
     """
     Mark a recommendation as clicked. If no prior impression row exists, insert one as clicked.
     """
-    with conn.cursor() as cur:
-        # Try to update an existing impression
-        cur.execute("""
-            UPDATE recommendation_logs
-            SET clicked = TRUE
-            WHERE user_id = %s AND article_id = %s
-              AND (scoring_config_id = %s OR (scoring_config_id IS NULL AND %s IS NULL))
-            RETURNING id;
-        """, (user_id, article_id, scoring_config_id, scoring_config_id))
-        if cur.rowcount == 0:
-            # No impression existed — insert as clicked
-            cur.execute("""
-                INSERT INTO recommendation_logs (user_id, article_id, scoring_config_id, clicked, timestamp)
-                VALUES (%s, %s, %s, TRUE, %s)
-            """, (user_id, article_id, scoring_config_id, datetime.utcnow()))
-    conn.commit()
\ No newline at end of file
+    as_repository(conn).mark_clicked(user_id, article_id, scoring_config_id)
+    if seen is not None:
+        seen.add(user_id, [article_id])
+    if bandit is not None:
+        bandit.record_click(scoring_config_id)
+        bandit.maybe_persist(conn)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Counterfactual replay of logged recommendation slates.
+
+Each logged slate (one user's impressions in recommendation_logs) is turned into a
+component matrix once (n_items x len(COMPONENTS)). A grid of (w1, w2, w3) configs
+becomes a weight matrix (len(COMPONENTS) x n_configs), so re-ranking every slate
+under every config is a single batched matrix product followed by a top-k.
+
+Only logged items have known click outcomes, so configs are compared by how well
+they re-order what was actually shown (the usual replay estimator); absolute
+numbers are optimistic, relative ordering is what matters.
+"""
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db.repository import as_repository
+from recommender.catalog import row_to_score_tuple
+from recommender.scorer import COMPONENTS, expand_weights, score_components
+
+# Slates per batched matmul; bounds memory at roughly
+# chunk * max_slate_len * n_configs float64s.
+SLATE_CHUNK = 256
+
+
+def weight_grid(values: Sequence[float] = (0.0, 0.5, 1.0, 2.0, 3.0)) -> np.ndarray:
+    """
+    Every (w1, w2, w3) triple over `values`, as an (n_configs, 3) array.
+    The all-zero triple is skipped since it ranks nothing.
+    """
+    triples = [t for t in product(values, repeat=3) if any(t)]
+    return np.asarray(triples, dtype=np.float64)
+
+
+def weight_matrix(configs: np.ndarray) -> np.ndarray:
+    """
+    Expand (n_configs, 3) weight triples into a (len(COMPONENTS), n_configs)
+    matrix that multiplies component rows directly.
+    """
+    return expand_weights(np.asarray(configs, dtype=np.float64).reshape(-1, 3))
+
+
+def fetch_logged_slates(conn, since=None) -> Dict[int, List[Tuple[int, bool]]]:
+    """
+    Return {user_id: [(article_id, clicked), ...]} from recommendation_logs,
+    one entry per (user, article) with clicked=True if any impression was clicked.
+    """
+    return as_repository(conn).fetch_logged_slates(since)
+
+
+def build_slate_components(conn, slates: Dict[int, List[Tuple[int, bool]]]
+                           ) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Score every logged article once per user into a component matrix.
+    Returns [(user_id, components (n_items, len(COMPONENTS)), clicks (n_items,)), ...].
+    Uses the users' current profiles, so this is a replay against today's state.
+    """
+    repo = as_repository(conn)
+    articles = {}
+    for row in repo.fetch_articles():
+        art = row_to_score_tuple(row)
+        articles[art[0]] = art
+
+    out = []
+    for user_id, items in slates.items():
+        profile = repo.fetch_user_profile(user_id)
+        if not profile:
+            continue
+        time_spent_map = repo.fetch_time_spent(user_id)
+        liked_titles = repo.fetch_liked_titles(user_id)
+
+        rows, clicks = [], []
+        for article_id, clicked in items:
+            art = articles.get(article_id)
+            if art is None:
+                continue
+            rows.append(score_components(art, profile, time_spent_map, liked_titles))
+            clicks.append(clicked)
+        if rows:
+            out.append((user_id, np.asarray(rows, dtype=np.float64), np.asarray(clicks, dtype=bool)))
+    return out
+
+
+def _pad(slates: List[Tuple[int, np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Stack ragged slates into (n_slates, max_len, n_comp) with a validity mask."""
+    max_len = max(len(c) for _, c, _ in slates)
+    n_comp = len(COMPONENTS)
+    comps = np.zeros((len(slates), max_len, n_comp))
+    clicks = np.zeros((len(slates), max_len), dtype=bool)
+    valid = np.zeros((len(slates), max_len), dtype=bool)
+    for i, (_, c, k) in enumerate(slates):
+        comps[i, :len(c)] = c
+        clicks[i, :len(k)] = k
+        valid[i, :len(c)] = True
+    return comps, clicks, valid
+
+
+def replay(slates: List[Tuple[int, np.ndarray, np.ndarray]], configs: np.ndarray,
+           k: int = 5) -> Dict[str, np.ndarray]:
+    """
+    Re-rank every slate under every config and estimate metrics offline.
+
+    Returns arrays of shape (n_configs,):
+      ctr_at_k        clicks in the re-ranked top-k / items shown in top-k (micro)
+      precision_at_k  per-slate hits@k / k, macro-averaged over slates
+      recall_at_k     per-slate hits@k / clicks in slate, macro over slates with clicks
+    """
+    configs = np.asarray(configs, dtype=np.float64).reshape(-1, 3)
+    W = weight_matrix(configs)
+    n_configs = configs.shape[0]
+
+    hits_total = np.zeros(n_configs)
+    shown_total = 0
+    precision_sum = np.zeros(n_configs)
+    recall_sum = np.zeros(n_configs)
+    n_slates = n_with_clicks = 0
+
+    for start in range(0, len(slates), SLATE_CHUNK):
+        comps, clicks, valid = _pad(slates[start:start + SLATE_CHUNK])
+        # (slates, items, comp) @ (comp, configs) -> (slates, items, configs)
+        scores = comps @ W
+        scores[~valid] = -np.inf
+
+        kk = min(k, scores.shape[1])
+        # Stable sort keeps logged order on ties, like a stable list.sort().
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :kk, :]
+        top_clicks = np.take_along_axis(clicks[:, :, None], top, axis=1)
+        top_valid = np.take_along_axis(valid[:, :, None], top, axis=1)
+        hits = (top_clicks & top_valid).sum(axis=1)               # (slates, configs)
+        shown = np.minimum(valid.sum(axis=1), kk)                  # (slates,)
+        slate_clicks = clicks.sum(axis=1)                          # (slates,)
+
+        hits_total += hits.sum(axis=0)
+        shown_total += int(shown.sum())
+        precision_sum += (hits / np.maximum(shown, 1)[:, None]).sum(axis=0)
+        has_clicks = slate_clicks > 0
+        recall_sum += (hits[has_clicks] / slate_clicks[has_clicks][:, None]).sum(axis=0)
+        n_slates += len(shown)
+        n_with_clicks += int(has_clicks.sum())
+
+    return {
+        "ctr_at_k": hits_total / shown_total if shown_total else np.zeros(n_configs),
+        "precision_at_k": precision_sum / n_slates if n_slates else np.zeros(n_configs),
+        "recall_at_k": recall_sum / n_with_clicks if n_with_clicks else np.zeros(n_configs),
+    }
+
+
+def rank_configs(configs: np.ndarray, metrics: Dict[str, np.ndarray],
+                 by: str = "ctr_at_k", ids: Optional[Iterable[Optional[int]]] = None) -> List[Dict]:
+    """Flatten replay() output into rows sorted best-first by `by`."""
+    configs = np.asarray(configs).reshape(-1, 3)
+    ids = list(ids) if ids is not None else [None] * len(configs)
+    rows = []
+    for i, (w1, w2, w3) in enumerate(configs):
+        row = {"config_id": ids[i], "w1": float(w1), "w2": float(w2), "w3": float(w3)}
+        row.update({name: float(vals[i]) for name, vals in metrics.items()})
+        rows.append(row)
+    rows.sort(key=lambda r: r[by], reverse=True)
+    return rows
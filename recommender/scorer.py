@@ -1,40 +1,112 @@
-from nlp.liked_title_repo import fetch_liked_titles
+import numpy as np
+
+from db.repository import as_repository
 from nlp.similarity import score_title_similarity
 from recommender.utils import normalize_country_string
 
-def calculate_score(article, user_profile, time_spent_map, conn, user_id, w1, w2, w3):
+# Unweighted score terms, in the order returned by score_components().
+# co_engagement needs the item-item matrix (recommender/co_engagement.py) and
+# latent the trained factors (recommender/factorization.py); each is 0 unless
+# the caller supplies it.
+COMPONENTS = ("explicit", "behavior", "time_spent", "similarity", "co_engagement", "latent")
+
+# Which of (w1, w2, w3) scales each component column.
+COMPONENT_WEIGHT_INDEX = (0, 1, 1, 2, 1, 1)
+
+
+# Title similarity below this adds nothing to the score.
+SIMILARITY_THRESHOLD = 0.3
+
+
+def score_components(article, user_profile, time_spent_map, liked_titles, co_engagement=0.0, latent=0.0):
+    """
+    Return the unweighted terms of the score for one article, ordered as COMPONENTS.
+    calculate_score() is the dot product of these with the expanded (w1, w2, w3).
+    """
     article_id, title, country, category = article
-    score = 0
 
     # Normalize
     country = normalize_country_string(country)
     category = [c.lower() for c in category] if category else []
 
-    # === Weighted components ===
-    preferred_country_match = country in [c.lower() for c in user_profile['preferred_countries']]
-    preferred_category_match = any(cat in [c.lower() for c in user_profile['preferred_categories']] for cat in category)
-
     # w1: Explicit preferences
-    if preferred_country_match:
-        score += w1 * 5
-    if preferred_category_match:
-        score += w1 * 5
+    explicit = 0
+    if country in [c.lower() for c in user_profile['preferred_countries']]:
+        explicit += 5
+    if any(cat in [c.lower() for c in user_profile['preferred_categories']] for cat in category):
+        explicit += 5
 
     # w2: Behavior
-    score += w2 * user_profile['liked_countries'].get(country, 0)
-    score += w2 * sum(user_profile['liked_categories'].get(cat, 0) for cat in category)
+    behavior = user_profile['liked_countries'].get(country, 0)
+    behavior += sum(user_profile['liked_categories'].get(cat, 0) for cat in category)
 
     time_spent = time_spent_map.get(article_id, 0)
     if time_spent > 900:
-        score += w2 * 5
+        time_bonus = 5
     elif time_spent > 600:
-        score += w2 * 2
+        time_bonus = 2
+    else:
+        time_bonus = 0
 
     # w3: NLP Similarity
-    liked_titles = fetch_liked_titles(conn, user_id)
+    similarity = 0
     if liked_titles:
-        similarity = score_title_similarity(title, liked_titles)
-        if similarity > 0.3:
-            score += w3 * (similarity * 10)
+        sim = score_title_similarity(title, liked_titles)
+        if sim > SIMILARITY_THRESHOLD:
+            similarity = sim * 10
+
+    return explicit, behavior, time_bonus, similarity, co_engagement, latent
+
+
+def component_matrix(articles, user_profile, time_spent_map, liked_titles, similarities=None):
+    """
+    Score every (id, title, country, category) article once into an
+    (n_articles, len(COMPONENTS)) float matrix. This is the expensive part
+    (similarity); re-weighting it with apply_weights() is a single matvec.
+
+    If `similarities` (raw cosine per article, e.g. from nlp.embeddings) is given,
+    it replaces the per-article TF-IDF comparison against `liked_titles`.
+    """
+    if similarities is not None:
+        liked_titles = None
+    matrix = np.zeros((len(articles), len(COMPONENTS)), dtype=np.float64)
+    for i, article in enumerate(articles):
+        matrix[i] = score_components(article, user_profile, time_spent_map, liked_titles)
+    if similarities is not None:
+        sims = np.asarray(similarities, dtype=np.float64)
+        matrix[:, COMPONENTS.index("similarity")] = np.where(sims > SIMILARITY_THRESHOLD, sims * 10, 0.0)
+    return matrix
+
+
+def expand_weights(weights):
+    """
+    Map (w1, w2, w3) -- or an (n_configs, 3) array of them -- onto component
+    columns, giving shape (len(COMPONENTS),) or (len(COMPONENTS), n_configs).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim == 1:
+        return weights[list(COMPONENT_WEIGHT_INDEX)]
+    return weights[:, list(COMPONENT_WEIGHT_INDEX)].T
+
+
+def apply_weights(components, weights):
+    """
+    Final scores from a component matrix: (n_articles,) for one (w1, w2, w3),
+    (n_articles, n_configs) for a stack of configs.
+    """
+    return components @ expand_weights(weights)
+
+
+def calculate_score(article, user_profile, time_spent_map, conn, user_id, w1, w2, w3,
+                    factors=None):
+    article_id, title, _, _ = article
+    liked_titles = as_repository(conn).fetch_liked_titles(user_id)
+    latent = float(factors.scores(user_id, [article_id])[0]) if factors is not None else 0.0
+    components = score_components(article, user_profile, time_spent_map, liked_titles, latent=latent)
+
+    weights = (w1, w2, w3)
+    score = 0
+    for value, idx in zip(components, COMPONENT_WEIGHT_INDEX):
+        score += weights[idx] * value
 
-    return {'article_id': article_id, 'title': title, 'score': score}
\ No newline at end of file
+    return {'article_id': article_id, 'title': title, 'score': score}
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+from db.repository import as_repository
+
+# Articles shown or clicked within this many days are not recommended again
+SEEN_WINDOW_DAYS = float(os.getenv("SEEN_WINDOW_DAYS", "14"))
+
+
+class SeenArticles:
+    """
+    Per-user sets of already-seen article ids (shown or clicked), as sorted
+    int32 arrays, for excluding them before top-k.
+
+    A user's set is read from the DB once (impressions and interactions within
+    SEEN_WINDOW_DAYS) and then kept current by the logging path calling add().
+    Entries older than `ttl` are re-read, which picks up impressions logged by
+    other workers. Memory is bounded by `max_users` (least recently used users
+    are evicted) times `max_per_user` ids; over that, the smallest (oldest,
+    since ids are assigned at ingest) ids are dropped.
+    """
+
+    def __init__(self, max_users: int = 100_000, max_per_user: int = 2000, ttl: float = 3600.0,
+                 window_days: float = SEEN_WINDOW_DAYS):
+        self.max_users = max_users
+        self.max_per_user = max_per_user
+        self.ttl = ttl
+        self.window_days = window_days
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _merge(self, current: np.ndarray, article_ids: Iterable[int]) -> np.ndarray:
+        merged = np.union1d(current, np.fromiter(article_ids, dtype=np.int32))
+        return merged[-self.max_per_user:]
+
+    def _store(self, user_id: int, seen: np.ndarray, created: float) -> None:
+        self._entries[user_id] = (created, seen)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def get(self, conn, user_id: int) -> np.ndarray:
+        """Sorted ids the user has seen, loading them from `conn` on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        seen = self._merge(np.empty(0, dtype=np.int32), as_repository(conn).fetch_seen_articles(user_id, since))
+        with self._lock:
+            # Keep anything add() recorded while we were reading
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                seen = self._merge(seen, entry[1])
+            self._store(user_id, seen, time.monotonic())
+        return seen
+
+    def add(self, user_id: int, article_ids: Iterable[int]) -> None:
+        """Record newly shown or clicked articles for a user already held."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return  # loaded with these included on the next get()
+            self._store(user_id, self._merge(entry[1], article_ids), entry[0])
+
+    def mask(self, conn, user_id: int, catalog) -> Optional[np.ndarray]:
+        """Boolean mask over catalog positions of seen articles, or None if none are in the catalog."""
+        seen = self.get(conn, user_id)
+        if not len(seen):
+            return None
+        pos, found = catalog.positions(seen)
+        if not found.any():
+            return None
+        mask = np.zeros(len(catalog), dtype=bool)
+        mask[pos[found]] = True
+        return mask
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
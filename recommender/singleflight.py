@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from telemetry.metrics import registry
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations: while one call for `key` is
+    in flight, further callers for the same key wait for it and get its result
+    (or its exception) instead of running their own.
+
+    The sync do() and async do_async() share one in-flight table, so a
+    threadpool route and an async route asking for the same key coalesce too.
+    Nothing is cached: a caller arriving after the result is ready computes
+    afresh. Callers share the result object and must not mutate it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """The in-flight future for `key` and whether this caller must compute it."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                registry.inc("nexletter_singleflight_saved_total", help="Computations saved by request coalescing",
+                             flight=self.name)
+                return future, False
+            future = self._inflight[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """do() for a coroutine function; waiting callers don't block the event loop."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def __len__(self) -> int:
+        """Computations currently in flight."""
+        return len(self._inflight)
@@ -0,0 +1,279 @@
+"""
+Catalog snapshots shared by every API worker on a node.
+
+A publisher (the fetcher after ingestion, or scripts/publish_catalog_snapshot.py
+as a sidecar) encodes the catalog and embeddings once and writes them as .npy
+files into a fresh version directory under CATALOG_SNAPSHOT_DIR, then swaps the
+CURRENT pointer file with an atomic rename. Workers memory-map the arrays
+read-only, so the page cache holds one copy no matter how many workers attach;
+per worker only the small vocabularies and per-user caches are private.
+
+Workers poll CURRENT and attach the new version on change. A version that is
+pruned while a worker still maps it stays readable until the worker lets go.
+If the new version can't be attached (pruned before the worker got to it, or
+damaged), the worker falls back to the newest version that can be, and to
+loading from the database if none can.
+
+    <root>/CURRENT                 name of the live version
+    <root>/v<ns>/meta.json         counts, label vocabularies, embedding backend
+    <root>/v<ns>/*.npy, *.bin      arrays and packed strings
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from nlp.embeddings import ArticleEmbeddings, get_backend
+from recommender.catalog import ArticleCatalog, freshness_cutoff
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR")
+POINTER = "CURRENT"
+
+
+class PackedStrings(Sequence):
+    """Strings stored as one utf-8 buffer plus offsets; decoded on access."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    @staticmethod
+    def pack(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [(s or "").encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class _SnapshotRows(Sequence):
+    """(id, title, country, category_list) per position, like ArticleCatalog.rows."""
+
+    def __init__(self, ids: np.ndarray, titles: PackedStrings, extra: PackedStrings):
+        self._ids = ids
+        self._titles = titles
+        self._extra = extra
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        country, category = json.loads(self._extra[i])
+        return int(self._ids[i]), self._titles[i], country, category
+
+
+# ---------- publishing ----------
+
+def _save(path: str, name: str, array: np.ndarray) -> None:
+    np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+
+
+def _save_strings(path: str, name: str, strings: Sequence[str]) -> None:
+    data, offsets = PackedStrings.pack(strings)
+    data.tofile(os.path.join(path, name + ".bin"))
+    _save(path, name + "_offsets", offsets)
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, POINTER), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root: str) -> List[str]:
+    return sorted(d for d in os.listdir(root) if d.startswith("v") and os.path.isdir(os.path.join(root, d)))
+
+
+def publish_snapshot(root: str, catalog: ArticleCatalog,
+                     embeddings: Optional[ArticleEmbeddings] = None, keep: int = 3) -> str:
+    """
+    Write `catalog` (and `embeddings`) as a new version and make it current.
+    The previous `keep` - 1 versions are kept for workers still switching over.
+    Returns the version name.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    tmp = os.path.join(root, f".tmp-{version}")
+    os.makedirs(tmp)
+
+    categories = catalog.categories.tocsr()
+    _save(tmp, "ids", catalog.ids)
+    _save(tmp, "sorted_idx", catalog._sorted_idx)
+    _save(tmp, "sorted_ids", catalog._sorted_ids)
+    _save(tmp, "country_idx", catalog.country_idx)
+    _save(tmp, "cat_indptr", categories.indptr)
+    _save(tmp, "cat_indices", categories.indices)
+    _save(tmp, "cat_data", categories.data)
+    if catalog.pub_dates is not None:
+        _save(tmp, "pub_dates", catalog.pub_dates)
+    _save_strings(tmp, "titles", [catalog.rows[i][1] for i in range(len(catalog))])
+    _save_strings(tmp, "extra", [json.dumps([catalog.rows[i][2], catalog.rows[i][3]])
+                                 for i in range(len(catalog))])
+
+    if catalog.title_terms is not None:
+        terms = catalog.title_terms.tocsr()
+        _save(tmp, "terms_indptr", terms.indptr)
+        _save(tmp, "terms_indices", terms.indices)
+        _save(tmp, "terms_data", terms.data)
+        vocab = sorted(catalog.term_vocab.items(), key=lambda kv: kv[1])
+        _save_strings(tmp, "term_vocab", [t for t, _ in vocab])
+        _save(tmp, "term_vocab_ids", np.asarray([i for _, i in vocab], dtype=np.int64))
+
+    meta = {
+        "version": version,
+        "created_at": time.time(),
+        "n_articles": len(catalog),
+        "n_category_columns": categories.shape[1],
+        "country_vocab": catalog.country_vocab,
+        "category_vocab": catalog.category_vocab,
+        "n_term_columns": catalog.title_terms.shape[1] if catalog.title_terms is not None else None,
+        "embeddings": None,
+    }
+    if embeddings is not None:
+        _save(tmp, "emb_ids", embeddings.ids)
+        _save(tmp, "emb_vectors", embeddings.vectors)
+        if embeddings.scale is not None:
+            _save(tmp, "emb_scale", embeddings.scale)
+        meta["embeddings"] = {"backend": embeddings.backend.name, "dim": embeddings.backend.dim,
+                              "quantized": embeddings.scale is not None}
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.rename(tmp, os.path.join(root, version))
+    pointer_tmp = os.path.join(root, f".{POINTER}.{version}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, POINTER))
+
+    for old in list_versions(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+def publish_from_db(conn, root: str = CATALOG_SNAPSHOT_DIR, keep: int = 3) -> str:
+    """Load the catalog and stored embeddings from the DB and publish them."""
+    if not root:
+        raise ValueError("No snapshot directory; set CATALOG_SNAPSHOT_DIR")
+    catalog = ArticleCatalog.load(conn)
+    embeddings = ArticleEmbeddings.load(conn, since=freshness_cutoff())
+    return publish_snapshot(root, catalog, embeddings if len(embeddings) else None, keep=keep)
+
+
+# ---------- attaching ----------
+
+class CatalogSnapshot:
+    """One published version, memory-mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+
+        load = lambda name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        strings = lambda name: PackedStrings(
+            np.memmap(os.path.join(path, name + ".bin"), dtype=np.uint8, mode="r")
+            if os.path.getsize(os.path.join(path, name + ".bin")) else np.zeros(0, dtype=np.uint8),
+            load(name + "_offsets"))
+
+        ids = load("ids")
+        titles = strings("titles")
+        n = self.meta["n_articles"]
+        categories = sp.csr_matrix((load("cat_data"), load("cat_indices"), load("cat_indptr")),
+                                   shape=(n, self.meta["n_category_columns"]), copy=False)
+        self.catalog = ArticleCatalog.from_arrays(
+            _SnapshotRows(ids, titles, strings("extra")), titles, ids,
+            self.meta["country_vocab"], load("country_idx"),
+            self.meta["category_vocab"], categories,
+            sorted_idx=load("sorted_idx"), sorted_ids=load("sorted_ids"),
+            pub_dates=load("pub_dates") if os.path.exists(os.path.join(path, "pub_dates.npy")) else None)
+
+        if self.meta.get("n_term_columns"):
+            self.catalog.title_terms = sp.csr_matrix(
+                (load("terms_data"), load("terms_indices"), load("terms_indptr")),
+                shape=(n, self.meta["n_term_columns"]), copy=False)
+            self.catalog.term_vocab = dict(zip(strings("term_vocab"), load("term_vocab_ids").tolist()))
+
+        self.embeddings = None
+        emb = self.meta["embeddings"]
+        if emb is not None:
+            # The hashing dim is a free parameter; the others' dims come from their model
+            backend = get_backend(emb["backend"], **({"dim": emb["dim"]} if emb["backend"] == "hashing" else {}))
+            if backend.dim != emb["dim"]:
+                raise ValueError(f"Snapshot embeddings are {emb['backend']}/{emb['dim']}, "
+                                 f"but this worker's backend has dim {backend.dim}")
+            self.embeddings = ArticleEmbeddings.from_arrays(
+                backend, load("emb_ids"), load("emb_vectors"),
+                load("emb_scale") if emb["quantized"] else None)
+
+
+class SnapshotReader:
+    """
+    Serves the current snapshot under `root`, re-reading the pointer at most
+    every `poll_interval` seconds and attaching a new version when it changes.
+    """
+
+    def __init__(self, root: str, poll_interval: float = 5.0):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.switches = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._failed: Optional[str] = None  # pointer target that didn't attach; not retried
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[CatalogSnapshot]:
+        """
+        The live snapshot, or None if nothing has been published yet or no
+        published version can be attached (callers then load from the DB).
+        """
+        if time.monotonic() - self._checked_at < self.poll_interval:
+            return self._snapshot
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.poll_interval:
+                version = current_version(self.root)
+                if version is not None and version != self._failed and (
+                        self._snapshot is None or self._snapshot.version != version):
+                    snapshot = self._attach(version)
+                    if snapshot is not self._snapshot:
+                        self._snapshot = snapshot
+                        self.switches += 1
+                self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _attach(self, version: str) -> Optional[CatalogSnapshot]:
+        """`version`, else the newest version that attaches (keeping the current one if that's it)."""
+        for candidate in [version] + [v for v in reversed(list_versions(self.root)) if v != version]:
+            if self._snapshot is not None and candidate == self._snapshot.version:
+                return self._snapshot
+            try:
+                snapshot = CatalogSnapshot(os.path.join(self.root, candidate))
+            except (OSError, ValueError, KeyError):
+                logger.warning("Catalog snapshot %s could not be attached", candidate, exc_info=True)
+                if candidate == version:
+                    self._failed = version
+                continue
+            if candidate != version:
+                logger.warning("Serving catalog snapshot %s instead of %s", candidate, version)
+            return snapshot
+        logger.error("No catalog snapshot under %s can be attached; loading from the database", self.root)
+        return None
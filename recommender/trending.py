@@ -0,0 +1,159 @@
+"""
+Precomputed popularity ("trending") lists for cold-start users.
+
+Impressions and engagements (clicked impressions plus interactions rows) are
+counted per article and hour over the last TRENDING_WINDOW_HOURS, and each
+hour is decayed by its age with half-life TRENDING_HALF_LIFE_HOURS:
+
+    trend = sum over hours of 0.5 ** (age / half_life)
+            * (engagements + TRENDING_IMPRESSION_WEIGHT * impressions)
+
+The top TRENDING_SIZE catalog articles by trend are kept globally and per
+country and per category. A user with no preferences, likes, liked titles or
+time spent has nothing for the scorer to work with, so recommend_articles()
+serves them the global list by lookup instead of scoring the whole catalog.
+
+TrendingRefresher keeps the lists current from a background thread, so no
+request waits for a rebuild.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from db.repository import as_repository
+from recommender.catalog import ArticleCatalog
+
+logger = logging.getLogger(__name__)
+
+TRENDING_WINDOW_HOURS = float(os.getenv("TRENDING_WINDOW_HOURS", "72"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "12"))
+TRENDING_IMPRESSION_WEIGHT = float(os.getenv("TRENDING_IMPRESSION_WEIGHT", "0.01"))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", "100"))
+# Fewest unseen trending articles worth serving a cold-start user (one page)
+TRENDING_MIN_RESULTS = int(os.getenv("TRENDING_MIN_RESULTS", "10"))
+# Seconds between background rebuilds
+TRENDING_REFRESH = float(os.getenv("TRENDING_REFRESH", "60"))
+
+
+def is_cold_start(profile: Dict[str, Any], time_spent_map: Dict[int, int], liked_titles: Sequence[str]) -> bool:
+    """True if nothing about the user would make one article score above another."""
+    return not (profile['preferred_countries'] or profile['preferred_categories']
+                or profile['liked_countries'] or profile['liked_categories']
+                or time_spent_map or liked_titles)
+
+
+class TrendingLists:
+    def __init__(self, catalog: ArticleCatalog, trend: np.ndarray, size: int = TRENDING_SIZE,
+                 built_at: Optional[datetime] = None):
+        """
+        `trend` is the decayed activity per catalog position. Only articles
+        with some activity are listed.
+        """
+        self.catalog = catalog
+        self.trend = trend
+        self.built_at = built_at or datetime.utcnow()
+
+        active = np.flatnonzero(trend > 0)
+        ranked = active[np.argsort(-trend[active], kind="stable")]
+        self.global_list = ranked[:size]
+
+        # Stable sort by country keeps each country's run in trend order
+        by_country = ranked[np.argsort(catalog.country_idx[ranked], kind="stable")]
+        codes = catalog.country_idx[by_country]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else []
+        stops = list(starts[1:]) + [len(codes)]
+        country_names = {idx: name for name, idx in catalog.country_vocab.items()}
+        self.by_country: Dict[str, np.ndarray] = {
+            country_names[codes[start]]: by_country[start:min(stop, start + size)]
+            for start, stop in zip(starts, stops) if codes[start] in country_names}
+
+        # Rows = categories, columns = rank (sorted), so each row lists its articles best first
+        ranks = catalog.categories[ranked].T.tocsr()
+        ranks.sort_indices()
+        category_names = {idx: name for name, idx in catalog.category_vocab.items()}
+        self.by_category: Dict[str, np.ndarray] = {
+            category_names[idx]: ranked[ranks.indices[ranks.indptr[idx]:min(ranks.indptr[idx + 1],
+                                                                             ranks.indptr[idx] + size)]]
+            for idx in range(ranks.shape[0]) if idx in category_names and ranks.indptr[idx + 1] > ranks.indptr[idx]}
+
+    @classmethod
+    def build(cls, conn, catalog: ArticleCatalog, now: Optional[datetime] = None,
+              window_hours: float = TRENDING_WINDOW_HOURS, half_life_hours: float = TRENDING_HALF_LIFE_HOURS,
+              impression_weight: float = TRENDING_IMPRESSION_WEIGHT, size: int = TRENDING_SIZE) -> "TrendingLists":
+        now = now or datetime.utcnow()
+        rows = as_repository(conn).fetch_article_activity(now - timedelta(hours=window_hours))
+        trend = np.zeros(len(catalog), dtype=np.float64)
+        if rows:
+            article_ids, hours, impressions, engagements = zip(*rows)
+            age = np.asarray([(now - hour).total_seconds() / 3600.0 for hour in hours])
+            weight = np.power(0.5, np.maximum(age, 0.0) / half_life_hours)
+            activity = weight * (np.asarray(engagements, dtype=np.float64)
+                                 + impression_weight * np.asarray(impressions, dtype=np.float64))
+            # Activity on collapsed duplicates counts toward their representative
+            pos, found = catalog.positions(article_ids)
+            np.add.at(trend, pos[found], activity[found])
+        return cls(catalog, trend, size, now)
+
+    def positions(self, country: Optional[str] = None, category: Optional[str] = None) -> np.ndarray:
+        """The global list, or the one for a (normalized) country or category name."""
+        if country is not None:
+            return self.by_country.get(country.lower(), np.empty(0, dtype=np.int64))
+        if category is not None:
+            return self.by_category.get(category.lower(), np.empty(0, dtype=np.int64))
+        return self.global_list
+
+    def top(self, limit: int, country: Optional[str] = None, category: Optional[str] = None,
+            exclude_ids: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` trending articles as recommend_articles() dicts, with
+        the trend as score and no scoring config, skipping the sorted ids in
+        `exclude_ids`.
+        """
+        positions = self.positions(country, category)
+        if exclude_ids is not None and len(exclude_ids):
+            positions = positions[~np.isin(self.catalog.ids[positions], exclude_ids, assume_unique=True)]
+        return self.catalog.to_dicts(positions[:limit], self.trend, None)
+
+
+class TrendingRefresher:
+    """
+    The current TrendingLists, rebuilt by `build` in a background thread once
+    they are older than `interval` seconds. get() never blocks: it returns
+    None until the first build finishes (refresh() builds synchronously, e.g.
+    at warm-up), and the previous lists while a rebuild runs or after one fails.
+    """
+
+    def __init__(self, build: Callable[[], TrendingLists], interval: float = TRENDING_REFRESH):
+        self.build = build
+        self.interval = interval
+        self._lists: Optional[TrendingLists] = None
+        self._built_at = float("-inf")
+        self._running = False
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Optional[TrendingLists]:
+        try:
+            lists = self.build()
+        except Exception:
+            logger.exception("Rebuilding trending lists failed; keeping the previous ones")
+            lists = None
+        with self._lock:
+            if lists is not None:
+                self._lists = lists
+            self._built_at = time.monotonic()
+            self._running = False
+            return self._lists
+
+    def get(self) -> Optional[TrendingLists]:
+        if time.monotonic() - self._built_at > self.interval and not self._running:
+            with self._lock:
+                start = time.monotonic() - self._built_at > self.interval and not self._running
+                self._running = self._running or start
+            if start:
+                threading.Thread(target=self.refresh, name="trending-refresh", daemon=True).start()
+        return self._lists
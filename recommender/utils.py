@@ -1,4 +1,23 @@
 def normalize_country_string(country):
     if country and country.startswith('{') and country.endswith('}'):
         return country.strip('{}').replace('"', '').split(',')[0].strip().lower()
-    return country.lower() if country else ""
\ No newline at end of file
+    return country.lower() if country else ""
+
+
+def normalize_country(country):
+    """
+    Country key as the catalog matches it, from either the NewsData list
+    (["united states of america"]) or the stored TEXT ('{"united states of america"}').
+    """
+    if isinstance(country, (list, tuple)):
+        country = country[0] if country else None
+    return normalize_country_string(country)
+
+
+def normalize_categories(category):
+    """Category keys as the catalog matches them, from TEXT[], a list or a single TEXT."""
+    if not category:
+        return []
+    if isinstance(category, str):
+        category = [category]
+    return [str(c).lower() for c in category]
@@ -0,0 +1,54 @@
+# scripts/backfill_article_labels.py
+# Fill articles.country_id / category_ids for rows inserted before ingest-time
+# label encoding. Resumable: only rows still missing an id are processed.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from psycopg2.extras import execute_values
+
+from db.connection import get_connection
+from db.label_repo import encode_article_labels
+
+# ===== CONFIG =====
+BATCH_SIZE = 5000   # rows per encode + update round-trip
+
+
+def fetch_unencoded(conn, after_id, limit):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, country, category
+            FROM articles
+            WHERE (country_id IS NULL OR category_ids IS NULL) AND id > %s
+            ORDER BY id
+            LIMIT %s;
+        """, (after_id, limit))
+        return cur.fetchall()
+
+
+def main():
+    conn = get_connection()
+    last_id, total = 0, 0
+    while True:
+        rows = fetch_unencoded(conn, last_id, BATCH_SIZE)
+        if not rows:
+            break
+        country_ids, category_ids = encode_article_labels(conn, [r[1] for r in rows], [r[2] for r in rows])
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                UPDATE articles AS a
+                SET country_id = v.country_id, category_ids = v.category_ids
+                FROM (VALUES %s) AS v (id, country_id, category_ids)
+                WHERE a.id = v.id
+            """, [(r[0], cid, cats) for r, cid, cats in zip(rows, country_ids, category_ids)],
+                template="(%s, %s, %s::integer[])")
+        conn.commit()
+        last_id = rows[-1][0]
+        total += len(rows)
+        print(f"🏷️  Encoded {total} articles (through id {last_id})")
+    conn.close()
+    print(f"✅ Done: {total} articles backfilled")
+
+
+if __name__ == "__main__":
+    main()
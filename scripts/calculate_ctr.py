@@ -11,9 +11,9 @@ def calculate_ctr():
 
     cur.execute("""
         SELECT scoring_config_id,
-               COUNT(*) FILTER (WHERE clicked = TRUE)::FLOAT / COUNT(*) AS ctr,
-               COUNT(*) AS total
-        FROM recommendation_logs
+               SUM(clicks)::FLOAT / SUM(impressions) AS ctr,
+               SUM(impressions) AS total
+        FROM recommendation_log_daily
         GROUP BY scoring_config_id
         ORDER BY ctr DESC
     """)
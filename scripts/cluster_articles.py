@@ -0,0 +1,55 @@
+# scripts/cluster_articles.py
+# Backfill articles.cluster_id (near-duplicate clusters, see nlp/dedup.py) for
+# articles ingested before deduplication existed.
+# Resumable: existing clusters are indexed first, then only articles with
+# cluster_id IS NULL are assigned, in id order.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from nlp.dedup import NearDuplicateIndex, store_clusters
+
+# ===== CONFIG =====
+BATCH_SIZE = 20000   # rows per fetch + update round-trip
+THRESHOLD = 0.5      # estimated Jaccard of title shingles to join a cluster
+
+
+def fetch_unclustered(conn, after_id, limit):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, title FROM articles
+            WHERE cluster_id IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s;
+        """, (after_id, limit))
+        return cur.fetchall()
+
+
+def main():
+    conn = get_connection()
+    index = NearDuplicateIndex(threshold=THRESHOLD)
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, title FROM articles WHERE cluster_id = id ORDER BY id;")
+        for article_id, title in cur.fetchall():
+            index.add(article_id, title)
+    print(f"📚 Indexed {len(index)} existing clusters")
+
+    last_id, total, duplicates = 0, 0, 0
+    while True:
+        rows = fetch_unclustered(conn, last_id, BATCH_SIZE)
+        if not rows:
+            break
+        ids = [r[0] for r in rows]
+        clusters = index.add_many(ids, [r[1] for r in rows])
+        store_clusters(conn, ids, clusters)
+        total += len(rows)
+        duplicates += sum(1 for a, c in zip(ids, clusters) if a != c)
+        last_id = ids[-1]
+        print(f"🔗 Clustered {total} articles (through id {last_id}), {duplicates} near-duplicates")
+    conn.close()
+    print(f"✅ Done: {total} articles, {duplicates} folded into {len(index)} clusters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# scripts/embed_articles.py
+# Backfill article_embeddings for the configured EMBEDDING_BACKEND.
+# Resumable: only articles without an embedding from this backend are processed.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from nlp.embeddings import TfidfBackend, embed_articles, get_backend
+
+# ===== CONFIG =====
+BATCH_SIZE = 2000   # rows per encode + upsert round-trip
+REBUILD = False     # refit the TF-IDF backend on all titles and re-embed everything
+
+
+def fetch_all_titles(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT title FROM articles;")
+        return [row[0] for row in cur.fetchall()]
+
+
+def fetch_missing(conn, backend, after_id, limit):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.id, a.title
+            FROM articles a
+            LEFT JOIN article_embeddings e
+              ON e.article_id = a.id AND e.backend = %s AND e.dim = %s
+            WHERE e.article_id IS NULL AND a.id > %s
+            ORDER BY a.id
+            LIMIT %s;
+        """, (backend.name, backend.dim, after_id, limit))
+        return cur.fetchall()
+
+
+def main():
+    conn = get_connection()
+    backend = get_backend()
+
+    if isinstance(backend, TfidfBackend) and (REBUILD or backend._pipeline is None):
+        print("🧮 Fitting TF-IDF + SVD on all titles...")
+        backend.fit(fetch_all_titles(conn))
+
+    print(f"🧠 Backend: {backend.name} (dim={backend.dim})")
+    total, last_id = 0, 0
+    while True:
+        rows = fetch_missing(conn, backend, last_id, BATCH_SIZE)
+        if not rows:
+            break
+        total += embed_articles(conn, backend, [r[0] for r in rows], [r[1] for r in rows])
+        last_id = rows[-1][0]
+        print(f"  • embedded {total} articles (up to id {last_id})")
+
+    conn.close()
+    print(f"✅ Done. {total} articles embedded.")
+
+
+if __name__ == "__main__":
+    main()
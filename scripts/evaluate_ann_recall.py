@@ -0,0 +1,49 @@
+# scripts/evaluate_ann_recall.py
+# Recall@k of the LSH title index vs exact cosine similarity, per user. NO DB WRITES.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from nlp.ann_index import build_title_index
+from nlp.liked_title_repo import fetch_liked_titles
+
+# ===== CONFIG =====
+K = 10
+N_TABLES = 16
+N_BITS = 8
+
+
+def fetch_users_with_likes(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT user_id FROM liked_titles ORDER BY user_id;")
+        return [row[0] for row in cur.fetchall()]
+
+
+def main():
+    conn = get_connection()
+    index = build_title_index(conn, n_tables=N_TABLES, n_bits=N_BITS)
+    users = fetch_users_with_likes(conn)
+    liked = {uid: fetch_liked_titles(conn, uid) for uid in users}
+    conn.close()
+
+    print(f"🔎 Indexed {len(index)} articles ({N_TABLES} tables x {N_BITS} bits), k={K}\n")
+    if not users:
+        print("⚠️ No users with liked titles.")
+        return
+
+    totals = {"recall": 0.0, "candidates_frac": 0.0, "ann_ms": 0.0, "exact_ms": 0.0}
+    for uid in users:
+        r = index.recall(liked[uid], K)
+        for key in totals:
+            totals[key] += r[key]
+        print(f"• User {uid}: recall@{K}={r['recall']:.2f} | scanned={100 * r['candidates_frac']:.1f}% "
+              f"| ann={r['ann_ms']:.2f}ms exact={r['exact_ms']:.2f}ms")
+
+    n = len(users)
+    print(f"\n📊 Mean recall@{K}: {totals['recall'] / n:.3f} | scanned {100 * totals['candidates_frac'] / n:.1f}% "
+          f"| ann {totals['ann_ms'] / n:.2f}ms vs exact {totals['exact_ms'] / n:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
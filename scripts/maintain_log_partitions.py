@@ -0,0 +1,33 @@
+# scripts/maintain_log_partitions.py
+# Partition upkeep for recommendation_logs; run daily (cron or a k8s CronJob).
+# Creates upcoming partitions, then rolls partitions past the retention window
+# up into recommendation_log_rollups and removes them.
+# Per-user raw logs (evaluate_comparisons.py, offline replay) only cover the
+# retention window; CTR per config stays complete via recommendation_log_daily.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from db.log_partitions import (LOG_PARTITION_INTERVAL, LOG_PARTITIONS_AHEAD, LOG_RETENTION_DAYS,
+                               ensure_partitions, expire_partitions)
+
+# ===== CONFIG =====
+INTERVAL = LOG_PARTITION_INTERVAL    # "month" or "day"; only affects newly created partitions
+AHEAD = LOG_PARTITIONS_AHEAD         # future periods to keep created
+RETENTION_DAYS = LOG_RETENTION_DAYS  # raw rows older than this are rolled up
+DROP = True                          # False: detach only, leaving the table to archive
+
+
+def main():
+    conn = get_connection()
+    for name in ensure_partitions(conn, ahead=AHEAD, interval=INTERVAL):
+        print(f"🗂️ Created {name}")
+    for name in expire_partitions(conn, retention_days=RETENTION_DAYS, drop=DROP):
+        print(f"📦 Rolled up and {'dropped' if DROP else 'detached'} {name}")
+    conn.close()
+    print("✅ Log partitions maintained")
+
+
+if __name__ == "__main__":
+    main()
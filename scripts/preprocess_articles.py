@@ -0,0 +1,46 @@
+# scripts/preprocess_articles.py
+# Backfill article_terms (tokenized, stop-word-filtered title/description term
+# counts) for articles ingested before preprocessing existed.
+# Resumable: only articles without an article_terms row are processed.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from nlp.term_features import PREPROCESS_PROCESSES, store_term_features
+
+# ===== CONFIG =====
+BATCH_SIZE = 20000   # rows per analyze + upsert round-trip; spread over the process pool
+PROCESSES = PREPROCESS_PROCESSES
+
+
+def fetch_unprocessed(conn, after_id, limit):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.id, a.title, a.description
+            FROM articles a
+            LEFT JOIN article_terms t ON t.article_id = a.id
+            WHERE t.article_id IS NULL AND a.id > %s
+            ORDER BY a.id
+            LIMIT %s;
+        """, (after_id, limit))
+        return cur.fetchall()
+
+
+def main():
+    conn = get_connection()
+    last_id, total = 0, 0
+    while True:
+        rows = fetch_unprocessed(conn, last_id, BATCH_SIZE)
+        if not rows:
+            break
+        total += store_term_features(conn, [r[0] for r in rows], [r[1] for r in rows],
+                                     [r[2] for r in rows], processes=PROCESSES)
+        last_id = rows[-1][0]
+        print(f"🧹 Preprocessed {total} articles (through id {last_id})")
+    conn.close()
+    print(f"✅ Done: {total} articles preprocessed with {PROCESSES} processes")
+
+
+if __name__ == "__main__":
+    main()
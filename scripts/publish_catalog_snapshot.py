@@ -0,0 +1,28 @@
+# scripts/publish_catalog_snapshot.py
+# Build the catalog + embeddings once and publish them as a shared snapshot for
+# API workers (see recommender/snapshot.py). Run after ingestion, or on a timer
+# as a sidecar; workers pick the new version up within a few seconds.
+
+import sys, os, time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from recommender.snapshot import CATALOG_SNAPSHOT_DIR, publish_from_db
+
+# ===== CONFIG =====
+SNAPSHOT_DIR = CATALOG_SNAPSHOT_DIR or "catalog_snapshots"
+KEEP_VERSIONS = 3
+
+
+def main():
+    t0 = time.perf_counter()
+    conn = get_connection()
+    try:
+        version = publish_from_db(conn, SNAPSHOT_DIR, keep=KEEP_VERSIONS)
+    finally:
+        conn.close()
+    print(f"📦 Published {version} to {SNAPSHOT_DIR} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
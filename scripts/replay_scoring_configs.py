@@ -0,0 +1,63 @@
+# scripts/replay_scoring_configs.py
+# Offline comparison of scoring configs by replaying logged slates. NO DB WRITES.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from db.connection import get_connection
+from recommender.replay import (
+    build_slate_components,
+    fetch_logged_slates,
+    rank_configs,
+    replay,
+    weight_grid,
+)
+
+# ===== CONFIG =====
+K = 5                                  # cut-off for CTR@k / P@k / R@k
+GRID_VALUES = (0.0, 0.5, 1.0, 2.0, 3.0)  # 124 extra candidate configs
+TOP_N = 15                             # rows to print
+
+
+def fetch_seeded_configs(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, w1, w2, w3 FROM scoring_configurations ORDER BY id;")
+        return cur.fetchall()
+
+
+def main():
+    conn = get_connection()
+
+    slates = fetch_logged_slates(conn)
+    if not slates:
+        print("⚠️ No recommendation logs to replay.")
+        conn.close()
+        return
+
+    components = build_slate_components(conn, slates)
+    seeded = fetch_seeded_configs(conn)
+    conn.close()
+
+    seeded_ids = [row[0] for row in seeded]
+    seeded_w = np.asarray([row[1:] for row in seeded], dtype=np.float64).reshape(-1, 3)
+    grid = weight_grid(GRID_VALUES)
+
+    configs = np.vstack([seeded_w, grid])
+    ids = seeded_ids + [None] * len(grid)
+
+    metrics = replay(components, configs, k=K)
+    ranked = rank_configs(configs, metrics, ids=ids)
+
+    print(f"🔁 Replayed {len(components)} slates under {len(configs)} configs (k={K})\n")
+    print(f"{'Config':<8}{'w1':>6}{'w2':>6}{'w3':>6}{'CTR@k':>10}{'P@k':>8}{'R@k':>8}")
+    print("-" * 52)
+    for r in ranked[:TOP_N]:
+        label = str(r["config_id"]) if r["config_id"] is not None else "grid"
+        print(f"{label:<8}{r['w1']:>6.1f}{r['w2']:>6.1f}{r['w3']:>6.1f}"
+              f"{r['ctr_at_k']:>10.3f}{r['precision_at_k']:>8.3f}{r['recall_at_k']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
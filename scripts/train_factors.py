@@ -0,0 +1,57 @@
+# scripts/train_factors.py
+# Train user/article latent factors (implicit ALS, recommender/factorization.py)
+# on interactions + clicked impressions and publish them to FACTOR_MODEL_PATH,
+# which API workers pick up as the "latent" scoring component.
+# Warm-starts from the published model; checkpoints every iteration, and a
+# run that dies resumes from its checkpoint.
+
+import sys, os, time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from recommender.factorization import (FACTOR_MODEL_PATH, TRAIN_PROCESSES, FactorModel,
+                                       fetch_engagements, train_als)
+
+# ===== CONFIG =====
+PATH = FACTOR_MODEL_PATH or "factors.npz"
+CHECKPOINT = PATH + ".ckpt.npz"
+FACTORS = 32
+REG = 0.1
+ALPHA = 20.0         # confidence per engagement: c = 1 + ALPHA * count
+ITERATIONS = 10
+CG_STEPS = 3         # 0 = exact solves (slower, O(k^2) per engagement)
+PROCESSES = TRAIN_PROCESSES
+
+
+def main():
+    conn = get_connection()
+    t0 = time.time()
+    user_ids, item_ids, R = fetch_engagements(conn)
+    conn.close()
+    print(f"📥 {R.nnz} user/article pairs over {len(user_ids)} users and {len(item_ids)} articles "
+          f"({time.time() - t0:.1f}s)")
+
+    previous, start = None, 0
+    if os.path.exists(CHECKPOINT):
+        previous = FactorModel.load(CHECKPOINT)
+        start = previous.iteration
+        print(f"⏯️ Resuming from checkpoint at iteration {start}")
+    elif os.path.exists(PATH):
+        previous = FactorModel.load(PATH)
+        print(f"🔥 Warm-starting from {PATH}")
+
+    def checkpoint(model):
+        model.save(CHECKPOINT)
+        print(f"💾 Iteration {model.iteration}/{ITERATIONS} ({time.time() - t0:.1f}s)")
+
+    model = train_als(user_ids, item_ids, R, factors=FACTORS, reg=REG, alpha=ALPHA, iterations=ITERATIONS,
+                      previous=previous, start_iteration=start, cg_steps=CG_STEPS, processes=PROCESSES,
+                      checkpoint=checkpoint)
+    model.save(PATH)
+    if os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+    print(f"✅ Saved {PATH}: {FACTORS} factors, {ITERATIONS} iterations with {PROCESSES} processes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# scripts/update_co_engagement.py
+# Fold new interactions and clicked impressions into the item-item
+# co-engagement matrix (recommender/co_engagement.py); run every few minutes.
+# Incremental: the saved state remembers the last interaction id and click
+# scan, so each run only reads what is new. Delete the file to rebuild.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.connection import get_connection
+from recommender.co_engagement import CO_ENGAGEMENT_PATH, CoEngagement
+
+# ===== CONFIG =====
+PATH = CO_ENGAGEMENT_PATH or "co_engagement.npz"
+BATCH_SIZE = 10000   # interactions per micro-batch
+MAX_HISTORY = 50     # recent engagements per user that a new one is paired with
+
+
+def main():
+    co = CoEngagement.load(PATH) if os.path.exists(PATH) else CoEngagement(max_history=MAX_HISTORY)
+    conn = get_connection()
+    added = co.update_from_db(conn, batch_size=BATCH_SIZE)
+    conn.close()
+    co.save(PATH)
+    print(f"🔗 Added {added} engagements; {len(co)} co-engaged pairs over {len(co.history)} users")
+    print(f"✅ Saved {PATH} (through interaction {co.last_interaction_id})")
+
+
+if __name__ == "__main__":
+    main()
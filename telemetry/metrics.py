@@ -0,0 +1,226 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+    with timed("fetch_articles"):
+        ...
+
+records into the `nexletter_stage_seconds` histogram and, inside an HTTP
+request, into that request's Server-Timing list. With METRICS_ENABLED unset
+timed() returns a shared no-op context manager, so instrumented code pays one
+function call and one attribute check.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") == "1"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Per-request state: [(stage, seconds), ...] and a DB query count.
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[["Registry"], None]] = []
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+                self._help.setdefault(name, help)
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+            self._help.setdefault(name, help)
+
+    def set(self, name: str, value: float, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+            self._help.setdefault(name, help)
+
+    def add_collector(self, fn: Callable[["Registry"], None]) -> None:
+        """Register fn(registry), called at scrape time to set gauges from live objects."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            fn(self)
+
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            for kind, family in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(family.items()):
+                    lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in sorted(series.items()):
+                        lines.append(f"{name}{fmt(labels)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{fmt(labels, (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt(labels, (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{fmt(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ---------- timing ----------
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _StageTimer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        registry.observe("nexletter_stage_seconds", elapsed,
+                         help="Time spent per recommendation pipeline stage", stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def timed(stage: str):
+    """Context manager timing one pipeline stage; a no-op unless metrics are on."""
+    if not (METRICS_ENABLED or _request_timings.get() is not None):
+        return _NOOP
+    return _StageTimer(stage)
+
+
+def timed_fn(stage: str):
+    """Decorator form of timed()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_query() -> None:
+    """Called by the DB cursor for every statement executed."""
+    registry.inc("nexletter_db_queries_total", help="SQL statements executed")
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+
+def register_cache(name: str, cache) -> None:
+    """
+    Expose an object's `hits`/`misses` attributes as cache gauges at scrape time.
+    `cache` may also be a zero-argument callable returning the current object,
+    for caches that get replaced.
+    """
+    def collect(reg: Registry) -> None:
+        obj = cache() if callable(cache) else cache
+        hits, misses = getattr(obj, "hits", 0), getattr(obj, "misses", 0)
+        reg.set("nexletter_cache_hits", hits, help="Cache hits", cache=name)
+        reg.set("nexletter_cache_misses", misses, help="Cache misses", cache=name)
+        total = hits + misses
+        reg.set("nexletter_cache_hit_ratio", hits / total if total else 0.0,
+                help="Cache hit ratio since start", cache=name)
+    registry.add_collector(collect)
+
+
+# ---------- per-request scope ----------
+
+class request_scope:
+    """
+    Collect stage timings and the DB query count for one request:
+
+        with request_scope("get_recommendations") as scope:
+            ...
+        response.headers["Server-Timing"] = scope.server_timing()
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.timings: List[Tuple[str, float]] = []
+        self.queries = [0]
+
+    def __enter__(self):
+        self._tokens = (_request_timings.set(self.timings), _request_queries.set(self.queries))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _request_timings.reset(self._tokens[0])
+        _request_queries.reset(self._tokens[1])
+        registry.observe("nexletter_request_seconds", elapsed,
+                         help="HTTP request latency", route=self.route)
+        registry.observe("nexletter_db_queries_per_request", self.queries[0], buckets=COUNT_BUCKETS,
+                         help="SQL statements per HTTP request", route=self.route)
+        self.timings.append(("total", elapsed))
+        return False
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.timings)
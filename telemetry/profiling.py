@@ -0,0 +1,171 @@
+"""
+On-demand cProfile captures of single requests.
+
+A request is profiled when it carries PROFILE_TOKEN (X-Profile header or
+?profile= query flag), or is sampled at PROFILE_SAMPLE_RATE. The middleware
+marks it with profile_request(); the handler wraps its work in
+
+    with profiled("get_recommendations", user_id=user_id):
+        ...
+
+which, for a marked request only, runs cProfile on the handler thread and
+writes a pstats file to PROFILE_DIR (open with `python -m pstats`, snakeviz or
+gprof2dot). Captures are also summed into one aggregate, served as text by
+GET /debug/profile. Unmarked requests pay one ContextVar lookup.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from telemetry.metrics import registry
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Newest capture files kept in PROFILE_DIR
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+PROFILE_HEADER = "X-Profile"
+
+_profile_request: ContextVar[Optional["ProfileRequest"]] = ContextVar("profile_request", default=None)
+
+
+class ProfileRequest:
+    """A request marked for profiling; `path` is set once its capture is written."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.claimed = False  # only the outermost profiled() block captures
+        self.path: Optional[str] = None
+
+
+def should_profile(token: Optional[str], sample_rate: float = PROFILE_SAMPLE_RATE) -> Optional[str]:
+    """Why to profile a request presenting `token` ("requested", "sampled"), or None."""
+    if PROFILE_TOKEN and hmac.compare_digest((token or "").encode(), PROFILE_TOKEN.encode()):
+        return "requested"
+    if sample_rate > 0 and random.random() < sample_rate:
+        return "sampled"
+    return None
+
+
+class profile_request:
+    """Mark the requests handled inside this block for profiling (middleware side)."""
+
+    def __init__(self, reason: str):
+        self.request = ProfileRequest(reason)
+
+    def __enter__(self) -> ProfileRequest:
+        self._token = _profile_request.set(self.request)
+        return self.request
+
+    def __exit__(self, *exc):
+        _profile_request.reset(self._token)
+        return False
+
+
+class _Aggregate:
+    """Sum of every capture in this worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self.captures = 0
+
+    def add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.captures += 1
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        with self._lock:
+            if self._stats is None:
+                return "No requests profiled yet.\n"
+            out = io.StringIO()
+            self._stats.stream = out
+            out.write(f"{self.captures} profiled requests\n")
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats, self.captures = None, 0
+
+
+aggregate = _Aggregate()
+
+
+class _NoopProfile:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopProfile()
+
+
+class _Capture:
+    def __init__(self, request: ProfileRequest, name: str, labels: dict):
+        request.claimed = True
+        self.request = request
+        self.name = name
+        self.labels = labels
+        self.profile: Optional[cProfile.Profile] = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self.profile.enable()
+        except ValueError:
+            self.profile = None  # another profiler is active on this thread
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is None:
+            return False
+        self.profile.disable()
+        aggregate.add(self.profile)
+        self.request.path = _write(self.profile, self.name, self.labels)
+        registry.inc("nexletter_profiled_requests_total", help="Requests captured with cProfile",
+                     route=self.name, reason=self.request.reason)
+        return False
+
+
+def profiled(name: str, **labels):
+    """Context manager profiling its block if the current request is marked; a no-op otherwise."""
+    request = _profile_request.get()
+    if request is None or request.claimed:
+        return _NOOP
+    return _Capture(request, name, labels)
+
+
+def _write(profile: cProfile.Profile, name: str, labels: dict, root: Optional[str] = None) -> str:
+    root = root or PROFILE_DIR
+    os.makedirs(root, exist_ok=True)
+    parts = [name] + [f"{k}={v}" for k, v in sorted(labels.items())] + [f"{time.time_ns()}"]
+    path = os.path.join(root, re.sub(r"[^\w.-]", "_", "-".join(parts)) + ".prof")
+    profile.dump_stats(path)
+    _prune(root)
+    return path
+
+
+def _prune(root: str, keep: int = PROFILE_KEEP) -> None:
+    captures: List[str] = sorted((f for f in os.listdir(root) if f.endswith(".prof")),
+                                 key=lambda f: os.path.getmtime(os.path.join(root, f)))
+    for name in captures[:max(len(captures) - keep, 0)]:
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,60 @@
+"""Stand-ins for a psycopg2 connection, shared by the tests that need one."""
+from psycopg2 import sql
+
+
+def render(query) -> str:
+    """The SQL text of a query, which may be composed with psycopg2.sql."""
+    if isinstance(query, sql.Composed):
+        return "".join(render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(query.strings)
+    if isinstance(query, sql.SQL):
+        return query.string
+    return query
+
+
+class FakeConnection:
+    """
+    A connection that is also its own cursor. Every statement is recorded in
+    `statements` (rendered, whitespace collapsed) and answered by
+    respond(query, params), which returns the result rows and may set
+    `rowcount`. Subclasses override respond(); the default returns no rows.
+    """
+
+    closed = 0
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rowcount = 0
+        self._rows = []
+
+    def respond(self, query, params):
+        return []
+
+    def cursor(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=()):
+        query = " ".join(render(query).split())
+        self.statements.append(query)
+        self.rowcount = 0
+        self._rows = list(self.respond(query, params))
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed = 1
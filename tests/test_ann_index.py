@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import numpy as np
+
+import api.routes as routes
+from db.repository import InMemoryRepository
+from nlp.ann_index import TitleLSHIndex
+from recommender.catalog import ArticleCatalog
+from recommender.recommender import user_similarities
+
+TITLES = [
+    "Crypto short sellers took a hit after Israel Iran de-escalation",
+    "Central bank holds interest rates steady amid inflation worries",
+    "Local team wins championship in overtime thriller",
+    "New vaccine shows promise in early clinical trials",
+]
+
+
+def test_query_finds_near_duplicate_title():
+    index = TitleLSHIndex()
+    index.add([10, 11, 12, 13], TITLES)
+
+    results = index.query(["Crypto short sellers hit by Israel Iran de-escalation"], k=1)
+
+    assert results[0][0] == 10
+    assert index.recall(["Crypto short sellers hit by Israel Iran de-escalation"], k=1)["recall"] == 1.0
+
+
+def test_incremental_add_is_queryable():
+    index = TitleLSHIndex()
+    index.add([1], [TITLES[1]])
+    index.query([TITLES[1]], k=1)
+    index.add([2], [TITLES[3]])
+
+    assert index.query([TITLES[3]], k=1)[0][0] == 2
+    assert len(index) == 2
+
+
+def test_extended_copy_leaves_the_original_index_alone():
+    index = TitleLSHIndex()
+    index.add([1, 2], TITLES[:2])
+    before = index.candidate_ids([TITLES[3]]).tolist()
+
+    extended = index.extended([3, 4], TITLES[2:])
+    assert len(index) == 2 and len(extended) == 4
+    assert index.candidate_ids([TITLES[3]]).tolist() == before
+    assert 4 in extended.candidate_ids([TITLES[3]])
+    assert extended.extended([], []) is extended
+
+
+def test_stop_word_only_titles_are_not_bucketed():
+    index = TitleLSHIndex()
+    index.add([1, 2], ["the and of", TITLES[2]])
+
+    assert 0 not in set(index.candidates(["it is the"]))
+    assert index.query(["the"], k=5) == []
+
+
+def test_tfidf_similarity_is_only_computed_for_retrieved_articles():
+    repo = InMemoryRepository()
+    for title in TITLES:
+        repo.add_article(title)
+    catalog = ArticleCatalog.load(repo)
+    index = TitleLSHIndex()
+    index.add(catalog.ids.tolist(), list(catalog.titles))
+    liked = ["Crypto short sellers hit by Israel Iran de-escalation"]
+
+    exact = user_similarities(repo, 1, catalog, liked_titles=liked)
+    retrieved = user_similarities(repo, 1, catalog, liked_titles=liked, title_index=index)
+    candidates = catalog.positions(index.candidate_ids(liked))[0]
+    assert 0 in candidates and len(candidates) < len(catalog)
+    assert np.allclose(retrieved[candidates], exact[candidates])
+    assert not np.delete(retrieved, candidates).any()
+
+
+def test_worker_index_follows_catalog_changes():
+    repo = InMemoryRepository()
+    for title in TITLES[:2]:
+        repo.add_article(title)
+    catalog = ArticleCatalog.load(repo)
+
+    with patch.object(routes, "TITLE_INDEX_MIN_ARTICLES", 1), \
+            patch.object(routes, "_title_index", (None, None, None)):
+        index = routes.get_title_index(catalog)
+        assert len(index) == 2 and routes.get_title_index(catalog) is index
+        new_id = repo.add_article(TITLES[3])
+        extended = catalog.extended(repo, [new_id])
+        updated = routes.get_title_index(extended)
+        assert updated is not index and len(updated) == 3
+        assert len(index) == 2  # requests holding the old index keep a consistent view
+        assert new_id in updated.candidate_ids([TITLES[3]])
+        assert new_id not in index.candidate_ids([TITLES[3]])
+    with patch.object(routes, "TITLE_INDEX_MIN_ARTICLES", 10):
+        assert routes.get_title_index(catalog) is None
@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import MagicMock
+from recommender.bandit import ConfigBandit
+
+CONFIGS = {1: (1.0, 1.0, 1.0), 2: (2.0, 1.0, 1.0)}
+
+
+@pytest.mark.parametrize("strategy", ["thompson", "ucb"])
+def test_bandit_converges_to_better_arm(strategy):
+    bandit = ConfigBandit(CONFIGS, strategy=strategy, seed=7)
+    bandit.trials = {1: 1000, 2: 1000}
+    bandit.successes = {1: 50, 2: 300}
+
+    picks = [bandit.select() for _ in range(200)]
+
+    assert picks.count(2) > 190
+
+
+def test_ucb_tries_unplayed_arm_first():
+    bandit = ConfigBandit(CONFIGS, strategy="ucb")
+    bandit.record_impressions(1, 10)
+    assert bandit.select() == 2
+
+
+def test_unknown_config_ids_are_ignored():
+    bandit = ConfigBandit(CONFIGS)
+    bandit.record_impressions(None)
+    bandit.record_click(99)
+    assert sum(bandit.trials.values()) == 0
+    assert sum(bandit.successes.values()) == 0
+
+
+def test_persist_writes_deltas_once():
+    bandit = ConfigBandit(CONFIGS)
+    bandit.record_impressions(1, 3)
+    bandit.record_click(1)
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+
+    bandit.persist(conn)
+    bandit.persist(conn)
+
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1] == (1, 3, 1)
+    assert bandit.trials[1] == 3
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from db.repository import InMemoryRepository
+from recommender.catalog import ArticleCatalog
+from recommender.scorer import component_matrix
+
+ROWS = [
+    (1, "AI beats humans at chess", '{"united states of america"}', ["Technology"]),
+    (2, "Crypto short sellers took a hit", "UK", ["crypto", "business"]),
+    (3, "EU economy news", None, None),
+    (4, "Markets rally", "united states of america", ["business"]),
+]
+
+PROFILES = [
+    {
+        "preferred_countries": ["United States of America"],
+        "preferred_categories": ["technology"],
+        "liked_categories": {"business": 3, "crypto": 1},
+        "liked_countries": {"uk": 2},
+    },
+    {
+        "preferred_countries": [],
+        "preferred_categories": [],
+        "liked_categories": {},
+        "liked_countries": {},
+    },
+]
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_vectorized_components_match_scorer(profile):
+    catalog = ArticleCatalog(ROWS)
+    time_spent = {1: 1000, 4: 700, 99: 2000}
+    similarities = np.array([0.9, 0.2, 0.0, 0.5])
+
+    expected = component_matrix(ROWS, profile, time_spent, None, similarities)
+    assert np.allclose(catalog.components(profile, time_spent, similarities), expected)
+
+
+def test_top_k_is_stable_on_ties():
+    catalog = ArticleCatalog(ROWS)
+    scores = np.array([1.0, 3.0, 3.0, 3.0])
+
+    assert catalog.top_k(scores, 2).tolist() == [1, 2]
+    assert catalog.top_k(scores, 10).tolist() == [1, 2, 3, 0]
+    assert catalog.top_k(scores, 0).tolist() == []
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_ingest_encoded_labels_score_like_strings(profile):
+    repo = InMemoryRepository()
+    for _, title, country, category in ROWS:
+        repo.add_article(title, country, category)
+    # One row without ingest-time ids, as before a backfill
+    del repo.article_labels[3]
+
+    encoded = ArticleCatalog.load(repo)
+    time_spent = {1: 1000, 4: 700}
+    assert np.allclose(encoded.components(profile, time_spent),
+                       ArticleCatalog(ROWS).components(profile, time_spent))
+
+
+def test_label_ids_map_to_dense_per_kind_indices():
+    repo = InMemoryRepository()
+    for _, title, country, category in ROWS:
+        repo.add_article(title, country, category)
+    # Countries and categories draw ids from one sequence, so each kind's are sparse
+    assert max(repo.labels["category"].values()) > len(repo.labels["category"])
+
+    catalog = ArticleCatalog.load(repo)
+    assert sorted(catalog.country_vocab.values()) == list(range(len(repo.labels["country"])))
+    assert sorted(catalog.category_vocab.values()) == list(range(len(repo.labels["category"])))
+    assert catalog.categories.shape[1] == len(repo.labels["category"])
+
+    new_id = repo.add_article("Rover lands on Mars", '{"india"}', ["science", "technology"])
+    extended = catalog.extended(repo, [new_id])
+    assert sorted(extended.category_vocab.values()) == list(range(len(repo.labels["category"])))
+    assert np.allclose(extended.components(PROFILES[0], {}), ArticleCatalog.load(repo).components(PROFILES[0], {}))
+
+
+def test_freshness_window_loads_and_evicts_in_bulk():
+    now = datetime(2025, 6, 1)
+    repo = InMemoryRepository()
+    old = repo.add_article("Election results are in", '{"usa"}', ["politics"], pub_date=now - timedelta(days=5))
+    new = repo.add_article("Markets rally on rate cut", '{"uk"}', ["business"], pub_date=now - timedelta(hours=1))
+    undated = repo.add_article("Timeless explainer", '{"uk"}', ["science"])
+
+    assert len(ArticleCatalog.load(repo, max_age_days=0)) == 3
+    catalog = ArticleCatalog.load(repo, max_age_days=0).evict_expired(2, now=now)
+    assert catalog.ids.tolist() == [new]
+    assert catalog.rows[0][1] == "Markets rally on rate cut"
+    assert catalog.title_terms.shape[0] == 1
+    pos, found = catalog.positions([old, new, undated])
+    assert found.tolist() == [False, True, False] and pos[1] == 0
+    assert catalog.evict_expired(2, now=now) is catalog
@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import api.routes as routes
+from fakes import FakeConnection
+from recommender.co_engagement import CoEngagement
+from recommender.component_cache import ComponentCache
+
+
+def brute_force(engagements, engaged, candidates):
+    users = {}
+    for u, a in engagements:
+        users.setdefault(u, set()).add(a)
+    counts = {}
+    for items in users.values():
+        for a in items:
+            counts[a] = counts.get(a, 0) + 1
+    out = []
+    for j in candidates:
+        total = 0.0
+        for i in engaged:
+            both = sum(1 for items in users.values() if i in items and j in items and i != j)
+            if both:
+                total += both / np.sqrt(counts[i] * counts[j])
+        out.append(total)
+    return np.asarray(out)
+
+
+def test_incremental_micro_batches_match_full_recount(tmp_path):
+    engagements = [(1, 10), (1, 11), (2, 10), (2, 11), (2, 12), (3, 12), (3, 13), (1, 10), (4, 3)]
+    co = CoEngagement()
+    co.add_many(engagements[:4])
+    co.flush()
+    co.add_many(engagements[4:])
+    co.flush()
+
+    candidates = [3, 10, 11, 12, 13, 99]
+    expected = brute_force(engagements, [10], candidates)
+    assert np.allclose(co.scores([10], candidates), expected)
+    assert co.scores([], candidates).tolist() == [0.0] * len(candidates)
+
+    path = str(tmp_path / "co.npz")
+    co.save(path)
+    loaded = CoEngagement.load(path)
+    assert np.allclose(loaded.scores([10, 12], candidates), co.scores([10, 12], candidates))
+    assert loaded.user_history(2) == [10, 11, 12]
+
+
+class _Logs(FakeConnection):
+    """No interactions and a fixed set of clicked impressions."""
+
+    def __init__(self, clicks):
+        super().__init__()
+        self.clicks = clicks
+
+    def respond(self, query, params):
+        return [] if "interactions" in query else [c for c in self.clicks if c[2] >= params[0]]
+
+
+def test_clicks_in_the_lookback_window_are_counted_once(tmp_path):
+    now = datetime(2025, 1, 10)
+    # More clicks than max_history, so the capped history can't dedupe them
+    clicks = [(1, a, now - timedelta(days=1, minutes=a)) for a in range(10, 15)]
+    co = CoEngagement(max_history=2)
+    assert co.update_from_db(_Logs(clicks), now=now) == 5
+    counts, nnz = co.item_counts.copy(), co.matrix.nnz
+
+    path = str(tmp_path / "co.npz")
+    co.save(path)
+    co = CoEngagement.load(path)
+    late = (2, 10, now - timedelta(days=3))  # a click flipped on an older impression
+    assert co.update_from_db(_Logs(clicks + [late]), now=now + timedelta(hours=1)) == 1
+    assert co.item_counts[10] == counts[10] + 1 and np.array_equal(co.item_counts[11:15], counts[11:15])
+    assert co.matrix.nnz == nnz
+
+    # Clicks older than the window are forgotten along with it
+    co.update_from_db(_Logs(clicks + [late]), now=now + timedelta(days=7))
+    assert co.clicked == {}
+
+
+def test_reloading_the_matrix_drops_cached_components(tmp_path):
+    path = str(tmp_path / "co.npz")
+    co = CoEngagement()
+    co.add_many([(1, 10), (1, 11)])
+    co.flush()
+    co.save(path)
+    cache = ComponentCache()
+    reloaded = routes._ReloadedFile(path, CoEngagement.load, interval=0, on_reload=cache.invalidate)
+
+    assert reloaded.get() is not None
+    cache.put(1, [10, 11], np.zeros((2, 5)))
+    assert reloaded.get() is not None and len(cache) == 1  # unchanged file: entries stay
+    co.add_many([(2, 10), (2, 11)])
+    co.flush()
+    co.save(path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+    assert reloaded.get().scores([10], [11])[0] > 0
+    assert len(cache) == 0
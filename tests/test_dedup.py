@@ -0,0 +1,54 @@
+import numpy as np
+
+from db.repository import InMemoryRepository
+from nlp.dedup import NearDuplicateIndex
+from recommender.catalog import ArticleCatalog
+from recommender.scorer import COMPONENTS
+
+
+def test_near_duplicate_titles_share_a_cluster():
+    index = NearDuplicateIndex()
+    first = index.add(1, "Apple unveils new iPhone at September event")
+    assert index.add(2, "Apple unveils new iPhone at September event - Reuters") == first
+    assert index.add(3, "Central bank raises interest rates again") == 3
+    assert index.add(4, "") == 4
+    assert len(index) == 2
+
+
+def test_catalog_collapses_duplicates_to_one_representative():
+    repo = InMemoryRepository()
+    a = repo.add_article("Apple unveils new iPhone at September event", '{"usa"}', ["technology"])
+    b = repo.add_article("Apple unveils new iPhone at September event | Tech News", '{"usa"}', ["technology"])
+    c = repo.add_article("Central bank raises interest rates again", '{"uk"}', ["business"])
+
+    catalog = ArticleCatalog.load(repo)
+    assert sorted(catalog.ids.tolist()) == [a, c]
+    pos, found = catalog.positions([b, a])
+    assert found.all() and pos[0] == pos[1]
+    assert len(ArticleCatalog.load(repo, collapse_duplicates=False)) == 3
+
+    # Time spent on either copy counts towards the representative
+    profile = {"preferred_countries": [], "preferred_categories": [],
+               "liked_countries": {}, "liked_categories": {}}
+    components = catalog.components(profile, {b: 1000})
+    assert np.count_nonzero(components[:, COMPONENTS.index("time_spent")]) == 1
+
+
+def test_positions_find_articles_sorting_after_an_alias():
+    repo = InMemoryRepository()
+    repo.add_article("Central bank holds interest rates steady", "UK", ["business"])
+    repo.add_article("Comet spotted over the Andes", "Chile", ["science"])
+    alias = repo.add_article("Central bank holds interest rates steady again", "UK", ["business"])
+    repo.add_article("Glacier melt speeds up, study finds", "Iceland", ["science"])
+    last = repo.add_article("Ferry strike disrupts island travel", "UK", ["travel"])
+
+    catalog = ArticleCatalog.load(repo)
+    assert catalog.ids.tolist() == [1, 2, 4, 5] and alias == 3
+    pos, found = catalog.positions([1, 2, 3, 4, 5, 6])
+    assert found.tolist() == [True, True, True, True, True, False]
+    assert pos[:5].tolist() == [0, 1, 0, 2, 3]
+
+    profile = {"preferred_countries": [], "preferred_categories": [],
+               "liked_countries": {}, "liked_categories": {}}
+    time_spent = catalog.components(profile, {last: 1000})[:, COMPONENTS.index("time_spent")]
+    assert time_spent[3] > 0
@@ -0,0 +1,69 @@
+import numpy as np
+import scipy.sparse as sp
+
+from db.repository import InMemoryRepository
+from recommender.catalog import ArticleCatalog
+from recommender.diversity import diversify, mmr, pool_similarity
+from recommender.recommender import recommend_articles
+
+
+def brute_force_mmr(relevance, sim, k, lam):
+    rel = (relevance - relevance.min()) / (relevance.max() - relevance.min())
+    picked = []
+    while len(picked) < k:
+        best, best_value = None, -np.inf
+        for i in range(len(rel)):
+            if i in picked:
+                continue
+            value = lam * rel[i] - (1 - lam) * max((sim[i, j] for j in picked), default=0.0)
+            if value > best_value:
+                best, best_value = i, value
+        picked.append(best)
+    return picked
+
+
+def test_incremental_mmr_matches_brute_force():
+    rng = np.random.default_rng(3)
+    relevance = np.sort(rng.random(40))[::-1]
+    titles = rng.standard_normal((40, 8))
+    categories = sp.csr_matrix((rng.random((40, 5)) > 0.6).astype(float))
+    unit = lambda X: X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    sim = 0.7 * unit(titles) @ unit(titles).T + 0.3 * unit(categories.toarray()) @ unit(categories.toarray()).T
+
+    for features in (titles, sp.csr_matrix(titles)):
+        similarity_to = pool_similarity(features, categories, category_weight=0.3)
+        for lam in (0.3, 0.7):
+            got = mmr(relevance, similarity_to, 10, lam)
+            assert got.tolist() == brute_force_mmr(relevance, sim, 10, lam)
+    assert mmr(relevance, similarity_to, 10, 1.0).tolist() == list(range(10))
+
+
+def test_near_duplicate_stories_are_spread_out():
+    repo = InMemoryRepository()
+    ids = [repo.add_article(title, "UK", [category]) for title, category in [
+        ("Central bank raises interest rates again", "business"),
+        ("Interest rates raised again by central bank", "business"),
+        ("Central bank raises rates again, interest up", "business"),
+        ("Local team wins league title", "sports"),
+    ]]
+    user_id = repo.add_user({"preferred_countries": ["UK"], "preferred_categories": ["business"]})
+    repo.add_config(1.0, 1.0, 1.0)
+
+    plain = recommend_articles(repo, user_id, limit=2)
+    assert [r["article_id"] for r in plain] == ids[:2]
+    diverse = recommend_articles(repo, user_id, limit=2, diversity=0.3)
+    assert [r["article_id"] for r in diverse] == [ids[0], ids[3]]
+
+
+def test_slates_past_the_candidate_pool_continue_in_score_order():
+    repo = InMemoryRepository()
+    for title in ("Central bank raises rates", "Local team wins league title", "Comet spotted over the Andes",
+                  "Ferry strike disrupts island travel", "Glacier melt speeds up", "Chip maker raises forecast"):
+        repo.add_article(title, "UK", ["business"])
+    catalog = ArticleCatalog.load(repo)
+    scores = np.linspace(1.0, 0.5, len(catalog))
+
+    ranked = diversify(catalog, scores, 5, lam=0.3, candidates=3)
+    assert sorted(ranked[:3].tolist()) == [0, 1, 2]
+    assert ranked[3:].tolist() == [3, 4]
+    assert np.array_equal(diversify(catalog, scores, 5, lam=0.3, candidates=3), ranked)
@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import api.routes as routes
+from db.repository import InMemoryRepository
+from nlp.embeddings import ArticleEmbeddings, HashingBackend
+
+TITLES = [
+    "Crypto short sellers took a hit after Israel Iran de-escalation",
+    "Central bank holds interest rates steady amid inflation worries",
+    "Local team wins championship in overtime thriller",
+]
+
+
+@pytest.fixture
+def embeddings():
+    backend = HashingBackend(dim=256)
+    return ArticleEmbeddings(backend, [30, 10, 20], backend.encode(TITLES))
+
+
+def test_encode_is_normalized_float32():
+    vectors = HashingBackend(dim=64).encode(TITLES + [""])
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0)
+    assert not vectors[3].any()
+
+
+def test_similarities_follow_requested_order(embeddings):
+    calls = []
+    def liked():
+        calls.append(1)
+        return ["crypto short sellers hit"]
+
+    vec = embeddings.user_vector(1, liked)
+    sims = embeddings.similarities(vec, [10, 30, 99])
+
+    assert sims[1] > 0.5
+    assert sims[0] < 0.1
+    assert sims[2] == 0.0
+    embeddings.user_vector(1, liked)
+    assert len(calls) == 1
+
+
+def test_quantized_matches_float(embeddings):
+    q = ArticleEmbeddings(embeddings.backend, [30, 10, 20], embeddings.backend.encode(TITLES), quantize=True)
+    vec = embeddings.backend.encode(["interest rates inflation"])[0]
+
+    assert q.vectors.dtype == np.int8
+    assert np.allclose(q.similarities(vec, [10, 20, 30]),
+                       embeddings.similarities(vec, [10, 20, 30]), atol=2e-2)
+
+
+def test_worker_embeddings_reload_with_the_catalog():
+    repo = InMemoryRepository()
+    repo.add_article("Comet spotted over the Andes")
+    backend = HashingBackend(dim=32)
+    loads = []
+
+    def load(conn, since=None):
+        ids = [row[0] for row in repo.articles]
+        loads.append(ids)
+        return ArticleEmbeddings(backend, ids, backend.encode([row[1] for row in repo.articles]))
+
+    with patch.object(routes, "snapshots", None), patch.object(routes, "_catalog", None), \
+            patch.object(routes, "_catalog_loaded_at", 0.0), \
+            patch.object(routes, "_embeddings", None), patch.object(routes, "_embeddings_loaded", False), \
+            patch.object(routes.ArticleEmbeddings, "load", side_effect=load):
+        routes._loaded_catalog(repo, refresh=False)
+        assert routes._loaded_embeddings(repo).ids.tolist() == [1]
+        repo.add_article("Ferry strike disrupts island travel")
+        routes._loaded_catalog(repo, refresh=False)  # within CATALOG_TTL: nothing reloads
+        assert routes._loaded_embeddings(repo).ids.tolist() == [1]
+
+        routes._loaded_catalog(repo, refresh=True)
+        assert routes._loaded_embeddings(repo).ids.tolist() == [1, 2]
+        assert loads == [[1], [1, 2]]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import recommender.factorization as factorization
+from db.repository import InMemoryRepository
+from recommender.factorization import FactorModel, engagement_matrix, train_als
+from recommender.recommender import recommend_articles
+from recommender.scorer import calculate_score
+
+
+def make_engagements():
+    # Two taste groups: users 1-4 read two of articles 10-12, users 5-8 two of 20-22
+    users, items = [], []
+    for user in range(1, 9):
+        pool = [10, 11, 12] if user <= 4 else [20, 21, 22]
+        for article in (pool[:user % 3] + pool[user % 3 + 1:]):
+            users.append(user)
+            items.append(article)
+    return engagement_matrix(np.asarray(users), np.asarray(items), np.ones(len(users)))
+
+
+def test_cg_matches_exact_solves_and_separates_tastes(monkeypatch):
+    user_ids, item_ids, R = make_engagements()
+    exact = train_als(user_ids, item_ids, R, factors=4, iterations=5, cg_steps=0, processes=1)
+    # Tiny blocks and a pool exercise the parallel path
+    monkeypatch.setattr(factorization, "BLOCK_NNZ", 4)
+    cg = train_als(user_ids, item_ids, R, factors=4, iterations=5, cg_steps=8, processes=2)
+    assert np.allclose(cg.user_factors, exact.user_factors, atol=1e-3)
+
+    scores = cg.scores_many([1, 5], [10, 11, 12, 20, 21, 22])
+    assert scores[0, :3].min() > scores[0, 3:].max()
+    assert scores[1, 3:].min() > scores[1, :3].max()
+    assert cg.scores(999, [10]).tolist() == [0.0]
+
+
+def test_warm_start_checkpoint_and_online_component(tmp_path):
+    user_ids, item_ids, R = make_engagements()
+    checkpoints = []
+    model = train_als(user_ids, item_ids, R, factors=4, iterations=2, processes=1,
+                      checkpoint=lambda m: checkpoints.append(m.iteration))
+    assert checkpoints == [1, 2]
+    path = str(tmp_path / "factors.npz")
+    model.save(path)
+    loaded = FactorModel.load(path)
+    resumed = train_als(user_ids, item_ids, R, factors=4, iterations=2, previous=loaded, start_iteration=2)
+    assert np.array_equal(resumed.user_factors, model.user_factors)
+
+    repo = InMemoryRepository()
+    for title in ("Budget talks stall", "Rail strike called off", "Chip maker raises forecast"):
+        repo.add_article(title, "UK", ["business"])
+    user_id = repo.add_user({"preferred_countries": [], "preferred_categories": []})
+    repo.add_config(1.0, 2.0, 1.0)
+    factors = FactorModel([user_id], [[1.0, 0.5]], [1, 2, 3], [[0.2, 0.0], [0.0, 2.0], [1.0, 1.0]])
+
+    recs = recommend_articles(repo, user_id, limit=3, factors=factors)
+    assert [r["article_id"] for r in recs] == [3, 2, 1]
+    expected = {a[0]: calculate_score(a, repo.fetch_user_profile(user_id), {}, repo, user_id, 1.0, 2.0, 1.0,
+                                      factors=factors)["score"] for a in repo.fetch_articles()}
+    assert {r["article_id"]: r["score"] for r in recs} == pytest.approx(expected)
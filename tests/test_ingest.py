@@ -0,0 +1,125 @@
+import queue
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from db.ingest_events import MAX_PAYLOAD, ingest_payloads, parse_payload
+from db.repository import InMemoryRepository
+from fakes import FakeConnection
+from fetcher.daemon import Scheduler
+from fetcher.pipeline import _STOP, IngestPipeline, Stage, normalize_articles
+from nlp.embeddings import ArticleEmbeddings, HashingBackend
+from recommender.catalog import ArticleCatalog
+
+PROFILE = {
+    "preferred_countries": ["UK"],
+    "preferred_categories": ["science"],
+    "liked_categories": {"business": 2},
+    "liked_countries": {},
+}
+
+
+def test_extended_catalog_matches_a_full_reload():
+    repo = InMemoryRepository()
+    repo.add_article("Central bank holds interest rates steady", "UK", ["business"])
+    repo.add_article("Comet spotted over the Andes", "Chile", ["science"])
+    catalog = ArticleCatalog.load(repo)
+
+    new_ids = [
+        repo.add_article("Central bank holds interest rates steady again", "UK", ["business"]),  # duplicate of 1
+        repo.add_article("Glacier melt speeds up, study finds", "Iceland", ["science", "environment"]),
+        repo.add_article("Ferry strike disrupts island travel", None, None),
+    ]
+    extended = catalog.extended(repo, new_ids)
+    reloaded = ArticleCatalog.load(repo)
+
+    assert extended.ids.tolist() == reloaded.ids.tolist() == [1, 2, 4, 5]
+    all_ids = list(range(1, 7))
+    (pos, found), (expected_pos, expected_found) = extended.positions(all_ids), reloaded.positions(all_ids)
+    assert found.tolist() == expected_found.tolist() == [True] * 5 + [False]
+    assert np.array_equal(pos[found], expected_pos[expected_found])
+    assert np.allclose(extended.components(PROFILE, {4: 500}), reloaded.components(PROFILE, {4: 500}))
+    assert np.allclose(extended.title_similarities(["glacier study"]),
+                       reloaded.title_similarities(["glacier study"]))
+    assert extended.extended(repo, [1, 3]) is extended
+    assert len(catalog) == 2  # the original is left as it was
+
+
+def test_merged_embeddings_prefer_the_new_vectors():
+    backend = HashingBackend(dim=64)
+    old = ArticleEmbeddings(backend, [1, 2], backend.encode(["rates steady", "comet spotted"]))
+    new = ArticleEmbeddings(backend, [2, 3], backend.encode(["comet over andes", "ferry strike"]))
+
+    merged = old.merged(new)
+    vec = backend.encode(["ferry strike"])[0]
+    assert merged.ids.tolist() == [1, 2, 3]
+    assert merged.similarities(vec, [3])[0] == pytest.approx(1.0, abs=1e-5)
+    assert np.allclose(merged.article_vectors([2]), new.article_vectors([2]))
+    assert old.merged(ArticleEmbeddings(backend, [], np.zeros((0, 64), dtype=np.float32))) is old
+
+
+def test_ingest_payloads_fit_a_notify():
+    ids = list(range(1_000_000, 1_003_000))
+    payloads = ingest_payloads(ids)
+    assert len(payloads) > 1
+    assert all(len(p) <= MAX_PAYLOAD for p in payloads)
+    assert [i for p in payloads for i in parse_payload(p)] == ids
+    assert ingest_payloads([]) == []
+
+
+def test_scheduler_runs_each_job_on_its_interval():
+    scheduler = Scheduler([({"category": "a"}, 10), ({"category": "b"}, 25)], now=0)
+    assert scheduler.due(0) == [{"category": "a"}, {"category": "b"}]
+    assert scheduler.next_in(0) == 10
+    assert scheduler.due(9) == []
+    assert scheduler.due(20) == [{"category": "a"}]
+    # Missed runs are skipped, not replayed
+    assert scheduler.due(100) == [{"category": "b"}, {"category": "a"}]
+    assert scheduler.next_in(100) == 10
+
+
+def test_normalize_drops_incomplete_and_repeated_articles():
+    articles = [{"title": " Rates ", "link": "http://a"}, {"title": "", "link": "http://b"},
+                {"title": "Rates again", "link": "http://a"}, {"title": "No link"}]
+    assert normalize_articles(articles) == [{"title": "Rates", "link": "http://a"}]
+
+
+def test_stages_keep_going_after_errors_and_stop_in_order():
+    inbox, middle, outbox = queue.Queue(maxsize=2), queue.Queue(maxsize=2), queue.Queue()
+
+    def double(batch):
+        if batch == [0]:
+            raise ValueError("bad batch")
+        return [x * 2 for x in batch]
+
+    first = Stage("double", double, inbox, middle, workers=3).start()
+    second = Stage("sum", lambda batch: [sum(batch)], middle, outbox).start()
+    for batch in ([1, 2], [0], [3], [4]):
+        inbox.put(batch)
+    inbox.put(_STOP)
+    first.join(5)
+    second.join(5)
+
+    results = []
+    while True:
+        item = outbox.get_nowait()
+        if item is _STOP:
+            break
+        results.append(item[0])
+    assert sorted(results) == [6, 6, 8]
+    assert first.stats["double_errors"] == 1
+    assert outbox.empty()
+
+
+def test_links_are_remembered_only_once_inserted():
+    pipeline = IngestPipeline(connect=FakeConnection, snapshot_dir=None)
+    batch = [{"title": "Rates", "link": "http://a"}, {"title": "Comet", "link": "http://b"}]
+
+    with patch("fetcher.pipeline.NearDuplicateIndex.load"), \
+            patch("fetcher.pipeline.insert_articles", side_effect=[RuntimeError("db down"), [1, 2]]):
+        with pytest.raises(RuntimeError):
+            pipeline._insert(pipeline._dedup(batch))
+        assert pipeline._dedup(batch) == batch  # the failed batch is not skipped later
+        assert pipeline._insert(pipeline._dedup(batch)) == [1, 2]
+    assert pipeline._dedup(batch) == []
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from db.log_partitions import (DEFAULT_PARTITION, ensure_partitions, expire_partitions, next_period, parse_bound,
+                               partition_name, period_start)
+from fakes import FakeConnection
+
+
+def test_monthly_and_daily_periods():
+    ts = datetime(2024, 12, 31, 23, 59)
+    assert period_start(ts, "month") == datetime(2024, 12, 1)
+    assert next_period(datetime(2024, 12, 1), "month") == datetime(2025, 1, 1)
+    assert next_period(datetime(2024, 1, 1), "month") == datetime(2024, 2, 1)
+    assert period_start(ts, "day") == datetime(2024, 12, 31)
+    assert next_period(datetime(2024, 12, 31), "day") == datetime(2025, 1, 1)
+    assert partition_name(datetime(2025, 1, 1)) == "recommendation_logs_p20250101"
+
+
+def test_parse_partition_bound():
+    bound = "FOR VALUES FROM ('2025-01-01 00:00:00') TO ('2025-02-01 00:00:00')"
+    assert parse_bound(bound) == (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert parse_bound("DEFAULT") is None
+
+
+class FakeLogs(FakeConnection):
+    """Partition bounds and the default partition's row timestamps, standing in for Postgres."""
+
+    def __init__(self, partitions, default_rows):
+        super().__init__()
+        self.partitions = partitions
+        self.default_rows = default_rows
+
+    def respond(self, query, params):
+        if "pg_inherits" in query:
+            return [(name, f"FOR VALUES FROM ('{lo}') TO ('{hi}')") for name, lo, hi in self.partitions]
+        if query.startswith(f"SELECT 1 FROM {DEFAULT_PARTITION}"):
+            start, end = params
+            return [(1,)] if any(start <= t < end for t in self.default_rows) else []
+        if query.startswith("SELECT to_regclass"):
+            return [(DEFAULT_PARTITION,)]
+        if query.startswith(f"WITH moved AS ( DELETE FROM {DEFAULT_PARTITION}"):
+            start, end = params
+            self.rowcount = sum(start <= t < end for t in self.default_rows)
+            self.default_rows = [t for t in self.default_rows if not start <= t < end]
+        elif query.startswith(f"WITH expired AS ( DELETE FROM {DEFAULT_PARTITION}"):
+            (before,) = params
+            self.rowcount = len({t.date() for t in self.default_rows if t < before})
+            self.default_rows = [t for t in self.default_rows if t >= before]
+        return []
+
+
+def test_ensure_moves_rows_stranded_in_the_default_partition():
+    # The cron missed the 2nd-4th; inserts on the 3rd and 4th fell into the default partition
+    logs = FakeLogs([("recommendation_logs_p20250101", datetime(2025, 1, 1), datetime(2025, 1, 2))],
+                    [datetime(2025, 1, 3, 8), datetime(2025, 1, 4, 9), datetime(2025, 1, 4, 10)])
+
+    created = ensure_partitions(logs, ahead=2, interval="day", now=datetime(2025, 1, 4, 12))
+    assert created == ["recommendation_logs_p20250104", "recommendation_logs_p20250105",
+                       "recommendation_logs_p20250106"]
+    assert logs.default_rows == [datetime(2025, 1, 3, 8)]  # earlier missed days stay until expiry
+    moved = [s for s in logs.statements if "DETACH" in s or "ATTACH" in s or s.startswith(("CREATE TABLE r", "WITH"))]
+    assert moved[:4] == [
+        f"ALTER TABLE recommendation_logs DETACH PARTITION {DEFAULT_PARTITION}",
+        "CREATE TABLE recommendation_logs_p20250104 PARTITION OF recommendation_logs FOR VALUES FROM (%s) TO (%s)",
+        f"WITH moved AS ( DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= %s AND timestamp < %s RETURNING * ) "
+        "INSERT INTO recommendation_logs_p20250104 SELECT * FROM moved",
+        f"ALTER TABLE recommendation_logs ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT",
+    ]
+    assert sum("DETACH" in s for s in logs.statements) == 1  # later periods had nothing stranded
+
+
+def test_expire_rolls_up_partitions_and_old_default_rows():
+    logs = FakeLogs([("recommendation_logs_p20250101", datetime(2025, 1, 1), datetime(2025, 1, 2)),
+                     ("recommendation_logs_p20250110", datetime(2025, 1, 10), datetime(2025, 1, 11))],
+                    [datetime(2025, 1, 3, 8), datetime(2025, 1, 5, 9), datetime(2025, 1, 5, 23)])
+
+    expired = expire_partitions(logs, retention_days=5, now=datetime(2025, 1, 10, 12))
+    assert expired == ["recommendation_logs_p20250101"]
+    assert "DROP TABLE recommendation_logs_p20250101" in logs.statements
+    # Cutoff is the 5th at noon: only whole days before it leave the default partition
+    assert logs.default_rows == [datetime(2025, 1, 5, 9), datetime(2025, 1, 5, 23)]
+    assert any("INSERT INTO recommendation_log_rollups" in s and "FROM expired" in s for s in logs.statements)
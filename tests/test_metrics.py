@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main as main
+import api.routes as routes
+import telemetry.metrics as metrics
+from db.connection import CountingCursor
+from db.repository import InMemoryRepository
+from recommender.catalog import ArticleCatalog
+from recommender.pagination import RankedSnapshots
+
+
+def test_render_exposes_counters_gauges_and_cumulative_histograms():
+    registry = metrics.Registry()
+    registry.inc("jobs_total", help="Jobs run", kind="a")
+    registry.inc("jobs_total", 2, kind="a")
+    registry.set("queue_depth", 4, help="Queued jobs")
+    for value in (0.003, 0.02, 20.0):
+        registry.observe("stage_seconds", value, help="Stage time", stage="load")
+
+    lines = registry.render().splitlines()
+    assert lines[:3] == ["# HELP jobs_total Jobs run", "# TYPE jobs_total counter", 'jobs_total{kind="a"} 3.0']
+    assert "# TYPE queue_depth gauge" in lines and "queue_depth 4" in lines
+    assert "# TYPE stage_seconds histogram" in lines
+    assert 'stage_seconds_bucket{stage="load",le="0.0025"} 0' in lines
+    assert 'stage_seconds_bucket{stage="load",le="0.005"} 1' in lines
+    assert 'stage_seconds_bucket{stage="load",le="10.0"} 2' in lines
+    assert 'stage_seconds_bucket{stage="load",le="+Inf"} 3' in lines
+    assert 'stage_seconds_count{stage="load"} 3' in lines
+    assert any(line.startswith('stage_seconds_sum{stage="load"} 20.02') for line in lines)
+
+
+def test_timed_is_a_noop_outside_requests_unless_metrics_are_on():
+    registry = metrics.Registry()
+    with patch.object(metrics, "registry", registry):
+        with patch.object(metrics, "METRICS_ENABLED", False):
+            assert metrics.timed("fetch") is metrics._NOOP
+        with patch.object(metrics, "METRICS_ENABLED", True), metrics.timed("fetch"):
+            pass
+    assert 'nexletter_stage_seconds_count{stage="fetch"} 1' in registry.render()
+
+
+def test_cache_gauges_are_read_at_scrape_time():
+    registry = metrics.Registry()
+    cache = SimpleNamespace(hits=0, misses=0)
+    with patch.object(metrics, "registry", registry):
+        metrics.register_cache("profiles", lambda: cache)
+    cache.hits, cache.misses = 3, 1
+
+    text = registry.render()
+    assert 'nexletter_cache_hits{cache="profiles"} 3' in text
+    assert 'nexletter_cache_misses{cache="profiles"} 1' in text
+    assert 'nexletter_cache_hit_ratio{cache="profiles"} 0.75' in text
+
+
+def test_request_scope_counts_the_queries_of_its_request():
+    registry = metrics.Registry()
+    cursor = CountingCursor.__new__(CountingCursor)  # no connection: execute() counts, then raises
+    with patch.object(metrics, "registry", registry):
+        with metrics.request_scope("/things") as scope:
+            with metrics.timed("load"):
+                for _ in range(2):
+                    with pytest.raises(psycopg2.InterfaceError):
+                        cursor.execute("SELECT 1")
+            with pytest.raises(psycopg2.InterfaceError):
+                cursor.executemany("SELECT %s", [(1,), (2,)])
+        with pytest.raises(psycopg2.InterfaceError):
+            cursor.execute("SELECT 1")  # outside any request
+
+    text = registry.render()
+    assert scope.queries == [3]
+    assert "nexletter_db_queries_total 4.0" in text
+    assert 'nexletter_db_queries_per_request_bucket{route="/things",le="2"} 0' in text
+    assert 'nexletter_db_queries_per_request_bucket{route="/things",le="5"} 1' in text
+    assert 'nexletter_db_queries_per_request_sum{route="/things"} 3' in text
+    assert [stage for stage, _ in scope.timings] == ["load", "total"]
+    assert scope.server_timing().startswith("load;dur=")
+
+
+def test_metrics_endpoint_reports_requests_by_route():
+    repo = InMemoryRepository()
+    for i in range(5):
+        repo.add_article(f"Story about topic {i}", "UK", ["business"])
+    user_id = repo.add_user({"preferred_countries": ["UK"], "preferred_categories": []})
+    repo.add_config(1.0, 1.0, 1.0)
+    registry = metrics.Registry()
+
+    with patch.object(routes, "get_connection", return_value=repo), \
+            patch.object(routes, "get_bandit", return_value=None), \
+            patch.object(routes, "get_embeddings", return_value=None), \
+            patch.object(routes, "get_catalog", return_value=ArticleCatalog.load(repo)), \
+            patch.object(routes, "trending", None), \
+            patch.object(routes, "seen_articles", None), \
+            patch.object(routes, "ranked_snapshots", RankedSnapshots()), \
+            patch.object(main, "METRICS_ENABLED", True), \
+            patch.object(main, "SERVER_TIMING_ENABLED", True), \
+            patch.object(metrics, "METRICS_ENABLED", True), \
+            patch.object(metrics, "registry", registry), \
+            patch.object(main, "registry", registry):
+        client = TestClient(main.app)
+        response = client.get(f"/recommendations/{user_id}")
+        assert "components;dur=" in response.headers["Server-Timing"]
+        text = client.get("/metrics").text
+
+    assert 'nexletter_request_seconds_count{route="/recommendations/{user_id}"} 1' in text
+    assert 'nexletter_stage_seconds_count{stage="components"} 1' in text
+    assert 'nexletter_db_queries_per_request_count{route="/recommendations/{user_id}"} 1' in text
+    assert "/metrics" not in text  # scrapes aren't instrumented
@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.routes as routes
+from api.main import app
+from db.repository import InMemoryRepository
+from recommender.pagination import RankedSnapshots, decode_cursor, encode_cursor
+from recommender.seen import SeenArticles
+
+
+def test_snapshots_page_expire_and_check_the_user():
+    snapshots = RankedSnapshots(max_entries=2, ttl=60)
+    ranked = [{"article_id": i} for i in range(25)]
+    token = snapshots.put(7, ranked)
+
+    page, cursor = snapshots.page(token, ranked, 0, 10)
+    assert [r["article_id"] for r in page] == list(range(10))
+    assert decode_cursor(cursor) == (token, 10)
+    page, cursor = snapshots.page(token, snapshots.get(token, 7), 20, 10)
+    assert [r["article_id"] for r in page] == list(range(20, 25)) and cursor is None
+
+    assert snapshots.get(token, 8) is None
+    snapshots.put(7, [])
+    snapshots.put(7, [])
+    assert snapshots.get(token, 7) is None  # evicted, least recently used
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+    assert decode_cursor(encode_cursor("abc_-", 3)) == ("abc_-", 3)
+
+
+@pytest.mark.parametrize("seen", [None, SeenArticles()])
+def test_pages_continue_one_ranking_without_rescoring(seen):
+    repo = InMemoryRepository()
+    words = ["budget", "rail", "strike", "harvest", "comet", "museum", "ferry", "glacier", "tariff", "opera"]
+    for i in range(25):
+        repo.add_article(f"{words[i % 10]} {words[(i * 3 + 1) % 10]} {words[(i // 10 + 5) % 10]} {i}",
+                         "UK", ["business"])
+    user_id = repo.add_user({"preferred_countries": ["UK"], "preferred_categories": []})
+    repo.add_config(1.0, 1.0, 1.0)
+
+    with patch.object(routes, "get_connection", return_value=repo), \
+            patch.object(routes, "get_bandit", return_value=None), \
+            patch.object(routes, "get_embeddings", return_value=None), \
+            patch.object(routes, "trending", None), \
+            patch.object(routes, "seen_articles", seen), \
+            patch.object(routes, "ranked_snapshots", RankedSnapshots()), \
+            patch.object(routes, "recommend_articles", wraps=routes.recommend_articles) as rank:
+        client = TestClient(app)
+        first = client.get(f"/recommendations/{user_id}").json()
+        second = client.get(f"/recommendations/{user_id}", params={"cursor": first["next_cursor"]}).json()
+        third = client.get(f"/recommendations/{user_id}", params={"cursor": second["next_cursor"]}).json()
+        assert rank.call_count == 1
+
+        pages = [[r["article_id"] for r in p["recommendations"]] for p in (first, second, third)]
+        assert [len(p) for p in pages] == [10, 10, 5] and third["next_cursor"] is None
+        assert len(set(sum(pages, []))) == 25
+        assert len(repo.logs) == 25
+
+        # Snapshot gone (e.g. served by another worker): ranked again and carried on
+        routes.ranked_snapshots.invalidate()
+        again = client.get(f"/recommendations/{user_id}", params={"cursor": first["next_cursor"]}).json()
+        assert rank.call_count == 2
+        if seen is not None:
+            assert again["recommendations"] == []  # every article was already served
+        else:
+            assert [r["article_id"] for r in again["recommendations"]] == pages[1]
+
+        assert client.get(f"/recommendations/{user_id}", params={"cursor": "%%%"}).status_code == 400
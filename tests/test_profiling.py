@@ -0,0 +1,63 @@
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import api.main as main
+import api.routes as routes
+import telemetry.profiling as profiling
+from db.repository import InMemoryRepository
+from recommender.catalog import ArticleCatalog
+from recommender.pagination import RankedSnapshots
+
+
+def test_profiled_is_a_noop_unless_the_request_is_marked(tmp_path):
+    assert profiling.profiled("work") is profiling._NOOP
+
+    with patch.object(profiling, "PROFILE_DIR", str(tmp_path)), patch.object(profiling, "aggregate",
+                                                                            profiling._Aggregate()):
+        with profiling.profile_request("requested") as marked:
+            with profiling.profiled("work", user_id=3):
+                with profiling.profiled("inner"):  # nested blocks don't start a second profiler
+                    sorted(range(1000), key=lambda x: -x)
+        assert os.path.dirname(marked.path) == str(tmp_path)
+        assert os.listdir(tmp_path) == [os.path.basename(marked.path)]
+        assert "work-user_id_3-" in marked.path
+        assert "1 profiled requests" in profiling.aggregate.report()
+        assert "sorted" in profiling.aggregate.report(sort="tottime")
+
+
+def test_requests_are_profiled_on_demand(tmp_path):
+    repo = InMemoryRepository()
+    for i in range(5):
+        repo.add_article(f"Story about topic {i} {'x' * i}", "UK", ["business"])
+    user_id = repo.add_user({"preferred_countries": ["UK"], "preferred_categories": []})
+    repo.add_config(1.0, 1.0, 1.0)
+
+    with patch.object(routes, "get_connection", return_value=repo), \
+            patch.object(routes, "get_bandit", return_value=None), \
+            patch.object(routes, "get_embeddings", return_value=None), \
+            patch.object(routes, "get_catalog", return_value=ArticleCatalog.load(repo)), \
+            patch.object(routes, "trending", None), \
+            patch.object(routes, "seen_articles", None), \
+            patch.object(routes, "ranked_snapshots", RankedSnapshots()), \
+            patch.object(main, "PROFILING_ENABLED", True), \
+            patch.object(main, "PROFILE_TOKEN", "secret"), \
+            patch.object(profiling, "PROFILE_TOKEN", "secret"), \
+            patch.object(profiling, "PROFILE_DIR", str(tmp_path)), \
+            patch.object(profiling, "aggregate", profiling._Aggregate()) as aggregate, \
+            patch.object(main, "aggregate", aggregate):
+        client = TestClient(main.app)
+        assert "X-Profile-Id" not in client.get(f"/recommendations/{user_id}").headers
+        assert "X-Profile-Id" not in client.get(f"/recommendations/{user_id}", headers={"X-Profile": "guess"}).headers
+
+        by_header = client.get(f"/recommendations/{user_id}", headers={"X-Profile": "secret"})
+        by_query = client.get(f"/recommendations/{user_id}", params={"profile": "secret"})
+        assert by_header.json() == by_query.json()
+        assert sorted(os.listdir(tmp_path)) == sorted([by_header.headers["X-Profile-Id"],
+                                                       by_query.headers["X-Profile-Id"]])
+
+        assert client.get("/debug/profile").status_code == 404
+        report = client.get("/debug/profile", headers={"X-Profile": "secret"}, params={"reset": True}).text
+        assert report.startswith("2 profiled requests") and "recommend_articles" in report
+        assert client.get("/debug/profile", headers={"X-Profile": "secret"}).text.startswith("No requests")
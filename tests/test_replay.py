@@ -0,0 +1,39 @@
+import numpy as np
+from recommender.replay import replay, weight_grid, weight_matrix
+
+
+def test_weight_matrix_expands_w2_to_behavior_and_time():
+    W = weight_matrix([[1.0, 2.0, 3.0]])
+    assert W[:, 0].tolist() == [1.0, 2.0, 2.0, 3.0, 2.0, 2.0]
+
+
+def test_weight_grid_skips_all_zero():
+    grid = weight_grid((0.0, 1.0))
+    assert len(grid) == 7
+    assert not (grid == 0).all(axis=1).any()
+
+
+def test_replay_prefers_config_that_ranks_clicks_first():
+    # Slate of 3: only the article with the similarity term was clicked.
+    comps = np.array([
+        [10, 0, 0, 0, 0, 0],
+        [0, 3, 0, 0, 0, 0],
+        [0, 0, 0, 8, 0, 0],
+    ], dtype=float)
+    clicks = np.array([False, False, True])
+    configs = np.array([[1.0, 1.0, 0.1], [0.1, 0.1, 3.0]])
+
+    metrics = replay([(1, comps, clicks)], configs, k=1)
+
+    assert metrics["ctr_at_k"].tolist() == [0.0, 1.0]
+    assert metrics["recall_at_k"].tolist() == [0.0, 1.0]
+
+
+def test_replay_handles_ragged_slates():
+    a = (1, np.array([[5, 0, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0]], dtype=float), np.array([True, False]))
+    b = (2, np.array([[0, 0, 0, 1, 0, 0]], dtype=float), np.array([True]))
+
+    metrics = replay([a, b], np.array([[1.0, 1.0, 1.0]]), k=2)
+
+    assert metrics["ctr_at_k"][0] == 2 / 3
+    assert metrics["precision_at_k"][0] == (0.5 + 1.0) / 2
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+
+from db import log_repo
+from db.repository import InMemoryRepository, Repository
+from recommender.recommender import log_click, log_recommendations, recommend_articles
+from recommender.scorer import calculate_score
+from recommender.seen import SeenArticles
+
+ARTICLES = [
+    ("AI beats humans at chess", '{"united states of america"}', ["Technology"]),
+    ("Crypto short sellers took a hit", "UK", ["crypto", "business"]),
+    ("EU economy news", None, None),
+    ("Markets rally", "united states of america", ["business"]),
+]
+
+PROFILE = {
+    "preferred_countries": ["United States of America"],
+    "preferred_categories": ["technology"],
+    "liked_categories": {"business": 3, "crypto": 1},
+    "liked_countries": {"uk": 2},
+}
+
+
+def make_repo():
+    repo = InMemoryRepository()
+    for title, country, category in ARTICLES:
+        repo.add_article(title, country, category)
+    user_id = repo.add_user(PROFILE)
+    repo.insert_interaction(user_id, 4, "read", 700)
+    repo.save_liked_title(user_id, "Crypto markets rally")
+    return repo, user_id
+
+
+def test_recommend_matches_calculate_score_without_db():
+    repo, user_id = make_repo()
+    config_id = repo.add_config(2.0, 1.0, 0.5)
+
+    recs = recommend_articles(repo, user_id, limit=4)
+    time_spent = repo.fetch_time_spent(user_id)
+    expected = {a[0]: calculate_score(a, PROFILE, time_spent, repo, user_id, 2.0, 1.0, 0.5)["score"]
+                for a in repo.fetch_articles()}
+    assert {r["article_id"]: r["score"] for r in recs} == pytest.approx(expected)
+    assert all(r["scoring_config_id"] == config_id for r in recs)
+
+
+def test_logs_round_trip_to_slates():
+    repo, user_id = make_repo()
+    recs = recommend_articles(repo, user_id, limit=3)
+
+    log_recommendations(repo, user_id, recs)
+    log_click(repo, user_id, recs[0]["article_id"], None)
+    assert repo.fetch_logged_slates() == {
+        user_id: [(r["article_id"], i == 0) for i, r in enumerate(recs)]
+    }
+
+
+def test_clicks_only_mark_impressions_inside_the_click_window():
+    repo = InMemoryRepository()
+    repo.insert_impressions(1, [(10, None), (11, None)])
+    repo.logs[0][4] -= timedelta(days=log_repo.CLICK_WINDOW_DAYS + 1)
+
+    repo.mark_clicked(1, 10, None)
+    repo.mark_clicked(1, 11, None)
+    assert [row[:4] for row in repo.logs] == [[1, 10, None, False], [1, 11, None, True], [1, 10, None, True]]
+
+
+def test_seen_articles_are_excluded_and_updated_by_logging():
+    repo, user_id = make_repo()
+    repo.add_config(1.0, 1.0, 1.0)
+    seen = SeenArticles()
+
+    # Article 4 was read (interactions), so it is seen from the start
+    first = recommend_articles(repo, user_id, limit=2, seen=seen)
+    assert 4 not in [r["article_id"] for r in first] and len(first) == 2
+    log_recommendations(repo, user_id, first, seen=seen)
+
+    second = recommend_articles(repo, user_id, limit=2, seen=seen)
+    assert [r["article_id"] for r in second] == [a for a in (1, 2, 3) if a not in [r["article_id"] for r in first]]
+    log_click(repo, user_id, second[0]["article_id"], None, seen=seen)
+    assert recommend_articles(repo, user_id, limit=2, seen=seen) == []
+    assert (seen.misses, len(seen)) == (1, 1)
+
+
+def test_repositories_missing_a_method_fail_when_created():
+    class Partial(Repository):
+        def fetch_user_profile(self, user_id):
+            return None
+
+    with pytest.raises(TypeError, match="fetch_article_activity"):
+        Partial()
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import MagicMock, Mock
-from recommender.scorer import calculate_score
+from recommender.scorer import apply_weights, calculate_score, component_matrix
 
 @pytest.fixture
 def mock_conn_with_liked_titles():
@@ -23,7 +23,7 @@ def test_score_full_preference_match(mock_conn_with_liked_titles):
     time_spent_map = {1: 1000}
     user_id = 1
 
-    result = calculate_score(article, user_profile, time_spent_map, mock_conn_with_liked_titles, user_id)
+    result = calculate_score(article, user_profile, time_spent_map, mock_conn_with_liked_titles, user_id, 1.0, 1.0, 1.0)
     assert result["score"] >= 13
 
 def test_score_with_liked_category_and_country(mock_conn_with_liked_titles):
@@ -37,7 +37,7 @@ def test_score_with_liked_category_and_country(mock_conn_with_liked_titles):
     time_spent_map = {2: 200}
     user_id = 1
 
-    result = calculate_score(article, user_profile, time_spent_map, mock_conn_with_liked_titles, user_id)
+    result = calculate_score(article, user_profile, time_spent_map, mock_conn_with_liked_titles, user_id, 1.0, 1.0, 1.0)
     assert result["score"] >= 7
 
 def test_score_with_time_spent_bonus(mock_conn_with_liked_titles):
@@ -50,9 +50,9 @@ def test_score_with_time_spent_bonus(mock_conn_with_liked_titles):
     }
     user_id = 1
 
-    result1 = calculate_score(article, user_profile, {3: 650}, mock_conn_with_liked_titles, user_id)
-    result2 = calculate_score(article, user_profile, {3: 1000}, mock_conn_with_liked_titles, user_id)
-    result3 = calculate_score(article, user_profile, {3: 300}, mock_conn_with_liked_titles, user_id)
+    result1 = calculate_score(article, user_profile, {3: 650}, mock_conn_with_liked_titles, user_id, 1.0, 1.0, 1.0)
+    result2 = calculate_score(article, user_profile, {3: 1000}, mock_conn_with_liked_titles, user_id, 1.0, 1.0, 1.0)
+    result3 = calculate_score(article, user_profile, {3: 300}, mock_conn_with_liked_titles, user_id, 1.0, 1.0, 1.0)
 
     assert result1["score"] >= 2
     assert result2["score"] >= 5
@@ -80,6 +80,28 @@ def test_similarity_score_added(monkeypatch):
     ]
     user_id = 1
 
-    result = scorer.calculate_score(article, user_profile, time_spent_map, conn, user_id)
+    result = scorer.calculate_score(article, user_profile, time_spent_map, conn, user_id, 1.0, 1.0, 1.0)
 
     assert result['score'] == 7
+
+def test_component_matrix_reweights_to_calculate_score(mock_conn_with_liked_titles):
+    articles = [
+        (1, "AI beats humans at chess", "USA", ["technology"]),
+        (2, "Crypto short sellers took a hit", "UK", ["crypto"]),
+    ]
+    user_profile = {
+        "preferred_countries": ["USA"],
+        "preferred_categories": [],
+        "liked_categories": {"crypto": 2},
+        "liked_countries": {}
+    }
+    time_spent_map = {1: 700}
+    liked = ["Crypto Short Sellers Took A Hit Following De-escalation Of Conflict Between Israel and Iran"]
+
+    matrix = component_matrix(articles, user_profile, time_spent_map, liked)
+    for weights in [(1.0, 1.0, 1.0), (2.0, 0.5, 3.0)]:
+        scores = apply_weights(matrix, weights)
+        for article, score in zip(articles, scores):
+            expected = calculate_score(article, user_profile, time_spent_map,
+                                       mock_conn_with_liked_titles, 1, *weights)
+            assert score == pytest.approx(expected["score"])
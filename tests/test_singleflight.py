@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from recommender.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight("test")
+    runs = []
+
+    def compute():
+        runs.append(1)
+        time.sleep(0.05)
+        return ["a", "b"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do((1, 10), compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(runs) == 1
+    assert results == [["a", "b"]] * 8
+    assert (flight.calls, flight.shared, len(flight)) == (1, 7, 0)
+    # Finished flights aren't cached
+    flight.do((1, 10), compute)
+    assert len(runs) == 2
+
+
+def test_async_callers_coalesce_and_share_errors():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def fail():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", fail) for _ in range(5)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert len(runs) == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    with pytest.raises(RuntimeError):
+        asyncio.run(flight.do_async("k", fail))
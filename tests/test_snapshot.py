@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+from nlp.embeddings import ArticleEmbeddings, HashingBackend
+from recommender.catalog import ArticleCatalog
+from recommender.snapshot import SnapshotReader, current_version, list_versions, publish_snapshot
+
+ROWS = [
+    (7, "AI beats humans at chess", '{"united states of america"}', ["Technology"]),
+    (2, "Crypto short sellers took a hit", "UK", ["crypto", "business"]),
+    (5, "EU economy news", None, None),
+    (4, "Markets rally", "united states of america", ["business"]),
+]
+
+PROFILE = {
+    "preferred_countries": ["United States of America"],
+    "preferred_categories": ["technology"],
+    "liked_categories": {"business": 3, "crypto": 1},
+    "liked_countries": {"uk": 2},
+}
+
+
+def test_snapshot_round_trip_matches_in_memory_catalog(tmp_path):
+    catalog = ArticleCatalog(ROWS)
+    backend = HashingBackend(dim=64)
+    embeddings = ArticleEmbeddings(backend, catalog.ids, backend.encode(catalog.titles))
+    publish_snapshot(str(tmp_path), catalog, embeddings)
+
+    snapshot = SnapshotReader(str(tmp_path), poll_interval=0).get()
+    attached = snapshot.catalog
+    assert isinstance(attached.ids, np.memmap)
+    assert list(attached.rows) == ROWS
+    assert list(attached.titles) == catalog.titles
+
+    user_vec = embeddings.user_vector(1, lambda: ["chess AI"])
+    sims = snapshot.embeddings.similarities(user_vec, attached.ids)
+    assert np.allclose(sims, embeddings.similarities(user_vec, catalog.ids))
+    time_spent = {7: 1000, 4: 700, 99: 2000}
+    assert np.allclose(attached.components(PROFILE, time_spent, sims),
+                       catalog.components(PROFILE, time_spent, sims))
+
+
+def test_reader_switches_to_new_version_and_old_ones_are_pruned(tmp_path):
+    root = str(tmp_path)
+    reader = SnapshotReader(root, poll_interval=0)
+    assert reader.get() is None
+
+    publish_snapshot(root, ArticleCatalog(ROWS[:2]), keep=2)
+    assert len(reader.get().catalog) == 2
+    for n in (3, 4):
+        latest = publish_snapshot(root, ArticleCatalog(ROWS[:n]), keep=2)
+
+    assert current_version(root) == latest
+    assert len(reader.get().catalog) == 4
+    assert len(list_versions(root)) == 2
+
+
+def test_reader_falls_back_when_the_current_version_cannot_be_attached(tmp_path):
+    root = str(tmp_path)
+    publish_snapshot(root, ArticleCatalog(ROWS[:2]))
+    intact = publish_snapshot(root, ArticleCatalog(ROWS[:3]))
+    reader = SnapshotReader(root, poll_interval=0)
+    assert reader.get().version == intact
+
+    broken = publish_snapshot(root, ArticleCatalog(ROWS))
+    os.remove(os.path.join(root, broken, "ids.npy"))
+    assert reader.get().version == intact and reader.switches == 1
+    assert SnapshotReader(root, poll_interval=0).get().version == intact
+
+    for version in list_versions(root):
+        os.remove(os.path.join(root, version, "meta.json"))
+    assert SnapshotReader(root, poll_interval=0).get() is None
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import nlp.term_features as term_features
+from nlp.similarity import score_title_similarity
+from recommender.catalog import ArticleCatalog
+
+TITLES = [
+    "AI beats humans at chess",
+    "Crypto short sellers took a hit as crypto markets rally",
+    "The and of",  # only stop words
+    "Markets rally on AI optimism",
+    "",
+]
+
+
+@pytest.mark.parametrize("liked", [
+    ["Markets rally again", "AI chess engine"],
+    ["crypto crypto crypto", "the"],
+    ["nothing in common here"],
+])
+def test_precomputed_terms_match_per_article_tfidf(liked):
+    catalog = ArticleCatalog([(i + 1, t, None, None) for i, t in enumerate(TITLES)])
+    catalog.attach_title_terms({}, {})
+
+    expected = [score_title_similarity(t, liked) for t in TITLES]
+    assert np.allclose(catalog.title_similarities(liked), expected)
+
+
+def test_analyze_many_in_a_process_pool_matches_inline(monkeypatch):
+    monkeypatch.setattr(term_features, "MIN_TEXTS_PER_PROCESS", 1)
+    assert term_features.analyze_many(TITLES, processes=2) == [term_features.analyze(t) for t in TITLES]
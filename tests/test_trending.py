@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db.repository import InMemoryRepository
+from recommender.catalog import ArticleCatalog
+from recommender.recommender import recommend_articles, recommend_articles_batch
+from recommender.seen import SeenArticles
+from recommender.trending import TrendingLists, TrendingRefresher
+
+
+def make_repo(now):
+    repo = InMemoryRepository()
+    old = repo.add_article("Markets slide on rate fears", "UK", ["business"])
+    fresh = repo.add_article("Cup final goes to penalties", "UK", ["sports"])
+    us = repo.add_article("Senate passes spending bill", "US", ["politics"])
+    repo.add_article("Quiet day for the weather", "US", ["science"])
+    reader = repo.add_user({"preferred_countries": ["US"], "preferred_categories": []})
+    # `old` had more clicks, but 24h ago; `fresh` fewer clicks this hour
+    for _ in range(4):
+        repo.logs.append([reader, old, None, True, now - timedelta(hours=24)])
+    for _ in range(2):
+        repo.logs.append([reader, fresh, None, True, now])
+    repo.logs.append([reader, us, None, True, now - timedelta(hours=1)])
+    repo.add_config(1.0, 1.0, 1.0)
+    return repo, (old, fresh, us), reader
+
+
+def test_decayed_lists_by_country_and_category():
+    now = datetime.utcnow().replace(minute=30)
+    repo, (old, fresh, us), _ = make_repo(now)
+    lists = TrendingLists.build(repo, ArticleCatalog.load(repo), now=now, half_life_hours=6)
+
+    ids = lists.catalog.ids
+    assert ids[lists.positions()].tolist() == [fresh, us, old]
+    assert ids[lists.positions(country="UK")].tolist() == [fresh, old]
+    assert ids[lists.positions(category="Politics")].tolist() == [us]
+    assert lists.positions(category="weather").tolist() == []
+    assert [r["article_id"] for r in lists.top(2, exclude_ids=np.asarray([fresh]))] == [us, old]
+    assert lists.top(1)[0]["scoring_config_id"] is None
+
+
+def test_cold_start_users_get_trending_and_others_are_scored():
+    now = datetime.utcnow()
+    repo, (old, fresh, us), reader = make_repo(now)
+    lists = TrendingLists.build(repo, ArticleCatalog.load(repo), now=now, half_life_hours=6)
+    cold = repo.add_user({})
+
+    recs = recommend_articles(repo, cold, limit=2, trending=lists, seen=SeenArticles())
+    assert [r["article_id"] for r in recs] == [fresh, us]
+    # Not enough trending articles to fill the slate: scored as before
+    assert len(recommend_articles(repo, cold, limit=4, trending=lists)) == 4
+    assert recommend_articles(repo, reader, limit=2, trending=lists)[0]["country"] == "US"
+
+    batch = dict(recommend_articles_batch(repo, [cold, reader], limit=2, trending=lists))
+    assert batch[cold] == recs
+    assert batch[reader] == recommend_articles(repo, reader, limit=2)
+
+
+def test_refresher_keeps_previous_lists_when_a_build_fails():
+    builds = iter([["lists"], RuntimeError("db down")])
+
+    def build():
+        result = next(builds)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    refresher = TrendingRefresher(build, interval=60)
+    assert refresher.refresh() == ["lists"]
+    assert refresher.refresh() == ["lists"]
+    assert refresher.get() == ["lists"]